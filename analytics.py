@@ -0,0 +1,206 @@
+# analytics.py
+"""
+Investment analytics per snapshot: price/sqft distributions and quantiles,
+rent-period-normalized gross yields per (bedrooms, area bucket), and
+outlier flags.
+
+Everything is built from cells, one per (Status, Bedrooms, area bucket).
+Rent prices are first annualized (per the Period shown with them; see
+``pipeline.annual_factor``), so a rent cell's price/sqft is per year. A cell's stats
+depend only on its own rows, so ``AnalyticsEngine.update`` hashes each
+cell's values and recomputes only the cells whose hash changed since the
+previous snapshot. Roll-ups across cells (a whole status, every bucket of
+one bedroom count) add up per-cell histograms on fixed log-spaced bins.
+"""
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from pipeline import ALL, yearly_price
+
+# square feet; the last bucket is open-ended
+AREA_EDGES = (0, 500, 750, 1000, 1500, 2000, 3000, np.inf)
+AREA_BUCKETS = ("<500", "500-750", "750-1k", "1k-1.5k", "1.5k-2k", "2k-3k", "3k+")
+# AED/sqft histogram bins shared by every cell: 240 log-spaced bins (~4% wide)
+PPSF_EDGES = np.geomspace(1, 100_000, 241)
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Tukey fences on log price/sqft within a cell
+OUTLIER_IQR = 1.5
+
+CELL_FIELDS = ["n", "p10", "p25", "p50", "p75", "p90", "median_price", "lo", "hi"]
+
+def prepare(frame: pd.DataFrame) -> pd.DataFrame:
+    """Status, Bedrooms, Bucket, yearly price and price/sqft of every row that has both."""
+    price = yearly_price(frame).to_numpy()
+    area = frame["Area (sqft)"].to_numpy(dtype="float64", na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ppsf = np.where(area > 0, price / area, np.nan)
+    bucket = pd.cut(area, AREA_EDGES, labels=list(AREA_BUCKETS), right=False)
+    return pd.DataFrame({
+        "Status": frame["Status"].astype("category"),
+        "Bedrooms": frame["Bedrooms"].astype("category"),
+        "Bucket": bucket,
+        "price": price,
+        "ppsf": ppsf,
+    }, index=frame.index)
+
+def _quantile_from_hist(counts: np.ndarray, q: float) -> float:
+    # interpolated in log space inside the bin holding the q-th observation
+    total = counts.sum()
+    if not total:
+        return np.nan
+    cum = np.cumsum(counts)
+    i = int(np.searchsorted(cum, q * total))
+    before = cum[i - 1] if i else 0
+    frac = (q * total - before) / counts[i] if counts[i] else 0.0
+    lo, hi = np.log(PPSF_EDGES[i]), np.log(PPSF_EDGES[i + 1])
+    return float(np.exp(lo + frac * (hi - lo)))
+
+@dataclass
+class Analytics:
+    """
+    Results for one snapshot. ``cells`` is indexed by (Status, Bedrooms,
+    Bucket); ``outliers`` is a boolean per row of the frame it was built from.
+    """
+    cells: pd.DataFrame
+    hists: dict
+    outliers: np.ndarray
+    recomputed: int = 0
+    _rollups: dict = field(default_factory=dict, repr=False)
+
+    def histogram(self, status: str = ALL, bedrooms: str = ALL) -> np.ndarray:
+        """Counts per PPSF_EDGES bin over every cell matching ``status`` / ``bedrooms``."""
+        key = (status, bedrooms)
+        counts = self._rollups.get(key)
+        if counts is None:
+            counts = np.zeros(len(PPSF_EDGES) - 1, dtype="int64")
+            for (s, b, _), h in self.hists.items():
+                if status in (ALL, s) and bedrooms in (ALL, b):
+                    counts += h
+            self._rollups[key] = counts
+        return counts
+
+    def distribution(self, status: str = ALL, bedrooms: str = ALL):
+        """(bin centres, counts) of the merged histogram, trimmed to its non-empty span."""
+        counts = self.histogram(status, bedrooms)
+        nonzero = np.flatnonzero(counts)
+        if not len(nonzero):
+            return np.array([]), counts[:0]
+        span = slice(nonzero[0], nonzero[-1] + 1)
+        centres = np.sqrt(PPSF_EDGES[:-1] * PPSF_EDGES[1:])
+        return centres[span], counts[span]
+
+    def quantiles(self, status: str = ALL, bedrooms: str = ALL) -> dict:
+        """{q: AED/sqft} (rents per year), from the merged histogram: within a bin (~4%)."""
+        counts = self.histogram(status, bedrooms)
+        return {q: _quantile_from_hist(counts, q) for q in QUANTILES}
+
+    def yield_matrix(self) -> pd.DataFrame:
+        """
+        Gross yield (median yearly rent per sqft / median buy price per sqft)
+        with Bedrooms down and area buckets across, plus an "All" column.
+        NaN where either side has no listings.
+        """
+        cells = self.cells
+        if cells.empty:
+            return pd.DataFrame(columns=list(AREA_BUCKETS) + [ALL])
+        beds = sorted({b for _, b, _ in cells.index})
+        out = pd.DataFrame(np.nan, index=pd.Index(beds, name="Bedrooms"), columns=list(AREA_BUCKETS) + [ALL])
+        p50 = cells["p50"]
+        for b in beds:
+            for bucket in AREA_BUCKETS:
+                buy, rent = p50.get(("Buy", b, bucket)), p50.get(("Rent", b, bucket))
+                if buy and rent:
+                    out.at[b, bucket] = rent / buy
+            buy, rent = self.quantiles("Buy", b)[0.5], self.quantiles("Rent", b)[0.5]
+            if buy and rent and not (np.isnan(buy) or np.isnan(rent)):
+                out.at[b, ALL] = rent / buy
+        return out
+
+class AnalyticsEngine:
+    """
+    Incremental builder: keeps the last stats of every cell with a hash of
+    the values behind it, and on ``update`` recomputes only cells whose hash
+    changed. ``update(frame, version)`` with the version already built
+    returns the cached result. Safe to share between request threads.
+    """
+
+    def __init__(self):
+        # (Status, Bedrooms, Bucket) -> (digest, stats row, histogram)
+        self._cells = {}
+        self._version = None
+        self._result = None
+        self._lock = threading.Lock()
+
+    def update(self, frame: pd.DataFrame, version=None) -> Analytics:
+        with self._lock:
+            if version is not None and version == self._version:
+                return self._result
+            with instrument.timer("bayut_analytics_seconds"):
+                result = self._build(frame)
+            self._version, self._result = version, result
+            return result
+
+    def _build(self, frame: pd.DataFrame) -> Analytics:
+        prep = prepare(frame)
+        ppsf = prep["ppsf"].to_numpy()
+        valid = ~np.isnan(ppsf)
+        cats = [prep[c].cat for c in ("Status", "Bedrooms", "Bucket")]
+        sizes = [len(c.categories) for c in cats]
+        parts = [c.codes.to_numpy().astype("int64") for c in cats]
+        valid &= (parts[0] >= 0) & (parts[1] >= 0) & (parts[2] >= 0)
+        # one integer per (Status, Bedrooms, Bucket); np.unique numbers the cells in that order
+        combined = (parts[0] * sizes[1] + parts[1]) * sizes[2] + parts[2]
+        cell_ids, inverse = np.unique(combined[valid], return_inverse=True)
+        codes = np.full(len(prep), -1, dtype="int64")
+        codes[valid] = inverse
+        keys = [
+            (str(cats[0].categories[u // (sizes[1] * sizes[2])]),
+             str(cats[1].categories[u // sizes[2] % sizes[1]]),
+             str(cats[2].categories[u % sizes[2]]))
+            for u in cell_ids.tolist()
+        ]
+
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        sorted_codes = codes[order]
+        starts = np.searchsorted(sorted_codes, np.arange(len(keys)))
+        stops = np.append(starts[1:], len(order))
+        values, prices = ppsf[order], prep["price"].to_numpy()[order]
+
+        # order-independent digest per cell: wrapping sum of per-row hashes
+        row_hash = pd.util.hash_array(values) ^ (pd.util.hash_array(prices) * np.uint64(31))
+        digests = np.add.reduceat(row_hash, starts) if len(keys) else np.array([], dtype="uint64")
+
+        cells, recomputed = {}, 0
+        for i, key in enumerate(keys):
+            digest = int(digests[i])
+            old = self._cells.get(key)
+            if old is not None and old[0] == digest:
+                cells[key] = old
+                continue
+            cells[key] = (digest,) + _cell_stats(values[starts[i]:stops[i]], prices[starts[i]:stops[i]])
+            recomputed += 1
+        self._cells = cells
+        instrument.inc("bayut_analytics_cells_total", recomputed, result="recomputed")
+        instrument.inc("bayut_analytics_cells_total", len(keys) - recomputed, result="reused")
+
+        stats = pd.DataFrame([cells[k][1] for k in keys], columns=CELL_FIELDS,
+                             index=pd.MultiIndex.from_tuples(keys, names=["Status", "Bedrooms", "Bucket"]))
+        lo = np.append(stats["lo"].to_numpy(), np.nan)
+        hi = np.append(stats["hi"].to_numpy(), np.nan)
+        # code -1 (no price/sqft) reads the trailing NaN fences: never an outlier
+        outliers = (ppsf < lo[codes]) | (ppsf > hi[codes])
+        return Analytics(stats.sort_index(), {k: cells[k][2] for k in keys}, outliers, recomputed)
+
+def _cell_stats(ppsf: np.ndarray, price: np.ndarray):
+    """(stats row, histogram) of one cell's values."""
+    qs = np.quantile(ppsf, QUANTILES)
+    log_q1, log_q3 = np.log(qs[1]), np.log(qs[3])
+    spread = OUTLIER_IQR * (log_q3 - log_q1)
+    row = [len(ppsf), *qs, float(np.median(price)), float(np.exp(log_q1 - spread)), float(np.exp(log_q3 + spread))]
+    bins = np.clip(np.searchsorted(PPSF_EDGES, ppsf, side="right") - 1, 0, len(PPSF_EDGES) - 2)
+    return row, np.bincount(bins, minlength=len(PPSF_EDGES) - 1)
@@ -1,12 +1,22 @@
 # app.py
-import re
+import threading
 import time
-import requests
-import numpy as np
+
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
-from bs4 import BeautifulSoup
+
+import instrument
+
+from analytics import AnalyticsEngine
+from pipeline import RAW_COLUMNS, Cube, cube_metrics, rows_to_frame
+from figcache import FigureCache
+from fingerprint import ListingIndex, RunningPrices, change_counts
+from history import HistoryStore
+from listings import ListingStore
+from sketch import SEEN_DAYS, SNAPSHOT_TABLE, SketchSet, SketchStore
+from snapshot import SnapshotStore
+from tablequery import page_count, query_page
 
 # -----------------------------
 # Streamlit page configuration
@@ -22,159 +32,184 @@ st.subheader("Insights of DAMAC Towers by Paramount Hotels and Resorts (Business
 st.caption("Scraped from Bayut listing pages for for-sale and to-rent at DAMAC Towers by Paramount.")
 
 # -----------------------------
-# Constants & helpers
-# -----------------------------
-HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:91.0) "
-        "Gecko/20100101 Firefox/91.0"
-    )
-}
-
-BASE = "https://www.bayut.com"
-SALE_URL = f"{BASE}/for-sale/property/dubai/business-bay/damac-towers-by-paramount-hotels-and-resorts/"
-RENT_URL = f"{BASE}/to-rent/property/dubai/business-bay/damac-towers-by-paramount-hotels-and-resorts/"
-
-SCHEMA = [
-    "Status", "Price", "Price (raw)", "Location", "Key Words",
-    "Bedrooms", "Bedrooms (num)", "Area (sqft)", "Area (raw)", "Agency"
-]
-
-def _num_or_none(s: str):
-    """Extract numeric float from messy text, else return None."""
-    if not s:
-        return None
-    s = re.sub(r"[^\d.]", "", s)
-    try:
-        return float(s) if s else None
-    except Exception:
-        return None
-
-def _first_attr(el, attr, default=""):
-    try:
-        return el.get(attr, default)
-    except Exception:
-        return default
-
-def _text(el):
-    return el.get_text(" ", strip=True) if el else ""
-
+# Scraping
 # -----------------------------
-# Parsing & scraping
-# -----------------------------
-def _parse_card(card, status_label: str) -> dict:
-    price_el = card.select_one("span[aria-label='Price']") or card.find("span", string=re.compile(r"AED|د\.إ"))
-    price_text = _text(price_el)
-    price_num = _num_or_none(price_text)
-
-    beds_el  = card.select_one("span[aria-label='Beds']")
-    beds_text = _text(beds_el)
-    m_beds = re.search(r"\d+", beds_text)
-    beds_num = int(m_beds.group()) if m_beds else None
-
-    area_el = card.select_one("span[aria-label='Area']") or card.find(string=re.compile(r"sqft|ft²", re.I))
-    area_text = _text(area_el)
-    area_sqft = _num_or_none(area_text)
-
-    title_text = _text(card.select_one("h2[aria-label='Title']") or card.find("h2"))
-    loc_text   = _text(card.select_one("div[aria-label='Location']"))
-
-    agency_img = card.select_one("img[title]") or card.select_one("img[alt]")
-    agency = _first_attr(agency_img, "title", "") or _first_attr(agency_img, "alt", "")
-
-    return {
-        "Status": status_label,
-        "Price": price_num,
-        "Price (raw)": price_text,
-        "Location": loc_text,
-        "Key Words": title_text,
-        "Bedrooms": beds_text or "N/A",
-        "Bedrooms (num)": beds_num if beds_num is not None else "N/A",
-        "Area (sqft)": area_sqft,
-        "Area (raw)": area_text,
-        "Agency": agency,
-    }
-
-
-def _find_cards(soup: BeautifulSoup):
-    """
-    Try multiple strategies to locate listing cards.
+# the fetch layer (scraper, crawler: requests, lxml) is imported only when a
+# scrape is due, so a session served from a fresh snapshot never loads it
+@st.cache_resource
+def _fetcher() -> "Fetcher":
+    # one pooled keep-alive session per server process
+    from scraper import Fetcher
+    return Fetcher()
+
+@st.cache_resource
+def _parse_cache() -> "ParseCache":
+    # rows of unchanged pages/cards survive across refreshes
+    from scraper import ParseCache
+    return ParseCache()
+
+@st.cache_resource
+def _store() -> SnapshotStore:
+    return SnapshotStore()
+
+@st.cache_resource
+def _history() -> HistoryStore:
+    return HistoryStore()
+
+@st.cache_resource
+def _listing_index() -> ListingIndex:
+    return ListingIndex()
+
+@st.cache_resource
+def _sketches() -> SketchStore:
+    return SketchStore()
+
+def _snapshot_age() -> float:
+    created = _store().created("listings")
+    return time.time() - created if created else float("inf")
+
+instrument.gauge("bayut_snapshot_age_seconds", _snapshot_age, name="listings")
+instrument.gauge("bayut_snapshot_version", lambda: _store().latest_version("listings") or 0, name="listings")
+
+@st.cache_resource
+def _scheduler() -> "Scheduler":
+    # crawl catalog (BAYUT_CATALOG) with its refresh queue and last frame per target
+    from crawler import Scheduler, load_catalog
+    return Scheduler(load_catalog(), fetcher=_fetcher(), cache=_parse_cache())
+
+@st.cache_resource
+def _scrape_lock():
+    # one scrape per server process; other sessions wait for its snapshot
+    return threading.Lock()
+
+def _render_progress(slot, rows: list, done: int, running: RunningPrices):
+    """Running counts and averages plus the latest rows, while a scrape streams in."""
+    # featured cards repeat across pages: each one counts once
+    running.add(rows_to_frame(rows[done:]))
+    with slot.container():
+        st.caption(f"Scraping Bayut… {len(running.seen):,} listings so far")
+        p1, p2 = st.columns(2)
+        for col, status in ((p1, "Buy"), (p2, "Rent")):
+            n, mean = running.average(status)
+            col.metric(f"Average Price ({status}, so far)", f"{mean:,.0f}" if n else "—", help=f"{n:,} priced listings")
+        st.dataframe(pd.DataFrame(rows[-10:]), use_container_width=True, hide_index=True)
+
+def _refresh_listings():
     """
-    cards = soup.select("div.d6e81fd0")
-    if cards:
-        return cards
-    # fallback: parents of title nodes
-    h2s = soup.select('h2[aria-label="Title"]')
-    parents = []
-    for h in h2s:
-        p = h
-        for _ in range(3):
-            if p and p.parent:
-                p = p.parent
-        if p:
-            parents.append(p)
-    if parents:
-        return parents
-    # last resort
-    return soup.find_all("article") or soup.find_all("div")
-
-def _bayut(url: str, status_label: str):
+    Stream the due catalog targets (rows appear as cards are parsed), then
+    store the combined frame as the new snapshot.
     """
-    Scrape one Bayut page and return list of parsed dicts.
-    """
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.content, "html.parser")
-    rows, errs = [], 0
-    for card in _find_cards(soup):
-        try:
-            rows.append(_parse_card(card, status_label))
-        except Exception:
-            errs += 1
-            continue
-    if len(rows) == 0 and errs > 0:
-        st.warning(
-            f"No cards parsed from {status_label} URL; {errs} cards failed to parse. "
-            "Bayut markup may have changed."
-        )
-    return rows
-
-@st.cache_data(show_spinner=True, ttl=60*30)
-def scrape_status(status: str) -> pd.DataFrame:
+    lock = _scrape_lock()
+    if not lock.acquire(blocking=False):
+        with st.spinner("Waiting for another session's scrape…"), lock:
+            return
+    try:
+        slot, rows, running, done, shown = st.empty(), [], RunningPrices(), 0, 0.0
+        for _, row in _scheduler().stream():
+            rows.append(row)
+            if time.monotonic() - shown > 0.5:
+                _render_progress(slot, rows, done, running)
+                done, shown = len(rows), time.monotonic()
+        slot.empty()
+        frame, created = _scheduler().frame(), time.time()
+        if frame.empty:
+            st.warning("No cards parsed from any catalog target; Bayut markup may have changed.")
+        # price sketches built while the rows streamed in, stored with the snapshot
+        sketches = _scheduler().sketches()
+        changes = _listing_index().record("listings", frame, created)
+        snap = _store().save("listings", frame.sort_values("Status", kind="stable"),
+                             metrics=change_counts(changes), created=created,
+                             tables={SNAPSHOT_TABLE: sketches.to_frame()})
+        _history().record("listings", snap.frame, snap.created)
+        _sketches().record("listings", sketches, snap.created)
+        listing_store.clear()
+    finally:
+        lock.release()
+
+# short in-process TTL: reading the on-disk snapshot only takes milliseconds
+@st.cache_resource(ttl=60)
+def listing_store():
     """
-    Scrape per-status (Buy or Rent) so UI switching fetches the right URL.
+    Latest stored snapshot as one ListingStore shared by every session, or
+    None before the first scrape. The raw price/area text is read from the
+    snapshot file only if the table shows it.
     """
-    url = SALE_URL if status == "Buy" else RENT_URL
-    data = _bayut(url, status)
-    # ensure schema even with zero results
-    df = pd.DataFrame(data, columns=SCHEMA)
-    for col in SCHEMA:
-        if col not in df.columns:
-            df[col] = np.nan
-    return df[SCHEMA].copy()
+    store = _store()
+    snap = store.load("listings", exclude=RAW_COLUMNS)
+    if snap is None:
+        return None
+    path = store.frame_path("listings", snap.version)
+    return ListingStore(
+        snap.frame,
+        raw_loader=lambda: pd.read_parquet(path, columns=RAW_COLUMNS),
+        key=("listings", snap.version),
+    )
 
 # -----------------------------
 # Data (scrape both for metrics)
 # -----------------------------
-with st.spinner("Scraping Bayut…"):
-    # scrape both sides for ABS/ARS/ROI
-    df_buy  = scrape_status("Buy")
-    time.sleep(0.3)  # be polite
-    df_rent = scrape_status("Rent")
-
-df_all = pd.concat([df_buy, df_rent], ignore_index=True)
+if _snapshot_age() >= _store().ttl:
+    try:
+        _refresh_listings()
+    except Exception as e:
+        if _store().latest_version("listings") is None:
+            raise
+        st.warning(f"Refresh failed ({e}); showing the snapshot from {_snapshot_age() / 60:,.0f} min ago.")
+listings = listing_store()
+if listings is None:
+    # another session's scrape failed before any snapshot was stored
+    st.error("No listings snapshot yet: the first scrape failed. Try again in a minute.")
+    st.stop()
+# Status x Bedrooms x Agency aggregates behind the metric cards and charts
+cube = listings.cube
 
 # -----------------------------
 # Metrics
 # -----------------------------
-ABS1 = df_buy["Price"].dropna().mean() if not df_buy.empty else np.nan
-ARS1 = df_rent["Price"].dropna().mean() if not df_rent.empty else np.nan
-ROI1 = (ARS1 * 12 / ABS1) if (pd.notna(ABS1) and pd.notna(ARS1) and ABS1 > 0) else np.nan
+ABS1, ARS1, ROI1 = cube_metrics(cube)
 
 c1, c2, c3 = st.columns(3)
 c1.metric("Average Price (Buy)", f"{ABS1:,.0f}" if pd.notna(ABS1) else "—", help="AED")
-c2.metric("Average Price (Rent)", f"{ARS1:,.0f}" if pd.notna(ARS1) else "—", help="AED (often monthly/yearly)")
-c3.metric("ROI (Rent ÷ Buy, annualized)", f"{ROI1:.2f}×" if pd.notna(ROI1) else "—")
+c2.metric("Average Rent (yearly)", f"{ARS1:,.0f}" if pd.notna(ARS1) else "—", help="AED per year; monthly rents count × 12")
+c3.metric("ROI (yearly Rent ÷ Buy)", f"{ROI1:.2%}" if pd.notna(ROI1) else "—", help="Average yearly rent over average buy price")
+
+@st.cache_data(ttl=60)
+def price_stats(key) -> dict:
+    """{status: median / p90 of the last scrape and distinct listings seen lately}; {} before the first sketch."""
+    _, version = key  # listings.key
+    table = _store().load_table("listings", SNAPSHOT_TABLE, version=version)
+    if table is None:
+        return {}
+    latest = SketchSet.from_frame(table)
+    recent = _sketches().recent("listings")
+    return {s: dict(latest.summary(s), seen=recent.summary(s)["listings"]) for s in ("Buy", "Rent")}
+
+stats = price_stats(listings.key)
+if stats:
+    s1, s2, s3, s4 = st.columns(4)
+    for col, status in ((s1, "Buy"), (s3, "Rent")):
+        p50, p90 = stats[status]["p50"], stats[status]["p90"]
+        col.metric(f"Median Price ({status})", f"{p50:,.0f}" if pd.notna(p50) else "—",
+                   help="AED, within 1% (streaming quantile sketch)")
+    for col, status in ((s2, "Buy"), (s4, "Rent")):
+        p90 = stats[status]["p90"]
+        col.metric(f"p90 Price ({status})", f"{p90:,.0f}" if pd.notna(p90) else "—",
+                   help=f"{stats[status]['seen']:,} distinct {status} listings seen in the last {SEEN_DAYS} days")
+
+@st.cache_data(ttl=60)
+def listing_changes(key) -> pd.DataFrame:
+    # ``key`` (the snapshot version) only keys the cache: the index holds the last scrape's feed
+    return _listing_index().changes("listings")
+
+changes = listing_changes(listings.key)
+counts = change_counts(changes)
+st.caption(
+    f"Since the last refresh: {counts['new']:,} new · {counts['removed']:,} removed · "
+    f"{counts['price']:,} price changes"
+)
+if len(changes):
+    with st.expander("Changed listings"):
+        st.dataframe(changes.drop(columns=["Listing"]), use_container_width=True, hide_index=True)
 
 st.divider()
 
@@ -188,21 +223,11 @@ with left:
 
 with right:
     # build choices from all data (so options don't disappear)
-    beds_unique = ["All"] + sorted([
-        b for b in df_all["Bedrooms"].dropna().unique().tolist() if b != "N/A"
-    ])
+    beds_unique = ["All"] + [b for b in cube.bedrooms if b != "N/A"]
     bed_choice = st.selectbox("Number of Bedrooms", options=beds_unique, index=0)
 
-# Select frame according to UI
-if status_choice == "All":
-    df_selected = df_all
-elif status_choice == "Buy":
-    df_selected = scrape_status("Buy")
-else:
-    df_selected = scrape_status("Rent")
-
 # Guard empty
-if df_selected.empty:
+if cube.get(status_choice).count == 0:
     st.warning(f"No listings found for {status_choice}.")
     st.stop()
 
@@ -216,7 +241,7 @@ def fig_abs_ars():
         float(ABS1) if pd.notna(ABS1) else 0,
         float(ARS1) if pd.notna(ARS1) else 0,
     ]
-    fig = go.Figure(go.Bar(x=x, y=y, hovertext=["Average Buy Price", "Average Rent Price"]))
+    fig = go.Figure(go.Bar(x=x, y=y, hovertext=["Average Buy Price", "Average Yearly Rent"]))
     fig.update_traces(marker_line_color="rgb(0,0,0)", marker_line_width=1, opacity=0.9)
     fig.update_layout(
         title="ABS & ARS",
@@ -229,26 +254,20 @@ def fig_abs_ars():
 
     return fig
 
-def fig_bed(df_for_plot: pd.DataFrame, status_sel: str, bed_sel: str):
-    if df_for_plot.empty:
+def fig_bed(cube: Cube, status_sel: str, bed_sel: str):
+    # counts come straight from the aggregate cube
+    if cube.get(status_sel).count == 0:
         return go.Figure()
 
-    if status_sel == "All" and bed_sel == "All":
-        groups = df_for_plot["Bedrooms"].value_counts().sort_index()
-        x, y = groups.values.tolist(), groups.index.tolist()
-        xaxis_title = "Number of Bedrooms"
-    elif bed_sel == "All":
-        groups = df_for_plot["Bedrooms"].value_counts().sort_index()
-        x, y = groups.values.tolist(), groups.index.tolist()
-        xaxis_title = f"Number of Bedrooms ({status_sel})"
+    if bed_sel == "All":
+        counts = cube.counts_by_bedrooms(status_sel)
+        x, y = [n for _, n in counts], [b for b, _ in counts]
+        xaxis_title = "Number of Bedrooms" if status_sel == "All" else f"Number of Bedrooms ({status_sel})"
     elif status_sel == "All":
-        a = df_buy[df_buy["Bedrooms"] == bed_sel]["Bedrooms"].count()
-        b = df_rent[df_rent["Bedrooms"] == bed_sel]["Bedrooms"].count()
-        x, y = [a, b], ["Buy", "Rent"]
+        x, y = [cube.get("Buy", bed_sel).count, cube.get("Rent", bed_sel).count], ["Buy", "Rent"]
         xaxis_title = f"Count of {bed_sel} Bedroom"
     else:
-        a = df_for_plot[(df_for_plot["Status"] == status_sel) & (df_for_plot["Bedrooms"] == bed_sel)]["Bedrooms"].count()
-        x, y = [a], [status_sel]
+        x, y = [cube.get(status_sel, bed_sel).count], [status_sel]
         xaxis_title = f"Count of {bed_sel} Bedroom ({status_sel})"
 
     fig = go.Figure(go.Bar(x=x, y=y, orientation="h"))
@@ -264,11 +283,113 @@ def fig_bed(df_for_plot: pd.DataFrame, status_sel: str, bed_sel: str):
 
     return fig
 
+@st.cache_resource
+def _figures() -> FigureCache:
+    # built figures per (chart, status, bedrooms), shared by all sessions
+    return FigureCache()
+
+# listing_store() hands out the same store (and Cube) until the snapshot is
+# reloaded, so the cube itself identifies the snapshot (the cache holds it, so it can't be reused)
 g1, g2 = st.columns([1, 2])
 with g1:
-    st.plotly_chart(fig_abs_ars(), use_container_width=True)
+    st.plotly_chart(_figures().get(cube, ("abs_ars",), fig_abs_ars), use_container_width=True)
 with g2:
-    st.plotly_chart(fig_bed(df_selected, status_choice, bed_choice), use_container_width=True)
+    st.plotly_chart(
+        _figures().get(cube, ("bed", status_choice, bed_choice), lambda: fig_bed(cube, status_choice, bed_choice)),
+        use_container_width=True,
+    )
+
+# -----------------------------
+# Investment analytics
+# -----------------------------
+@st.cache_resource
+def _analytics() -> AnalyticsEngine:
+    # one engine per process: cells unchanged since the last snapshot are reused
+    return AnalyticsEngine()
+
+def fig_ppsf(result, status_sel: str, bed_sel: str):
+    fig = go.Figure()
+    # buy and yearly rent AED/sqft are different scales: never merged
+    for status in (["Buy", "Rent"] if status_sel == "All" else [status_sel]):
+        x, y = result.distribution(status, bed_sel)
+        fig.add_trace(go.Bar(x=x, y=y, name=f"{status} AED/sqft" + (" per year" if status == "Rent" else "")))
+    fig.update_layout(
+        title=f"Price per sqft ({bed_sel} bedrooms)",
+        title_x=0.5,
+        bargap=0,
+        xaxis=dict(title="AED/sqft", type="log"),
+        yaxis_title="Listings",
+    )
+    return fig
+
+def fig_yield(result):
+    matrix = result.yield_matrix()
+    fig = go.Figure(go.Heatmap(
+        z=matrix.to_numpy() * 100, x=list(matrix.columns), y=list(matrix.index),
+        colorbar=dict(title="%"), hovertemplate="%{y} bedrooms, %{x} sqft: %{z:.1f}%<extra></extra>",
+    ))
+    fig.update_layout(
+        title="Gross Rental Yield (median yearly rent ÷ median price)",
+        title_x=0.5,
+        xaxis_title="Area (sqft)",
+        yaxis_title="Bedrooms",
+    )
+    return fig
+
+st.subheader("Investment Analytics")
+result = _analytics().update(listings.core, listings.key)
+a1, a2 = st.columns([1, 1])
+with a1:
+    st.plotly_chart(
+        _figures().get(cube, ("ppsf", status_choice, bed_choice), lambda: fig_ppsf(result, status_choice, bed_choice)),
+        use_container_width=True,
+    )
+with a2:
+    st.plotly_chart(_figures().get(cube, ("yield",), lambda: fig_yield(result)), use_container_width=True)
+q = result.quantiles(status_choice, bed_choice) if status_choice != "All" else {}
+if q and pd.notna(q[0.5]):
+    st.caption(
+        f"{status_choice} AED/sqft{' per year' if status_choice == 'Rent' else ''}: "
+        f"p10 {q[0.1]:,.0f} · median {q[0.5]:,.0f} · p90 {q[0.9]:,.0f}"
+    )
+outliers = listings.core[result.outliers]
+if len(outliers):
+    with st.expander(f"{len(outliers):,} listings priced far from their cell (bedrooms × area bucket)"):
+        shown = ["Status", "Building", "Price", "Period", "Bedrooms", "Area (sqft)", "Agency", "Key Words"]
+        st.dataframe(outliers[[c for c in shown if c in outliers.columns]], use_container_width=True, hide_index=True)
+
+# -----------------------------
+# Trend (pre-aggregated scrape history)
+# -----------------------------
+@st.cache_data(ttl=60)
+def history_trend(freq: str, bedrooms: str) -> pd.DataFrame:
+    return _history().trend("listings", freq, bedrooms=bedrooms)
+
+def fig_trend(trend: pd.DataFrame, bed_sel: str, freq: str):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=trend.index, y=trend["buy_ppsf"], name="Buy AED/sqft (median)", mode="lines+markers"))
+    fig.add_trace(go.Scatter(x=trend.index, y=trend["rent_ppsf"], name="Rent AED/sqft per year (median)", mode="lines+markers"))
+    fig.add_trace(go.Scatter(
+        x=trend.index, y=trend["yield_index"], name="Rent yield index",
+        mode="lines", line=dict(dash="dot"), yaxis="y2",
+    ))
+    fig.update_layout(
+        title=f"Price Trend ({bed_sel} bedrooms, {freq})",
+        title_x=0.5,
+        yaxis=dict(title="AED/sqft"),
+        yaxis2=dict(title="Yearly rent / Buy", overlaying="y", side="right", showgrid=False),
+    )
+    return fig
+
+freq_choice = st.radio("Trend resolution", options=["daily", "weekly"], horizontal=True)
+trend_df = history_trend(freq_choice, bed_choice)
+if trend_df.empty:
+    st.caption("No scrape history yet; the trend fills in as refreshes are recorded.")
+else:
+    st.plotly_chart(
+        _figures().get(cube, ("trend", freq_choice, bed_choice), lambda: fig_trend(trend_df, bed_choice, freq_choice)),
+        use_container_width=True,
+    )
 
 st.divider()
 
@@ -276,19 +397,67 @@ st.divider()
 # Data table
 # -----------------------------
 st.subheader("Listings Table")
-st.caption("Sort/filter within the table as needed.")
+st.caption("Filter with `{Column} op value` clauses joined by `&&`, e.g. `{Price} >= 500000 && {Agency} contains Luxury`.")
 
-table_df = df_selected.copy().sort_values(["Status", "Price"], na_position="last")
+PAGE_SIZE = 50
 display_cols = [
-    "Status", "Price", "Price (raw)", "Location", "Key Words",
+    "Status", "Building", "Area", "Price", "Price (raw)", "Location", "Key Words",
     "Bedrooms", "Area (sqft)", "Area (raw)", "Agency"
 ]
-have_cols = [c for c in display_cols if c in table_df.columns]
-
-st.dataframe(table_df[have_cols], use_container_width=True, height=420)
+have_cols = [c for c in display_cols if c in listings.core.columns or c in RAW_COLUMNS]
+# raw text is display-only: sorting and filtering work on the parsed columns
+query_cols = [c for c in have_cols if c not in RAW_COLUMNS]
+
+@st.cache_data(ttl=60)
+def table_page(key, status: str, page: int, sort_col: str, ascending: bool, filter_query: str):
+    """One page of the listings table of the store ``key`` names; only these rows are sent to the browser."""
+    store = listing_store()
+    if store is None:
+        st.error("The listings snapshot is gone; reload the page.")
+        st.stop()
+    direction = "asc" if ascending else "desc"
+    if sort_col == "Status, Price":
+        sort_by = [{"column_id": "Status", "direction": direction}, {"column_id": "Price", "direction": direction}]
+    else:
+        sort_by = [{"column_id": sort_col, "direction": direction}]
+    rows, total = query_page(store.view(status), page, PAGE_SIZE, sort_by, filter_query, cache=store.positions(status))
+    return store.rows(rows.index, have_cols), total
+
+t1, t2, t3, t4 = st.columns([2, 1, 4, 1])
+with t1:
+    sort_col = st.selectbox("Sort by", options=["Status, Price"] + query_cols)
+with t2:
+    ascending = st.toggle("Ascending", value=True)
+with t3:
+    filter_query = st.text_input("Filter", value="", placeholder="{Price} < 100000")
+with t4:
+    page = st.number_input("Page", min_value=1, value=1, step=1)
+
+table_df, total = table_page(listings.key, status_choice, int(page) - 1, sort_col, ascending, filter_query)
+pages = page_count(total, PAGE_SIZE)
+if page > pages:
+    # a narrower filter can leave the page number past the end
+    page = pages
+    table_df, total = table_page(listings.key, status_choice, page - 1, sort_col, ascending, filter_query)
+st.dataframe(table_df, use_container_width=True, height=420)
+st.caption(f"{total:,} matching listings · page {int(page)} of {pages}")
 
 st.info(
     "Notes:\n"
-    "- Bayut can change HTML structure; adjust `_parse_card` selectors if scraping fails.\n"
-    "- Rent prices can be monthly or yearly; ROI shown is Rent × 12 / Buy (simplified)."
+    "- Bayut can change HTML structure; adjust `parse_card` selectors in scraper.py if scraping fails.\n"
+    "- Rent prices can be monthly or yearly; each is annualized (per the period shown with it) before "
+    "averaging, and ROI is the average yearly rent ÷ the average buy price."
 )
+
+# -----------------------------
+# Diagnostics
+# -----------------------------
+if st.sidebar.checkbox("Show diagnostics", value=False, disabled=not instrument.ENABLED,
+                       help="Fetch, parse and frame-build metrics of this server process (off with BAYUT_METRICS=0)."):
+    st.subheader("Diagnostics")
+    diag = pd.DataFrame(instrument.summary(), columns=["metric", "labels", "count", "mean", "value"])
+    cards = diag[diag["metric"] == "bayut_cards_total"]
+    failed = cards[cards["labels"].str.contains('outcome="failed"')]["value"].sum()
+    if failed:
+        st.warning(f"{failed:,.0f} cards failed to parse in this process; see bayut_cards_total by strategy.")
+    st.dataframe(diag, use_container_width=True, hide_index=True)
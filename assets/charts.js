@@ -0,0 +1,33 @@
+// assets/charts.js
+// Clientside callbacks of dashapp's graph1 / graph2. The 'charts' store holds,
+// per dropdown selection, the dotted paths that change ("data.0.x",
+// "layout.xaxis.title.text", ...; see dashapp.chart_changes); a selection sets
+// them in a copy of the figure already on the page, without a request.
+(function () {
+    function apply(changes, figure) {
+        if (!changes || !figure) {
+            return window.dash_clientside.no_update;
+        }
+        var out = JSON.parse(JSON.stringify(figure));
+        Object.keys(changes).forEach(function (path) {
+            var keys = path.split('.');
+            var node = out;
+            keys.slice(0, -1).forEach(function (key) {
+                node = node[key] = node[key] || {};
+            });
+            node[keys[keys.length - 1]] = changes[path];
+        });
+        return out;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        charts: {
+            graph1: function (status, charts, figure) {
+                return apply(charts && charts.graph1[status], figure);
+            },
+            graph2: function (status, bedrooms, charts, figure) {
+                return apply(charts && charts.graph2[status + '|' + bedrooms], figure);
+            }
+        }
+    });
+})();
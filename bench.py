@@ -0,0 +1,256 @@
+# bench.py
+"""
+Parser & pipeline benchmarks over recorded or synthetic Bayut result pages.
+
+    python bench.py                    # run and compare against bench_baseline.json
+    python bench.py --save             # run and store the results as the new baseline
+    python bench.py --fixtures DIR     # recorded pages (*.html; "rent" in the name -> Rent)
+    python bench.py --replay DIR       # pages from an httpcache recording (BAYUT_HTTP_CACHE=record)
+    python bench.py --cards 24,5000    # synthetic sizes (cards per status)
+
+Each case reports best-of-N wall time, throughput and tracemalloc peak memory.
+A case slower or hungrier than ``--tolerance`` x its baseline is a regression
+and makes the run exit non-zero. The first run on a machine writes the baseline.
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import httpcache
+from analytics import AnalyticsEngine
+from listings import ListingStore
+from sketch import SketchSet
+from pipeline import Cube, price_metrics, rows_to_frame
+from scraper import PARSERS, STATUS_URLS, CardStream, Fetcher, HostLimiter, make_session, parse_page
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+CARDS_PER_PAGE = 24
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+def _card(i: int, status: str) -> str:
+    price = f"{(i % 7 + 1) * 150000:,}" if status == "Buy" else f"{(i % 5 + 1) * 8000:,}"
+    freq = "" if status == "Buy" else f'<span aria-label="Frequency">{"Monthly" if i % 3 else "Yearly"}</span>'
+    beds = "Studio" if i % 5 == 0 else str(i % 4 + 1)
+    return (
+        f'<li role="article"><article class="ca2f5674"><div class="d6e81fd0">'
+        f'<div class="_4041eb80"><span aria-label="Price"><span class="c2cc9762">AED</span>'
+        f'<span class="f343d9ce">{price}</span></span>{freq}'
+        f'<div class="_7afabd84" aria-label="Location">DAMAC Towers by Paramount, Business Bay, Dubai</div>'
+        f'<h2 aria-label="Title" class="_7f17f34f">Fully furnished {beds} bed unit #{i} | Canal view</h2>'
+        f'<div class="_22b2f6ed"><span class="b6a29bc0" aria-label="Beds">{beds}</span>'
+        f'<span class="b6a29bc0" aria-label="Baths">{i % 3 + 1}</span>'
+        f'<span aria-label="Area"><span>{650 + i % 900:,} sqft</span></span></div></div>'
+        f'<img class="_062617f4" title="Agency {i % 17} Real Estate" alt="Agency {i % 17}" src="/a/{i % 17}.png">'
+        f"</div></article></li>"
+    )
+
+def synthetic_page(status: str, page: int, n_cards: int = CARDS_PER_PAGE) -> bytes:
+    start = (page - 1) * CARDS_PER_PAGE
+    cards = "".join(_card(start + j, status) for j in range(n_cards))
+    pager = "".join(f'<a href="/page-{k}/">{k}</a>' for k in range(max(1, page - 2), page + 3))
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Bayut</title>'
+        f'<script>window.state={{"page":{page}}}</script></head><body>'
+        f'<header><span class="fontCompensation">{status}</span></header>'
+        f'<main><ul class="_357a9937">{cards}</ul><div role="navigation">{pager}</div></main>'
+        "</body></html>"
+    ).encode()
+
+def synthetic_pages(status: str, n_cards: int) -> list:
+    pages, page = [], 1
+    while n_cards > 0:
+        pages.append(synthetic_page(status, page, min(CARDS_PER_PAGE, n_cards)))
+        n_cards -= CARDS_PER_PAGE
+        page += 1
+    return pages
+
+def recorded_pages(directory: str) -> dict:
+    pages = {"Buy": [], "Rent": []}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        status = "Rent" if "rent" in os.path.basename(path).lower() else "Buy"
+        with open(path, "rb") as f:
+            pages[status].append(f.read())
+    return pages
+
+def replay_fetcher(directory: str) -> Fetcher:
+    """A Fetcher answered entirely from an httpcache recording, with no latency or rate limit."""
+    session = httpcache.mount(make_session(http_cache=None), "replay", httpcache.HttpCache(directory), latency=0)
+    return Fetcher(session=session, conditional=False, limiter=HostLimiter(0))
+
+def replayed_pages(fetcher: Fetcher) -> dict:
+    pages = fetcher.fetch_many(STATUS_URLS.values())
+    return {status: pages[url] for status, url in STATUS_URLS.items()}
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def measure(fn, items: int, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": best,
+        "items": items,
+        "per_sec": items / best if best > 0 else float("inf"),
+        "peak_kb": peak / 1024,
+    }
+
+def _dashapp():
+    """dashapp with its background scrape disabled, or None if Dash isn't installed."""
+    os.environ.setdefault("BAYUT_REFRESH", "0")
+    try:
+        import dashapp
+    except ImportError as e:
+        print(f"  (dashapp cases skipped: {e})", file=sys.stderr)
+        return None
+    return dashapp
+
+def cases(pages: dict, label: str):
+    """Yield (name, fn, items) for one fixture set of {status: [page bytes]}."""
+    n_cards = sum(len(parse_page(p, s)[0]) for s, ps in pages.items() for p in ps)
+    for backend in PARSERS:
+        yield (f"parse[{backend}]/{label}",
+               lambda b=backend: [parse_page(p, s, backend=b) for s, ps in pages.items() for p in ps],
+               n_cards)
+
+    rows = {s: [r for p in ps for r in parse_page(p, s)[0]] for s, ps in pages.items()}
+    all_rows = rows["Buy"] + rows["Rent"]
+    yield f"frame/{label}", lambda: rows_to_frame(all_rows), len(all_rows)
+
+    df_buy, df_rent = rows_to_frame(rows["Buy"]), rows_to_frame(rows["Rent"])
+    yield f"metrics/{label}", lambda: price_metrics(df_buy, df_rent), len(all_rows)
+
+    frame = rows_to_frame(all_rows)
+    yield f"cube/{label}", lambda: Cube(frame), len(all_rows)
+    yield f"store/{label}", lambda: ListingStore(frame).view("Buy"), len(all_rows)
+
+    yield f"sketch/{label}", lambda: SketchSet().add(frame), len(all_rows)
+    sketches = SketchSet().add(frame)
+    yield f"sketch.summary/{label}", lambda: [sketches.summary(s) for s in ("Buy", "Rent", "All")], 3
+
+    yield f"analytics/{label}", lambda: AnalyticsEngine().update(frame), len(all_rows)
+    # consecutive snapshots that differ in one cell: only that cell is recomputed
+    changed = frame.copy()
+    changed.loc[0, "Price"] = changed.loc[0, "Price"] * 1.05
+    engine, snapshots = AnalyticsEngine(), itertools.cycle([changed, frame])
+    engine.update(frame)
+    yield f"analytics.incremental/{label}", lambda: engine.update(next(snapshots)), len(all_rows)
+
+    dashapp = _dashapp()
+    if dashapp is None:
+        return
+    def stream_rows():
+        # what dashapp.scrap() gets from scheduler().stream(): every page fed through a CardStream
+        out = {}
+        for s, ps in pages.items():
+            for p in ps:
+                stream = CardStream(s)
+                out.setdefault(s, []).extend(stream.feed(p) + stream.close())
+        return out
+    yield f"dash.stream/{label}", stream_rows, n_cards
+    where = ["Business Bay", "DAMAC Towers"]
+    rows = stream_rows()
+    gg = [[[r[f] for f in dashapp.FIELDS] + where for r in rows[s]] for s in ("Rent", "Buy")]
+    yield f"dash.snapshot/{label}", lambda: dashapp.snapshot_data(gg), len(gg[0]) + len(gg[1])
+
+    frame, metrics = dashapp.snapshot_data(gg)
+    snap = dashapp.Snapshot(frame, metrics)
+    combos = [(st, bd) for st in dashapp.get_status(snap) for bd in dashapp.get_bed(snap)]
+    yield (f"dash.fig_bed/{label}",
+           lambda: [dashapp.fig_bed(st, bd, snap) for st, bd in combos],
+           len(combos))
+    yield (f"dash.fig_abs_ars/{label}",
+           lambda: [dashapp.fig_abs_ars(st, snap) for st in dashapp.get_status(snap)],
+           len(dashapp.get_status(snap)))
+    # warm FigureCache: what repeated dropdown changes cost
+    [dashapp.cached_fig_bed(st, bd, snap) for st, bd in combos]
+    yield (f"dash.cached_figs/{label}",
+           lambda: [(dashapp.cached_fig_abs_ars(st, snap), dashapp.cached_fig_bed(st, bd, snap)) for st, bd in combos],
+           len(combos))
+
+# -----------------------------
+# Baseline comparison
+# -----------------------------
+# differences below these are timer/allocator noise, whatever the ratio
+NOISE_FLOOR = {"seconds": 0.002, "peak_kb": 64}
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key, floor in NOISE_FLOOR.items():
+            if base[key] > 0 and r[key] / base[key] > tolerance and r[key] - base[key] > floor:
+                regressions.append(f"{name}: {key} {base[key]:.4g} -> {r[key]:.4g} ({r[key] / base[key]:.2f}x)")
+    return regressions
+
+def report(results: dict, baseline: dict):
+    print(f"{'case':<34}{'time (ms)':>12}{'per sec':>12}{'peak (KiB)':>12}{'vs base':>9}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        ratio = f"{r['seconds'] / base['seconds']:.2f}x" if base and base["seconds"] > 0 else "—"
+        print(f"{name:<34}{r['seconds'] * 1e3:>12.2f}{r['per_sec']:>12,.0f}{r['peak_kb']:>12,.0f}{ratio:>9}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--fixtures", help="directory of recorded result pages (*.html)")
+    ap.add_argument("--replay", help="httpcache directory to fetch the status URLs from")
+    ap.add_argument("--cards", default="24,2400", help="comma-separated synthetic sizes, cards per status")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=1.25)
+    ap.add_argument("--save", action="store_true", help="store these results as the baseline")
+    args = ap.parse_args(argv)
+
+    fixture_sets = {}
+    if args.fixtures:
+        fixture_sets["recorded"] = recorded_pages(args.fixtures)
+    if args.replay:
+        fetcher = replay_fetcher(args.replay)
+        fixture_sets["replay"] = replayed_pages(fetcher)
+    for n in (int(c) for c in args.cards.split(",") if c.strip()):
+        fixture_sets[f"{n}"] = {s: synthetic_pages(s, n) for s in ("Buy", "Rent")}
+
+    results = {}
+    if args.replay:
+        # the whole fetch path (pool, page discovery, body handling), no network
+        n_pages = sum(len(ps) for ps in fixture_sets["replay"].values())
+        results["fetch/replay"] = measure(lambda: replayed_pages(fetcher), n_pages, args.repeat)
+    for label, pages in fixture_sets.items():
+        for name, fn, items in cases(pages, label):
+            results[name] = measure(fn, items, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.save or not baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# cli.py
+"""
+Headless batch runs of the scrape -> normalize -> metrics pipeline, for cron
+jobs and backfills; nothing here starts Streamlit or Dash.
+
+    python cli.py scrape --out listings.parquet                  # the catalog (BAYUT_CATALOG or the one tower)
+    python cli.py scrape --catalog towers.json --out l.jsonl     # any crawler catalog; .jsonl writes JSON lines
+    python cli.py scrape --url https://www.bayut.com/to-rent/... # results URLs ("to-rent" in the URL -> Rent)
+    python cli.py scrape --html pages/ --workers 8 --out l.parquet
+    python cli.py scrape --replay .httpcache --metrics m.json    # a recorded scrape (see httpcache.py)
+    python cli.py scrape --record listings                       # also store a snapshot the apps will serve
+    python cli.py split pages/*.html --out cards/                # one HTML file per listing card
+
+``scrape`` fetches and parses pages concurrently (Fetcher.stream_rows) or,
+with ``--html``, parses recorded pages (*.html, any depth; "rent" in the file
+name -> Rent) in ``--workers`` processes. Repeated cards are dropped. It
+prints progress to stderr every ``--progress`` seconds and ends with the
+ABS / ARS / ROI metrics, median and p90 prices and throughput, as JSON on
+stdout or in ``--metrics``. The exit status is 1 when no card was parsed.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import lxml.html
+
+import httpcache
+import instrument
+from crawler import DEFAULT_CATALOG, Target, combine, load_catalog, target_frame
+from fingerprint import ListingIndex, change_counts
+from history import HistoryStore
+from pipeline import price_metrics
+from scraper import (CONCURRENCY, PARSER, PARSERS, Fetcher, HostLimiter, _find_cards_lxml, _lxml_root,
+                     make_session, parse_page)
+from sketch import SNAPSHOT_TABLE, SketchSet, SketchStore
+from sketch import price_metrics as sketch_metrics
+from snapshot import SnapshotStore, _storable
+
+FORMATS = ("parquet", "jsonl")
+
+# -----------------------------
+# Sources
+# -----------------------------
+def _url_status(url: str) -> str:
+    return "Rent" if "to-rent" in url else "Buy"
+
+def _targets(args) -> list:
+    if args.url:
+        return [(url, _url_status(url), args.area, args.building) for url in args.url]
+    if args.catalog is None and args.html:
+        return []
+    targets = load_catalog(args.catalog) if args.catalog else load_catalog()
+    return [(t.url, t.status, t.area, t.building) for t in targets]
+
+def _fetcher(args) -> Fetcher:
+    if args.replay:
+        session = httpcache.mount(make_session(http_cache=None), "replay", httpcache.HttpCache(args.replay), latency=0)
+        return Fetcher(session=session, concurrency=args.concurrency, conditional=False, limiter=HostLimiter(0))
+    return Fetcher(concurrency=args.concurrency)
+
+def html_files(paths) -> list:
+    """Every *.html under the given files / directories, sorted."""
+    out = []
+    for path in paths:
+        if os.path.isdir(path):
+            out.extend(glob.glob(os.path.join(path, "**", "*.html"), recursive=True))
+        else:
+            out.append(path)
+    return sorted(dict.fromkeys(out))
+
+def _file_status(path: str) -> str:
+    return "Rent" if "rent" in os.path.basename(path).lower() else "Buy"
+
+def _parse_file(path: str, backend: str):
+    # runs in a worker process: only the path goes over, only rows come back
+    with open(path, "rb") as f:
+        content = f.read()
+    rows, errors = parse_page(content, _file_status(path), backend=backend)
+    return rows, errors, len(content)
+
+# -----------------------------
+# Progress
+# -----------------------------
+class Progress:
+    """Running page / card counts, printed to ``out`` at most every ``every`` seconds."""
+
+    def __init__(self, every: float, out=sys.stderr):
+        self.every = every
+        self.out = out
+        self.pages = self.cards = self.failed = self.bytes = 0
+        self.start = self._shown = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.start
+
+    def add(self, pages: int = 0, cards: int = 0, failed: int = 0, nbytes: int = 0):
+        self.pages += pages
+        self.cards += cards
+        self.failed += failed
+        self.bytes += nbytes
+        if self.every and time.perf_counter() - self._shown >= self.every:
+            self.show()
+
+    def show(self):
+        self._shown = time.perf_counter()
+        secs = max(self.seconds, 1e-9)
+        pages = f"{self.pages:,} pages · " if self.pages else ""
+        print(f"  {pages}{self.cards:,} cards · {self.cards / secs:,.0f} cards/s · {self.seconds:,.1f}s", file=self.out)
+
+    def stats(self) -> dict:
+        secs = max(self.seconds, 1e-9)
+        return {
+            "pages": self.pages, "cards": self.cards, "failed": self.failed, "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "pages_per_sec": round(self.pages / secs, 2), "cards_per_sec": round(self.cards / secs, 2),
+        }
+
+def _counted(metric: str, **labels) -> float:
+    """Total of one instrument series across hosts (0 when metrics are off)."""
+    want = [f'{k}="{v}"' for k, v in labels.items()]
+    return sum(r["count"] if r["count"] is not None else r["value"]
+               for r in instrument.summary() if r["metric"] == metric and all(w in r["labels"] for w in want))
+
+# -----------------------------
+# scrape
+# -----------------------------
+def scrape_targets(args, targets: list, progress: Progress) -> list:
+    """Target frames for every (url, status, area, building), pages fetched and parsed concurrently."""
+    by_url = {url: (status, area, building) for url, status, area, building in targets}
+    rows = {url: [] for url in by_url}
+    fetcher = _fetcher(args)
+    # pages and bytes come from the process-wide counters: count this run's share
+    pages, nbytes = _counted("bayut_parse_page_seconds", backend="lxml-stream"), _counted("bayut_http_response_bytes_total")
+    for url, row in fetcher.stream_rows({u: s for u, (s, _, _) in by_url.items()}):
+        rows[url].append(row)
+        progress.add(cards=1)
+    progress.pages += int(_counted("bayut_parse_page_seconds", backend="lxml-stream") - pages)
+    progress.bytes += int(_counted("bayut_http_response_bytes_total") - nbytes)
+    return [target_frame(Target(area, building, status, ""), rows[url]) for url, (status, area, building) in by_url.items()]
+
+def parse_files(args, files: list, progress: Progress) -> list:
+    """One frame per recorded page file, parsed in ``args.workers`` processes."""
+    frames, rows = [], {"Buy": [], "Rent": []}
+    target = {s: Target(args.area, args.building, s, "") for s in rows}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # chunks keep the per-file IPC overhead small for thousands of small pages
+        chunk = max(1, min(64, len(files) // (args.workers * 4) or 1))
+        for path, (page_rows, errors, nbytes) in zip(files, pool.map(_parse_file, files, [args.backend] * len(files),
+                                                                    chunksize=chunk)):
+            rows[_file_status(path)].extend(page_rows)
+            progress.add(pages=1, cards=len(page_rows), failed=errors, nbytes=nbytes)
+    for status, status_rows in rows.items():
+        if status_rows:
+            frames.append(target_frame(target[status], status_rows))
+    return frames
+
+def _finite(v):
+    # strict JSON: NaN / inf become null
+    if isinstance(v, float) and not math.isfinite(v):
+        return None
+    return v
+
+def write_frame(frame, path: str, fmt: str = None):
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".json", ".ndjson")) else "parquet")
+    if fmt == "jsonl":
+        frame.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        _storable(frame).to_parquet(path, index=False)
+
+def summarize(frame, sketches: SketchSet, progress: Progress, parsed: int) -> dict:
+    buy, rent = frame[frame["Status"] == "Buy"], frame[frame["Status"] == "Rent"]
+    abs_, ars, roi = price_metrics(buy, rent)
+    out = {"ABS": abs_, "ARS": ars, "ROI": roi, "listings": len(frame), "buy": len(buy), "rent": len(rent),
+           "duplicates": parsed - len(frame)}
+    out.update(sketch_metrics(sketches))
+    out.update(progress.stats())
+    return {k: _finite(float(v) if hasattr(v, "item") else v) for k, v in out.items()}
+
+def record(name: str, frame, sketches: SketchSet) -> dict:
+    """Store ``frame`` the way the Streamlit app does: snapshot (with its sketches), history, change feed."""
+    created = time.time()
+    changes = ListingIndex().record(name, frame, created)
+    snap = SnapshotStore().save(name, frame.sort_values("Status", kind="stable"), metrics=change_counts(changes),
+                                created=created, tables={SNAPSHOT_TABLE: sketches.to_frame()})
+    HistoryStore().record(name, snap.frame, snap.created)
+    SketchStore().record(name, sketches, snap.created)
+    return {"version": snap.version, **change_counts(changes)}
+
+def cmd_scrape(args) -> int:
+    missing = [p for p in args.html or [] if not os.path.exists(p)]
+    if missing:
+        print(f"not found: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    targets, files = _targets(args), html_files(args.html or [])
+    if args.html and not files:
+        print(f"no *.html under {', '.join(args.html)}", file=sys.stderr)
+        return 1
+    progress = Progress(args.progress)
+    frames = []
+    if files:
+        print(f"parsing {len(files):,} pages in {args.workers} processes", file=sys.stderr)
+        frames += parse_files(args, files, progress)
+    if targets:
+        print(f"scraping {len(targets):,} targets, {args.concurrency} requests in flight", file=sys.stderr)
+        frames += scrape_targets(args, targets, progress)
+    parsed = sum(len(f) for f in frames)
+    frame = combine(frames)
+    progress.show()
+
+    if args.out:
+        write_frame(frame, args.out, args.format)
+        print(f"wrote {len(frame):,} listings to {args.out}", file=sys.stderr)
+    # one pass over the finished frame: a batch run has every row by now
+    sketches = SketchSet().add(frame)
+    metrics = summarize(frame, sketches, progress, parsed)
+    if args.record:
+        metrics["recorded"] = record(args.record, frame, sketches)
+    text = json.dumps(metrics, indent=2)
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if len(frame) else 1
+
+# -----------------------------
+# split
+# -----------------------------
+def cmd_split(args) -> int:
+    os.makedirs(args.out, exist_ok=True)
+    written = 0
+    for path in html_files(args.pages):
+        with open(path, "rb") as f:
+            _, cards = _find_cards_lxml(_lxml_root(f.read()))
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for i, card in enumerate(cards, 1):
+            with open(os.path.join(args.out, f"{stem}-{i:03d}.html"), "wb") as f:
+                f.write(lxml.html.tostring(card, encoding="utf-8"))
+            written += 1
+    print(f"wrote {written:,} cards to {args.out}", file=sys.stderr)
+    return 0 if written else 1
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="cli.py", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    sc = sub.add_parser("scrape", help="scrape targets or parse recorded pages into Parquet / JSONL plus metrics")
+    src = sc.add_argument_group("sources (default: the catalog)")
+    src.add_argument("--catalog", help="crawler catalog JSON (see crawler.load_catalog)")
+    src.add_argument("--url", action="append", help="results URL to scrape, every page of it; repeatable")
+    src.add_argument("--html", action="append", help="recorded page file or directory; repeatable")
+    src.add_argument("--replay", help="httpcache directory to answer every request from")
+    sc.add_argument("--area", default=DEFAULT_CATALOG[0]["area"], help="Area of --url / --html listings")
+    sc.add_argument("--building", default=DEFAULT_CATALOG[0]["building"], help="Building of --url / --html listings")
+    sc.add_argument("--out", help="listings file: .parquet, or .jsonl for JSON lines")
+    sc.add_argument("--format", choices=FORMATS, help="override the format picked from --out")
+    sc.add_argument("--metrics", help="write the metrics JSON here instead of stdout")
+    sc.add_argument("--record", metavar="NAME", help="also save a snapshot / history entry under NAME (app.py: listings)")
+    sc.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="--html parse processes")
+    sc.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight per host")
+    sc.add_argument("--backend", choices=PARSERS, default=PARSER, help="--html parser backend")
+    sc.add_argument("--progress", type=float, default=2.0, help="seconds between progress lines (0: none)")
+    sc.set_defaults(run=cmd_scrape)
+
+    sp = sub.add_parser("split", help="split result pages into one HTML file per listing card")
+    sp.add_argument("pages", nargs="+", help="page files or directories of *.html")
+    sp.add_argument("--out", required=True, help="directory for the card files")
+    sp.set_defaults(run=cmd_split)
+
+    args = ap.parse_args(argv)
+    return args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
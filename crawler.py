@@ -0,0 +1,184 @@
+# crawler.py
+"""
+Crawl catalog and scheduler: which (area, building, status) targets to scrape
+and in what order. How fast any one host is hit is up to the Fetcher's
+per-host limiter (scraper.HOST_LIMITER).
+"""
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import partial
+
+import pandas as pd
+
+from fingerprint import dedupe
+from pipeline import CATEGORICAL, TARGET_FIELDS, categorize, rows_to_frame
+from scraper import BUILDING_PATH, STATUS_SLUGS, Fetcher, ParseCache, status_url
+from sketch import RowSketcher, SketchSet
+from snapshot import REFRESH_INTERVAL
+
+# JSON list of {"area", "building", "path"[, "statuses", "weight"]}; unset = the one tower
+CATALOG_PATH = os.environ.get("BAYUT_CATALOG")
+# most targets fetched per crawl (0 = every due target)
+CRAWL_BATCH = int(os.environ.get("BAYUT_CRAWL_BATCH", "0"))
+
+DEFAULT_CATALOG = [
+    {"area": "Business Bay", "building": "DAMAC Towers by Paramount Hotels and Resorts", "path": BUILDING_PATH},
+]
+
+@dataclass(frozen=True)
+class Target:
+    area: str
+    building: str
+    status: str
+    path: str
+    # relative popularity; a target of weight 2 is due twice as often
+    weight: float = 1.0
+
+    @property
+    def url(self) -> str:
+        return status_url(self.status, self.path)
+
+def load_catalog(path: str = CATALOG_PATH) -> list:
+    """Catalog entries expanded to one Target per status."""
+    entries = DEFAULT_CATALOG
+    if path:
+        with open(path) as f:
+            entries = json.load(f)
+    return [
+        Target(e["area"], e["building"], status, e["path"].strip("/"), float(e.get("weight", 1.0)))
+        for e in entries
+        for status in e.get("statuses", list(STATUS_SLUGS))
+    ]
+
+class Scheduler:
+    """
+    Priority queue over catalog targets. A target falls due ``interval / weight``
+    seconds after its last crawl (never-crawled targets immediately); each
+    crawl takes the most overdue ones first, at most ``batch`` of them.
+
+    The latest frame of every target is kept, so ``crawl`` always returns the
+    whole catalog even when only part of it was refetched. Callers that keep
+    their own rows (consuming ``stream``) can turn that off with ``keep_frames``.
+    The price sketches of every target's last crawl are always kept: they are
+    built while its rows stream in and have a fixed size (see ``sketches``).
+    """
+
+    def __init__(self, targets, fetcher: Fetcher = None, cache: ParseCache = None,
+                 interval: float = REFRESH_INTERVAL, batch: int = CRAWL_BATCH, keep_frames: bool = True):
+        self.fetcher = fetcher or Fetcher()
+        self.cache = cache
+        self.keep_frames = keep_frames
+        self.interval = interval
+        self.batch = batch
+        self.frames = {}
+        # Target -> sketch.SketchSet of its last complete crawl
+        self.target_sketches = {}
+        self._seq = itertools.count()
+        self._queue = [(0.0, next(self._seq), t) for t in dict.fromkeys(targets)]
+        heapq.heapify(self._queue)
+        self._lock = threading.Lock()
+
+    def _push(self, due: float, target: Target):
+        heapq.heappush(self._queue, (due, next(self._seq), target))
+
+    def due(self, now: float = None) -> list:
+        """Pop the targets due by ``now``, most overdue first."""
+        now = time.time() if now is None else now
+        out = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now and not (self.batch and len(out) >= self.batch):
+                out.append(heapq.heappop(self._queue))
+        return out
+
+    def fetch(self, now: float = None) -> dict:
+        """{Target: [page bytes]} for every target that was due; they are rescheduled."""
+        entries = self.due(now)
+        if not entries:
+            return {}
+        targets = [t for _, _, t in entries]
+        try:
+            pages = self.fetcher.fetch_many(t.url for t in targets)
+        except BaseException:
+            # nothing was crawled: keep their place in the queue
+            with self._lock:
+                for due, _, t in entries:
+                    self._push(due, t)
+            raise
+        done = time.time()
+        with self._lock:
+            for t in targets:
+                self._push(done + self.interval / max(t.weight, 1e-9), t)
+        return {t: pages[t.url] for t in targets}
+
+    def stream(self, now: float = None):
+        """
+        Yield ``(target, row)`` for the due targets as each card is parsed
+        (see Fetcher.stream_rows). Once the stream is exhausted their frames
+        are replaced and they are rescheduled; a stream abandoned or failed
+        part-way leaves frames and queue as they were.
+        """
+        entries = self.due(now)
+        if not entries:
+            return
+        by_url = {t.url: t for _, _, t in entries}
+        rows = {t: [] for t in by_url.values()}
+        sketchers = {t: RowSketcher(partial(target_frame, t)) for t in by_url.values()}
+        finished = False
+        try:
+            for url, row in self.fetcher.stream_rows({u: t.status for u, t in by_url.items()}, cache=self.cache):
+                target = by_url[url]
+                rows[target].append(row)
+                sketchers[target].add(row)
+                yield target, row
+            finished = True
+        finally:
+            with self._lock:
+                if finished:
+                    done = time.time()
+                    for _, _, t in entries:
+                        self._push(done + self.interval / max(t.weight, 1e-9), t)
+                else:
+                    for due, _, t in entries:
+                        self._push(due, t)
+        for target, sketcher in sketchers.items():
+            self.target_sketches[target] = sketcher.finish()
+        if self.keep_frames:
+            for target, target_rows in rows.items():
+                self.frames[target] = target_frame(target, target_rows)
+
+    def crawl(self, now: float = None) -> pd.DataFrame:
+        """Refetch due targets and return one frame for the whole catalog."""
+        for _ in self.stream(now):
+            pass
+        return self.frame()
+
+    def frame(self) -> pd.DataFrame:
+        """The latest frames of every crawled target, combined."""
+        return combine(self.frames.values())
+
+    def sketches(self) -> SketchSet:
+        """The sketches of every crawled target's last crawl, merged: what ``frame`` holds, rents yearly."""
+        out = SketchSet()
+        for sketches in self.target_sketches.values():
+            out.merge(sketches)
+        return out
+
+def target_frame(target: Target, rows) -> pd.DataFrame:
+    df = rows_to_frame(rows)
+    df["Area"] = target.area
+    df["Building"] = target.building
+    return df
+
+def combine(frames) -> pd.DataFrame:
+    frames = list(frames)
+    if not frames:
+        return target_frame(Target("", "", "Buy", ""), [])
+    # categories differ per target, so concat yields objects; recode once.
+    # featured cards repeat across a target's pages: keep one of each. Cards
+    # of different targets never match (fingerprint hashes the target too)
+    return categorize(dedupe(pd.concat(frames, ignore_index=True)), CATEGORICAL + TARGET_FIELDS)
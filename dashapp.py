@@ -1,156 +1,158 @@
-import requests
-from bs4 import BeautifulSoup
-import re
+import os
+import sys
+from functools import lru_cache
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.io as pio
-pio.renderers.default = "browser"
-import dash
+# dash loads IPython (and with it jedi and prompt_toolkit, ~0.5 s) for notebook
+# display whenever it is installed. A server never shows a notebook: hide it
+# for the import, unless a notebook session has already loaded it
+_HIDE_IPYTHON = 'IPython' not in sys.modules
+if _HIDE_IPYTHON:
+    sys.modules['IPython'] = None
+try:
+    import dash
+finally:
+    if _HIDE_IPYTHON:
+        del sys.modules['IPython']
 from dash import dash_table
 from dash import dcc
-from dash.dependencies import Input, Output
+from dash import Patch
+from dash.dependencies import ClientsideFunction, Input, Output, State
 from dash import html
 import dash_bootstrap_components as dbc
-from jupyter_dash import JupyterDash
 import plotly.graph_objects as go
-
-def bayut(url):
-    headers = {
-    "User-Agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:91.0) Gecko/20100101 Firefox/91.0"}
-    r = requests.get(url, headers=headers)
-    soup = BeautifulSoup(r.content, "html.parser")
-    data =[]
-    for i in soup.find_all('div',class_='d6e81fd0'):
-        d =[soup.find('span', class_ ="fontCompensation").text,
-            i.find('span', class_ ="f343d9ce").text,
-                i.find('div', class_='_7afabd84').text,
-                i.find('h2',{"aria-label": "Title"}).text,
-                i.find('span', class_='b6a29bc0').text,
-                i.find('span',{"aria-label": "Area"}).text,
-                i.find('img', class_='_062617f4')['title']]
-        data.append(d)
-    return data
+from pipeline import categorize, compact_text, cube_metrics, rent_period, to_number
+from snapshot import Refresher, Snapshot, SnapshotStore
+from tablequery import page_count, query_page
+from figcache import FigureCache, figure_json
+from history import HistoryStore
+from fingerprint import ListingIndex, change_counts, dedupe
+from analytics import AnalyticsEngine
+from sketch import SEEN_DAYS, SNAPSHOT_TABLE, SketchStore, price_metrics
+import instrument
+from flask import Response
+
+@lru_cache(maxsize=None)
+def scheduler():
+    # every catalog target (BAYUT_CATALOG), most overdue first; rows of targets
+    # not due this round are kept from their last crawl. Built by the first
+    # scrape, on the refresher's thread: the fetch layer (requests, lxml) is
+    # never imported by a preloading master or a worker serving its snapshot
+    from scraper import Fetcher, ParseCache
+    from crawler import Scheduler, load_catalog
+    # unchanged cards skip parsing on the next refresh
+    return Scheduler(load_catalog(), Fetcher(), cache=ParseCache(), keep_frames=False)
+
+ROWS = {}
+
+FIELDS = ['Status', 'Price (raw)', 'Location', 'Key Words', 'Bedrooms', 'Area (raw)', 'Agency']
 
 def scrap():
-    for t in range(2):
-        if t == 0:
-            condition = "to-rent"
-            url1 = f"https://www.bayut.com/{condition}/property/dubai/business-bay/damac-towers-by-paramount-hotels-and-resorts/"
-            rent = bayut(url1)
-        else:
-            condition = "for-sale"
-            url2 = f"https://www.bayut.com/{condition}/property/dubai/business-bay/damac-towers-by-paramount-hotels-and-resorts/"
-            sale = bayut(url2)
+    # pages are parsed card by card as they stream in, so no whole DOM tree is held
+    fresh = {}
+    for target, row in scheduler().stream():
+        fresh.setdefault(target, []).append([row[f] for f in FIELDS] + [target.area, target.building])
+    ROWS.update(fresh)
+    rent = [d for target, rows in ROWS.items() if target.status == 'Rent' for d in rows]
+    sale = [d for target, rows in ROWS.items() if target.status == 'Buy' for d in rows]
     info =[]
     info.append(rent)
     info.append(sale)
     return(info)
 
-gg = scrap()
-gf1 = pd.DataFrame(gg[0], columns = ['Status','Price','Location','Key Words','Bedrooms','Area (sqft)','Agency'])
-gf2 = pd.DataFrame(gg[1], columns = ['Status','Price','Location','Key Words','Bedrooms','Area (sqft)','Agency'])
-gf = pd.concat([gf1, gf2], axis=0)
-gf.reset_index(drop=True, inplace=True)
-print(gf)
-
-for_sale_total = len(gf2['Status'])
-print(for_sale_total)
-rent_total = len(gf1['Status'])
-print(rent_total)
-all_total = for_sale_total + rent_total
-
-gf['Area (sqft)'] = gf['Area (sqft)'].str.replace(r'[A-Z ,:a-z]', '').astype(float)
-gf['Price'] = gf['Price'].replace('\$|,', '', regex=True)
-gf['Price'] = pd.to_numeric(gf['Price'])
-pd.options.display.float_format = '{:.0f}'.format
-print(gf)
-
-filter1 = gf['Status'] == 'Buy'
-buy = gf[filter1]
-ABS1 = buy['Price'].mean()
-ABS =format(ABS1, ".2f")
-print(f'Average Price of Buy segment:- {ABS}')
-
-filter2 = gf['Status'] == 'Rent'
-rent = gf[filter2]
-ARS1 = rent['Price'].mean()
-ARS =format(ARS1, ".2f")
-print(f'Average Price of Rent segment:- {ARS}')
-
-ROI1 = (ARS1*12)/ABS1
-print(ROI1)
-ROI =format(ROI1, ".2f")
-print(f'ROI is:- {ROI}')
-
-dat =[[ABS,ARS,ROI]]
-print(dat)
-df = pd.DataFrame(dat, columns = ['ABS','ARS','ROI'])
-print(df)
-
-df = gf
-df['id'] = df['Status']+df.index.astype('str')
-df.set_index('id', inplace=True, drop=False)
-print(df)
-
-
-def fig_bed(st, bdd):
-    colors = ['rgb(102,255,255)', 'rgb(255,0,127)']
-    if st == 'All':
-        data = df[(df['Status'] == 'Buy') & (df['Bedrooms'] == bdd)]
-        a = data['Bedrooms'].count()
-        data2 = df[(df['Status'] == 'Rent') & (df['Bedrooms'] == bdd)]
-        b = data2['Bedrooms'].count()
-        x = [a, b]
+COLUMNS = ['Status','Price','Location','Key Words','Bedrooms','Area (sqft)','Agency','Area','Building']
+
+# every refresh is appended to the scrape history behind the trend chart
+HISTORY = HistoryStore()
+# listing keys of the last scrape, for the new / removed / repriced counts
+INDEX = ListingIndex()
+# price quantile / distinct-listing sketches merged per day
+SKETCHES = SketchStore()
+
+def build_snapshot():
+    df, metrics = snapshot_data(scrap())
+    HISTORY.record('dashapp', df)
+    # the counts ride along in the snapshot's metrics
+    metrics = dict(metrics, **change_counts(INDEX.record('dashapp', df)))
+    # sketched as the rows streamed in (scheduler().stream()); stored with the snapshot
+    sketches = scheduler().sketches()
+    SKETCHES.record('dashapp', sketches)
+    metrics.update(price_metrics(sketches, SKETCHES.recent('dashapp')))
+    return df, metrics, {SNAPSHOT_TABLE: sketches.to_frame()}
+
+@instrument.timed('bayut_frame_build_seconds', stage='dashapp.snapshot_data')
+def snapshot_data(gg):
+    """[rent rows, sale rows] from scrap() -> (frame, metrics) for a Snapshot."""
+    gf1 = pd.DataFrame(gg[0], columns = COLUMNS)
+    gf2 = pd.DataFrame(gg[1], columns = COLUMNS)
+    gf = pd.concat([gf1, gf2], axis=0)
+    gf.reset_index(drop=True, inplace=True)
+
+    # one vectorized pass per numeric column; the rent period is read off the price text first
+    gf['Period'] = rent_period(gf['Price'])
+    gf['Area (sqft)'] = to_number(gf['Area (sqft)'])
+    gf['Price'] = to_number(gf['Price'])
+
+    # featured cards repeat across pages; count each listing once
+    df = dedupe(gf)
+    df['id'] = df['Status']+df.index.astype('str')
+    df.set_index('id', inplace=True, drop=False)
+    categorize(df, ['Status', 'Agency', 'Bedrooms', 'Location', 'Period', 'Area', 'Building'])
+    compact_text(df, ['Key Words'])
+    # totals and averages are read from snap.cube
+    return df, {}
+
+def empty_snapshot():
+    df = pd.DataFrame(columns = COLUMNS + ['id'])
+    return Snapshot(df)
+
+def card_metrics(snap):
+    cube = snap.cube
+    ABS1, ARS1, ROI1 = cube_metrics(cube)
+    for_sale_total = cube.get('Buy').count
+    rent_total = cube.get('Rent').count
+    return {
+        'ABS1': ABS1, 'ARS1': ARS1, 'ROI1': ROI1,
+        'ABS': format(ABS1, ".2f"), 'ARS': format(ARS1, ".2f"), 'ROI': format(ROI1 * 100, ".2f"),
+        'for_sale_total': for_sale_total, 'rent_total': rent_total,
+        'all_total': for_sale_total + rent_total,
+    }
+
+# scraping happens on a background thread so workers serve immediately,
+# starting from the last snapshot on disk; callbacks and page loads read
+# whichever snapshot is current. Under gunicorn one worker scrapes and
+# publishes a memory-mapped snapshot; the rest attach to it when its
+# generation changes, so extra workers cost neither RAM nor requests
+REFRESHER = Refresher(build_snapshot, empty_snapshot(), store=SnapshotStore(mapped=True), name='dashapp', shared=True)
+
+def current():
+    return REFRESHER.latest()
+
+instrument.gauge('bayut_snapshot_age_seconds', lambda: current().age, name='dashapp')
+instrument.gauge('bayut_snapshot_version', lambda: current().version, name='dashapp')
+
+
+def bed_bars(st, bdd, cube):
+    # every bar is a lookup into the snapshot's aggregate cube
+    if bdd == 'All':
+        counts = cube.counts_by_bedrooms(st)
+        x = [n for _, n in counts]
+        y = [bed for bed, _ in counts]
+        xaxis_title = f"Number of {bdd} Bedrooms"
+
+    elif st == 'All':
+        x = [cube.get('Buy', bdd).count, cube.get('Rent', bdd).count]
         y = ['Buy', 'Rent']
         xaxis_title = f"Number of {bdd} Bedroom"
 
-    elif bdd == 'All' and st == 'All':
-        apa = list(df['Bedrooms'].unique())
-        x = []
-        y = []
-        for i in range(len(apa)):
-            data = df[(df['Bedrooms'] == apa[i])]
-            a = data['Bedrooms'].count()
-            x.append(a)
-            b = data['Bedrooms'].unique()[0]
-            y.append(b)
-            xaxis_title = f"Number of {bdd} Bedrooms"
-
-    elif bdd == 'All' and st == 'Buy':
-        data = df[(df['Status'] == 'Buy')]
-        apa = list(data['Bedrooms'].unique())
-        x = []
-        y = []
-        for i in range(len(apa)):
-            data2 = data[(data['Bedrooms'] == apa[i])]
-            a = data2['Bedrooms'].count()
-            x.append(a)
-            b = data2['Bedrooms'].unique()[0]
-            y.append(b)
-            xaxis_title = f"Number of {bdd} Bedrooms"
-
-    elif bdd == 'All' and st == 'Rent':
-        data = df[(df['Status'] == 'Rent')]
-        apa = list(data['Bedrooms'].unique())
-        x = []
-        y = []
-        for i in range(len(apa)):
-            data2 = data[(data['Bedrooms'] == apa[i])]
-            a = data2['Bedrooms'].count()
-            x.append(a)
-            b = data2['Bedrooms'].unique()[0]
-            y.append(b)
-            xaxis_title = f"Number of {bdd} Bedrooms"
-
     else:
-        data = df[(df['Status'] == st) & (df['Bedrooms'] == bdd)]
-        a = data['Bedrooms'].count()
-        b = data['Status'].unique()
-        x = [a]
-        y = b
+        x = [cube.get(st, bdd).count]
+        y = [st]
         xaxis_title = f"Number of {bdd} Bedroom"
+    return x, y, xaxis_title
 
+def fig_bed(st, bdd, snap=None):
+    x, y, xaxis_title = bed_bars(st, bdd, (snap or current()).cube)
+    colors = ['rgb(102,255,255)', 'rgb(255,0,127)']
     fig = go.Figure(data=[go.Bar(x=x, y=y, orientation='h')])
     fig.update_traces(marker_color=colors, marker_line_color='rgb(0,0,0)',
                       marker_line_width=1, opacity=0.8)
@@ -158,49 +160,157 @@ def fig_bed(st, bdd):
     fig.update_layout(title_x=0.5, plot_bgcolor='#F2DFCE', paper_bgcolor='#F2DFCE', xaxis_title=xaxis_title)
     return fig
 
-apa = list(df['Bedrooms'].unique())
-x=[]
-y =[]
-for i in range(len(apa)):
-    data=df[(df['Bedrooms']== apa[i])]
-    a = data['Bedrooms'].count()
-    x.append(a)
-    b = data['Bedrooms'].unique()[0]
-    y.append(b)
-    xaxis_title = f"Number of  Bedrooms"
-
 
-def fig_abs_ars(sel):
+def abs_ars_bars(sel, cube):
+    ABS1, ARS1, _ = cube_metrics(cube)
     if sel == 'Rent':
         x = ['ABS', 'ARS']
         y = [ABS1, ARS1]
         colors = ['rgb(102,255,255)', 'rgb(255,0,127)']
-        # Use the hovertext kw argument for hover text
-        fig = go.Figure(
-            data=[go.Bar(x=x, y=y, hovertext=['Average Price of Buy Segment', 'Average Price of Rent Segment'])])
+        hovertext = ['Average Price of Buy Segment', 'Average Yearly Rent']
 
     else:
         x = ['ARS', 'ABS']
         y = [ARS1, ABS1]
         colors = ['rgb(255,0,127)', 'rgb(102,255,255)']
-        # Use the hovertext kw argument for hover text
-        fig = go.Figure(
-            data=[go.Bar(x=x, y=y, hovertext=['Average Price of Rent Segment', 'Average Price of Buy Segment'])])
+        hovertext = ['Average Yearly Rent', 'Average Price of Buy Segment']
+    return x, y, hovertext, colors
 
+def fig_abs_ars(sel, snap=None):
+    x, y, hovertext, colors = abs_ars_bars(sel, (snap or current()).cube)
+    # Use the hovertext kw argument for hover text
+    fig = go.Figure(data=[go.Bar(x=x, y=y, hovertext=hovertext)])
     fig.update_traces(marker_color=colors, marker_line_color='rgb(0,0,0)',
                       marker_line_width=1, opacity=0.8)
     fig.update_layout(title_text='ABS & ARS')
     fig.update_layout(title_x=0.5, plot_bgcolor='#F2DFCE', paper_bgcolor='#F2DFCE')
     return fig
 
+def fig_trend(bdd, freq='daily'):
+    # read from the pre-aggregated history tables, never the raw scrapes
+    trend = HISTORY.trend('dashapp', freq, bedrooms=bdd)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=trend.index, y=trend['buy_ppsf'], name='Buy AED/sqft (median)',
+                             mode='lines+markers', line=dict(color='rgb(102,255,255)')))
+    fig.add_trace(go.Scatter(x=trend.index, y=trend['rent_ppsf'], name='Rent AED/sqft per year (median)',
+                             mode='lines+markers', line=dict(color='rgb(255,0,127)')))
+    fig.add_trace(go.Scatter(x=trend.index, y=trend['yield_index'], name='Rent yield index',
+                             mode='lines', line=dict(color='rgb(0,0,0)', dash='dot'), yaxis='y2'))
+    fig.update_layout(title_text=f'Price Trend ({bdd} Bedrooms, {freq})')
+    fig.update_layout(title_x=0.5, plot_bgcolor='#F2DFCE', paper_bgcolor='#F2DFCE',
+                      yaxis=dict(title='AED/sqft'),
+                      yaxis2=dict(title='Yearly rent / Buy', overlaying='y', side='right', showgrid=False))
+    return fig
+
+# price/sqft distributions and yields; cells unchanged since the last snapshot are reused
+ANALYTICS = AnalyticsEngine()
+
+def analytics(snap=None):
+    snap = snap or current()
+    return ANALYTICS.update(snap.frame, snap.version)
+
+def fig_ppsf(st, bdd, snap=None):
+    result = analytics(snap)
+    colors = {'Buy': 'rgb(102,255,255)', 'Rent': 'rgb(255,0,127)'}
+    fig = go.Figure()
+    # buy and yearly rent prices per sqft are different scales: never merged.
+    # Both traces are always there, the unselected one hidden, so a change of
+    # selection only patches their points and visibility
+    for status in ['Buy', 'Rent']:
+        shown = st in ('All', status)
+        x, y = result.distribution(status, bdd) if shown else ([], [])
+        fig.add_trace(go.Bar(x=x, y=y, name=f'{status} AED/sqft' + (' per year' if status == 'Rent' else ''),
+                             marker_color=colors.get(status), visible=shown))
+    fig.update_layout(title_text=f'Price per sqft ({bdd} Bedrooms)')
+    fig.update_layout(title_x=0.5, plot_bgcolor='#F2DFCE', paper_bgcolor='#F2DFCE', bargap=0,
+                      xaxis=dict(title='AED/sqft', type='log'), yaxis_title='Listings')
+    return fig
+
+def fig_yield(snap=None):
+    matrix = analytics(snap).yield_matrix()
+    fig = go.Figure(data=[go.Heatmap(z=matrix.to_numpy() * 100, x=list(matrix.columns), y=list(matrix.index),
+                                     colorscale='Tealrose', colorbar=dict(title='%'),
+                                     hovertemplate='%{y} Bedrooms, %{x} sqft: %{z:.1f}%<extra></extra>')])
+    fig.update_layout(title_text='Gross Rental Yield (median rent / median price)')
+    fig.update_layout(title_x=0.5, plot_bgcolor='#F2DFCE', paper_bgcolor='#F2DFCE',
+                      xaxis_title='Area (sqft)', yaxis_title='Bedrooms')
+    return fig
+
+# figure JSON per (chart, status, bedrooms) for the current snapshot version;
+# a refresh bumps the version, which empties the cache
+FIGURES = FigureCache()
+
+def cached_fig_bed(st, bdd, snap=None):
+    snap = snap or current()
+    return FIGURES.get(snap.version, ('bed', st, bdd), lambda: figure_json(fig_bed(st, bdd, snap)))
+
+def cached_fig_abs_ars(sel, snap=None):
+    snap = snap or current()
+    # only the Rent ordering differs; every other status draws the same chart
+    sel = 'Rent' if sel == 'Rent' else 'Buy'
+    return FIGURES.get(snap.version, ('abs_ars', sel), lambda: figure_json(fig_abs_ars(sel, snap)))
+
+def cached_fig_trend(bdd, snap=None):
+    # history only grows on refresh, so the snapshot version covers it too
+    snap = snap or current()
+    return FIGURES.get(snap.version, ('trend', bdd), lambda: figure_json(fig_trend(bdd)))
+
+def cached_fig_ppsf(st, bdd, snap=None):
+    snap = snap or current()
+    return FIGURES.get(snap.version, ('ppsf', st, bdd), lambda: figure_json(fig_ppsf(st, bdd, snap)))
+
+def cached_fig_yield(snap=None):
+    snap = snap or current()
+    return FIGURES.get(snap.version, ('yield',), lambda: figure_json(fig_yield(snap)))
+
+def chart_changes(snap):
+    # graph1 / graph2 for every dropdown selection, as the dotted paths that
+    # differ from one selection to the next. The page ships this in the
+    # 'charts' store and assets/charts.js sets them in the figures the browser
+    # already has: a dropdown change sends no request for these two graphs
+    graph1, graph2 = {}, {}
+    for st in get_status(snap):
+        x, y, hovertext, colors = abs_ars_bars(st, snap.cube)
+        graph1[st] = {'data.0.x': x, 'data.0.y': y, 'data.0.hovertext': hovertext, 'data.0.marker.color': colors}
+        for bdd in get_bed(snap):
+            x, y, xaxis_title = bed_bars(st, bdd, snap.cube)
+            graph2[f'{st}|{bdd}'] = {'data.0.x': x, 'data.0.y': y, 'layout.xaxis.title.text': xaxis_title}
+    return {'graph1': graph1, 'graph2': graph2}
+
+def cached_chart_changes(snap=None):
+    snap = snap or current()
+    return FIGURES.get(snap.version, ('changes',), lambda: chart_changes(snap))
+
+def _patch_path(patch, source, path):
+    *parents, key = path.split('.')
+    for name in parents:
+        patch, source = patch[name], source.get(name, {})
+    patch[key] = source.get(key)
+
+def figure_patch(fig, traces=('x', 'y'), layout=()):
+    # the callbacks only change a chart's points and a title: send those
+    # (dotted paths into every trace and into the layout) and let the browser
+    # keep the rest of the figure it has, a few hundred bytes instead of ~8 KB
+    patch = Patch()
+    for i, trace in enumerate(fig['data']):
+        for path in traces:
+            _patch_path(patch['data'][i], trace, path)
+    for path in layout:
+        _patch_path(patch['layout'], fig['layout'], path)
+    return patch
+
 external_stylesheets = [dbc.themes.BOOTSTRAP]
 
 #*****************************************#
-#app = JupyterDash(__name__,external_stylesheets=external_stylesheets)
 app = dash.Dash(__name__,external_stylesheets=external_stylesheets)
 server = app.server
 #*****************************************#
 
+@server.route('/metrics')
+def metrics_endpoint():
+    # Prometheus scrape target: fetch, parse, frame build, snapshot and callback metrics
+    return Response(instrument.render(), mimetype='text/plain; version=0.0.4')
+
 app.title = 'DAMAC Towers Bayout.com'
 colors = {
     'background': '#111111',
@@ -243,15 +353,15 @@ def generate_page_header():
     header = (main_header,subtitle_header)
     return header
 
-def get_status():
-    at =list(gf['Status'].unique())
+def get_status(snap):
+    at =list(snap.cube.statuses)
     at.append('All')
     at
     return at
 
 
-def get_bed():
-    ap =list(gf['Bedrooms'].unique())
+def get_bed(snap):
+    ap =list(snap.cube.bedrooms)
     ap.append('All')
     ap
     return ap
@@ -268,32 +378,41 @@ def create_dropdown_list2(bedrooms):
     for bed in sorted(bedrooms):
         tmp_dict2 = {'label':bed,'value':bed}
         dropdown_list2.append(tmp_dict2)
-    return dropdown_list
+    return dropdown_list2
 
-def get_status_dropdown(nd):
+def get_status_dropdown(nd, snap):
     return html.Div([
                         html.Label('Select Status'),
                         dcc.Dropdown(id='my-id'+str(nd),
-                            options=create_dropdown_list(get_status()),
+                            options=create_dropdown_list(get_status(snap)),
                             value='Buy'
                         ),
                         html.Div(id='my-div'+str(nd))
                     ])
 
-def get_bed_dropdown(bd):
+def get_bed_dropdown(bd, snap):
     return html.Div([
                         html.Label('Number of Bedrooms'),
                         dcc.Dropdown(id='my-bd'+str(bd),
-                            options=create_dropdown_list(get_bed()),
+                            options=create_dropdown_list(get_bed(snap)),
                             value='1'
                         ),
                         html.Div(id='my-biv'+str(bd))
                     ])
 
-def graph1():
-    return dcc.Graph(id='graph1',figure=fig_abs_ars('Rent'))
-def graph2():
-    return dcc.Graph(id='graph2',figure=fig_bed('Rent','All'))
+def charts_store(snap):
+    return dcc.Store(id='charts', data=cached_chart_changes(snap))
+
+def graph1(snap):
+    return dcc.Graph(id='graph1',figure=cached_fig_abs_ars('Rent', snap))
+def graph2(snap):
+    return dcc.Graph(id='graph2',figure=cached_fig_bed('Rent','All', snap))
+def graph3(snap):
+    return dcc.Graph(id='graph3',figure=cached_fig_trend('All', snap))
+def graph4(snap):
+    return dcc.Graph(id='graph4',figure=cached_fig_ppsf('Rent','All', snap))
+def graph5(snap):
+    return dcc.Graph(id='graph5',figure=cached_fig_yield(snap))
 
 def generate_card_content(card_header,card_value,overall_value):
     card_head_style = {'textAlign':'center','fontSize':'150%'}
@@ -311,7 +430,12 @@ def generate_card_content(card_header,card_value,overall_value):
     card = [card_header,card_body]
     return card
 
-def data_table():
+PAGE_SIZE = 20
+
+def data_table(snap):
+    df = snap.frame
+    # only the first page ships with the layout; update_table serves the rest
+    first, total = query_page(df, 0, PAGE_SIZE, cache=snap.positions)
     table = html.Div([
         dash_table.DataTable(
             id='datatable-interactivity',
@@ -321,19 +445,22 @@ def data_table():
                 else {"name": i, "id": i, "deletable": True, "selectable": True}
                 for i in df.columns
             ],
-            data=df.to_dict('records'),  # the contents of the table
+            data=first.to_dict('records'),  # the current page of the table
             editable=False,              # allow editing of data inside all cells
-            filter_action="native",     # allow filtering of data by user ('native') or not ('none')
-            sort_action="native",       # enables data to be sorted per-column by user or not ('none')
+            filter_action="custom",     # filtering is done server-side in update_table
+            filter_query='',
+            sort_action="custom",       # sorting is done server-side in update_table
             sort_mode="single",         # sort across 'multi' or 'single' columns
             column_selectable="multi",  # allow users to select 'multi' or 'single' columns
             #row_selectable="multi",     # allow users to select 'multi' or 'single' rows
             row_deletable=False,         # choose if user can delete a row (True) or not (False)
             selected_columns=[],        # ids of columns that user selects
             selected_rows=[],           # indices of rows that user selects
-            page_action="native",       # all data is passed to the table up-front or not ('none')
+            sort_by=[],
+            page_action="custom",       # pages are sliced server-side in update_table
             page_current=0,             # page number that user is on
-            page_size=20,                # number of rows visible per page
+            page_size=PAGE_SIZE,         # number of rows visible per page
+            page_count=page_count(total, PAGE_SIZE),
             fixed_rows={'headers': True, 'data': 0 },
             style_cell={
                 'height': 'auto',
@@ -360,11 +487,15 @@ def data_table():
     return table
 
 
-def generate_cards():
-    abs_val = ABS
-    ars_val = ARS
+def generate_cards(snap):
+    metrics = card_metrics(snap)
+    abs_val = metrics['ABS']
+    ars_val = metrics['ARS']
     # roi_val = int("{:.2%}".format(ROI1))
-    roi_val = ROI
+    roi_val = metrics['ROI']
+    for_sale_total = metrics['for_sale_total']
+    rent_total = metrics['rent_total']
+    all_total = metrics['all_total']
 
     cards = html.Div(
         [
@@ -372,9 +503,9 @@ def generate_cards():
                 [
                     dbc.Col(dbc.Card(generate_card_content("Average Price of Buy segment", abs_val, for_sale_total),
                                      color="success", inverse=True), md=dict(size=2, offset=3)),
-                    dbc.Col(dbc.Card(generate_card_content("Average Price of Rent segment", ars_val, rent_total),
+                    dbc.Col(dbc.Card(generate_card_content("Average Yearly Rent", ars_val, rent_total),
                                      color="warning", inverse=True), md=dict(size=2)),
-                    dbc.Col(dbc.Card(generate_card_content("Return On Investment", roi_val, all_total), color="dark",
+                    dbc.Col(dbc.Card(generate_card_content("Return On Investment (%)", roi_val, all_total), color="dark",
                                      inverse=True), md=dict(size=2)),
                 ],
                 className="mb-4",
@@ -383,49 +514,145 @@ def generate_cards():
     )
     return cards
 
+def generate_changes(snap):
+    counts = snap.metrics
+    if 'new' not in counts:
+        return html.Div(id='changes')
+    text = "Since the last refresh: {:,} new · {:,} removed · {:,} price changes".format(
+        counts['new'], counts['removed'], counts['price'])
+    return html.Div(html.P(text, style={'textAlign': 'center'}), id='changes')
+
+
+def generate_price_stats(snap):
+    m = snap.metrics
+    if 'Buy.p50' not in m:
+        return html.Div(id='price-stats')
+    fmt = lambda v: '—' if v != v else format(v, ',.0f')
+    text = ("Median / p90 price: Buy {} / {} · Rent {} / {} · listings seen in the last {} days: "
+            "{:,} Buy · {:,} Rent").format(fmt(m['Buy.p50']), fmt(m['Buy.p90']), fmt(m['Rent.p50']), fmt(m['Rent.p90']),
+                                           SEEN_DAYS, m['Buy.listings_seen'], m['Rent.listings_seen'])
+    return html.Div(html.P(text, style={'textAlign': 'center'}), id='price-stats')
+
 
 def generate_layout():
+    # one snapshot per page load so cards, dropdowns, table and graphs agree
+    snap = current()
     page_header = generate_page_header()
     layout = dbc.Container(
         [
             page_header[0],
             page_header[1],
             html.Hr(),
-            generate_cards(),
+            generate_cards(snap),
+            generate_changes(snap),
+            generate_price_stats(snap),
             html.Hr(),
             dbc.Row(
                 [
-                    dbc.Col(get_status_dropdown(1), md=dict(size=2, offset=3)),
-                    dbc.Col(get_bed_dropdown(1), md=dict(size=2, offset=3))
+                    dbc.Col(get_status_dropdown(1, snap), md=dict(size=2, offset=3)),
+                    dbc.Col(get_bed_dropdown(1, snap), md=dict(size=2, offset=3))
                 ]
 
             ),
-            data_table(),
+            data_table(snap),
+            charts_store(snap),
             dbc.Row(
                 [
-                    dbc.Col(graph1(), md=dict(size=3, offset=0)),
-                    dbc.Col(graph2(), md=dict(size=5, offset=2))
+                    dbc.Col(graph1(snap), md=dict(size=3, offset=0)),
+                    dbc.Col(graph2(snap), md=dict(size=5, offset=2))
 
                 ], align="center",
 
             ),
+            dbc.Row(
+                [
+                    dbc.Col(graph3(snap), md=dict(size=10, offset=1))
+                ]
+            ),
+            dbc.Row(
+                [
+                    dbc.Col(graph4(snap), md=dict(size=5, offset=1)),
+                    dbc.Col(graph5(snap), md=dict(size=5))
+                ]
+            ),
         ], fluid=True, style={'backgroundColor': colors['bodyColor']}
     )
     return layout
 
-app.layout = generate_layout()
+def validation_layout():
+    # every component the callbacks use, with nothing in them: Dash checks the
+    # callbacks against this instead of building a whole page (every figure)
+    # on import
+    return html.Div([
+        dcc.Dropdown(id='my-id1'), dcc.Dropdown(id='my-bd1'), dcc.Store(id='charts'),
+        dash_table.DataTable(id='datatable-interactivity'),
+        *[dcc.Graph(id=f'graph{i}') for i in range(1, 6)],
+    ])
+
+app.validation_layout = validation_layout()
+# a function, so Dash rebuilds the layout from the current snapshot on every page load
+app.layout = generate_layout
+
+# BAYUT_REFRESH=0 serves stored snapshots only (benchmarks, offline runs)
+REFRESH = os.environ.get('BAYUT_REFRESH', '1') != '0'
+
+@server.before_request
+def start_refresher():
+    # started by the first request rather than on import: a gunicorn master
+    # that preloads the app (gunicorn.conf.py) forks its workers after the
+    # import, and threads don't survive a fork. A no-op once it is running
+    if REFRESH:
+        REFRESHER.start()
+
+def warm():
+    # builds the page once, filling the figure cache: a preloading gunicorn
+    # master calls it before forking, so workers serve their first page warm
+    generate_layout()
+
+# graph1 / graph2 are redrawn in the browser from the 'charts' store (see
+# chart_changes and assets/charts.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='graph1'),
+    Output(component_id='graph1',component_property='figure'),
+    [Input(component_id='my-id1',component_property='value')],
+    [State(component_id='charts',component_property='data'),
+    State(component_id='graph1',component_property='figure')])
+
+app.clientside_callback(
+    ClientsideFunction(namespace='charts', function_name='graph2'),
+    Output(component_id='graph2',component_property='figure'),
+    [Input(component_id='my-id1',component_property='value'),
+    Input(component_id='my-bd1',component_property='value')],
+    [State(component_id='charts',component_property='data'),
+    State(component_id='graph2',component_property='figure')])
+
+@app.callback(
+    Output(component_id='graph3',component_property='figure'),
+    [Input(component_id='my-bd1',component_property='value')])
+@instrument.timed('bayut_callback_seconds', callback='update_trend')
+def update_trend(input_value2):
+    return figure_patch(cached_fig_trend(input_value2), layout=['title.text'])
 
 @app.callback(
-    [Output(component_id='graph1',component_property='figure'), #line chart
-    Output(component_id='graph2',component_property='figure')], #overall card numbers
+    Output(component_id='graph4',component_property='figure'),
     [Input(component_id='my-id1',component_property='value'),
     Input(component_id='my-bd1',component_property='value')])
+@instrument.timed('bayut_callback_seconds', callback='update_ppsf')
+def update_ppsf(input_value1,input_value2):
+    return figure_patch(cached_fig_ppsf(input_value1,input_value2), ['x', 'y', 'visible'], ['title.text'])
 
-
-def update_output_div(input_value1,input_value2):
-    ggg = fig_abs_ars(input_value1)
-    ttt = fig_bed(input_value1,input_value2)
-    return ggg,ttt
+@app.callback(
+    [Output('datatable-interactivity', 'data'),
+    Output('datatable-interactivity', 'page_count')],
+    [Input('datatable-interactivity', 'page_current'),
+    Input('datatable-interactivity', 'page_size'),
+    Input('datatable-interactivity', 'sort_by'),
+    Input('datatable-interactivity', 'filter_query')])
+@instrument.timed('bayut_callback_seconds', callback='update_table')
+def update_table(page_current, page_size, sort_by, filter_query):
+    snap = current()
+    page, total = query_page(snap.frame, page_current, page_size, sort_by, filter_query, cache=snap.positions)
+    return page.to_dict('records'), page_count(total, page_size)
 
 #app.run_server(mode='external')
 
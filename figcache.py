@@ -0,0 +1,55 @@
+# figcache.py
+"""
+Bounded LRU of built figures, scoped to one data snapshot.
+
+Both front-ends only ever draw a handful of (status, bedrooms) combinations
+per snapshot, so each figure is built once and then served from here until
+the snapshot changes.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import plotly.io as pio
+
+def figure_json(fig) -> dict:
+    """Plain-JSON form of a figure: what Dash would serialize on every response."""
+    return json.loads(pio.to_json(fig, validate=False))
+
+class FigureCache:
+    """
+    ``get(version, key, build)`` returns the cached value for ``key`` or stores
+    ``build()``. A ``version`` different from the last one seen (a refreshed
+    snapshot) drops every entry first. Safe to share between request threads.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version: Hashable, key: Hashable, build: Callable):
+        with self._lock:
+            if version != self.version:
+                self._items.clear()
+                self.version = version
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = build()
+        with self._lock:
+            if version == self.version:
+                self._items[key] = value
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._items), "version": self.version}
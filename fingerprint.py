@@ -0,0 +1,209 @@
+# fingerprint.py
+"""
+Listing fingerprints: duplicate removal within a scrape and a change feed
+between consecutive scrapes.
+
+Two 64-bit hashes per row, over normalized fields:
+
+    fingerprint   title, price, area, beds, agency, location, target   equal = the same card shown twice
+    listing key   status, title, area, beds, agency, location, target  equal = the same listing, price aside
+
+"target" is the crawl target's TARGET_FIELDS (area, building) when the frame
+has them: the same card text under two catalog buildings is two listings.
+
+Featured listings repeat across pages (and statuses), and the fallback card
+finder can return overlapping elements; ``dedupe`` keeps the first of each
+fingerprint. ``ListingIndex`` keeps the listing keys of the last scrape in a
+sorted array on disk, so the next scrape is compared key against key instead
+of frame against frame.
+
+    <root>/<name>/index.parquet      listings of the last scrape, sorted by key
+    <root>/<name>/changes.parquet    new / removed / price-changed rows of that scrape
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from history import HISTORY_DIR, _write
+from pipeline import TARGET_FIELDS
+
+log = logging.getLogger(__name__)
+
+_WS = r"\s+"
+# carried into the index, so removed listings can still be shown
+INDEX_FIELDS = ["Status", "Key Words", "Bedrooms", "Agency", "Price"]
+CHANGE_FIELDS = ["Change", "Listing", "Status", "Key Words", "Bedrooms", "Agency", "Old Price", "Price", "First Seen"]
+CHANGES = ("new", "removed", "price")
+
+def _text(s: pd.Series) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # normalize each category once, then spread by code (-1, missing, -> "")
+        cats = _text(pd.Series(s.cat.categories))
+        return pd.Series(cats.array.take(s.cat.codes.to_numpy(), allow_fill=True, fill_value=""), index=s.index)
+    return s.astype("string").str.lower().str.replace(_WS, " ", regex=True).str.strip().fillna("")
+
+def _number(s: pd.Series, decimals: int = 0) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce").astype("float64").round(decimals)
+
+def _hash(parts: dict) -> np.ndarray:
+    # pandas' row hash uses a fixed key, so values are stable across processes
+    return pd.util.hash_pandas_object(pd.DataFrame(parts), index=False).to_numpy()
+
+def _identity(frame: pd.DataFrame) -> dict:
+    return {
+        "title": _text(frame["Key Words"]),
+        "area": _number(frame["Area (sqft)"]),
+        "beds": _text(frame["Bedrooms"]),
+        "agency": _text(frame["Agency"]),
+        "location": _text(frame["Location"]),
+        **{field: _text(frame[field]) for field in TARGET_FIELDS if field in frame.columns},
+    }
+
+def fingerprints(frame: pd.DataFrame) -> np.ndarray:
+    """uint64 per row; equal for cards showing the same listing at the same price."""
+    return _hash({**_identity(frame), "price": _number(frame["Price"])})
+
+def listing_keys(frame: pd.DataFrame) -> np.ndarray:
+    """uint64 per row; equal for one listing across scrapes, whatever its price."""
+    return _hash({"status": _text(frame["Status"]), **_identity(frame)})
+
+def dedupe(frame: pd.DataFrame) -> pd.DataFrame:
+    """``frame`` without repeated cards (first one kept), index reset."""
+    if frame.empty:
+        return frame
+    dup = pd.Series(fingerprints(frame)).duplicated().to_numpy()
+    if not dup.any():
+        return frame
+    instrument.inc("bayut_duplicate_cards_total", int(dup.sum()))
+    return frame[~dup].reset_index(drop=True)
+
+class SeenCards:
+    """
+    Fingerprints of every card a scrape has streamed so far. ``fresh(frame)``
+    keeps the rows of ``frame`` not seen before, in it or in an earlier
+    frame, so running totals over a stream of batches count each card once
+    (as ``dedupe`` would over the finished frame).
+    """
+
+    def __init__(self):
+        self._seen = set()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def fresh(self, frame: pd.DataFrame) -> pd.DataFrame:
+        if frame.empty:
+            return frame
+        keep = np.zeros(len(frame), dtype=bool)
+        for i, fp in enumerate(fingerprints(frame).tolist()):
+            if fp not in self._seen:
+                self._seen.add(fp)
+                keep[i] = True
+        # not counted in bayut_duplicate_cards_total: the finished frame's dedupe counts them
+        return frame if keep.all() else frame[keep].reset_index(drop=True)
+
+class RunningPrices:
+    """Priced-card count and price sum per status over a streamed scrape, each card once."""
+
+    def __init__(self):
+        self.seen = SeenCards()
+        self.totals = {}
+
+    def add(self, frame: pd.DataFrame) -> "RunningPrices":
+        for status, part in self.seen.fresh(frame).groupby("Status", observed=True):
+            n, total = self.totals.get(status, (0, 0.0))
+            prices = part["Price"].dropna()
+            self.totals[status] = (n + len(prices), total + float(prices.sum()))
+        return self
+
+    def average(self, status: str):
+        """(priced cards, mean price) of ``status`` so far; the mean is None before the first."""
+        n, total = self.totals.get(status, (0, 0.0))
+        return n, (total / n if n else None)
+
+def _positions(keys: np.ndarray, sorted_keys: np.ndarray):
+    """(found, position) of every key in ``sorted_keys``: one binary search each."""
+    pos = np.searchsorted(sorted_keys, keys)
+    found = pos < len(sorted_keys)
+    found[found] = sorted_keys[pos[found]] == keys[found]
+    return found, pos
+
+class ListingIndex:
+    """Per-``name`` listing index and last change feed (see module docstring)."""
+
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+
+    def _path(self, name: str, what: str) -> str:
+        return os.path.join(self.root, name, f"{what}.parquet")
+
+    def index(self, name: str) -> pd.DataFrame:
+        path = self._path(name, "index")
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def changes(self, name: str) -> pd.DataFrame:
+        """Change feed of the last recorded scrape (empty before the second one)."""
+        path = self._path(name, "changes")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=CHANGE_FIELDS)
+        return pd.read_parquet(path)
+
+    def update(self, name: str, frame: pd.DataFrame, scraped: float = None) -> pd.DataFrame:
+        """
+        Make ``frame`` the indexed scrape and return its change feed against the
+        previous one. The first scrape of a name only builds the index.
+        """
+        scraped = pd.Timestamp.now("UTC") if scraped is None else pd.Timestamp(scraped, unit="s", tz="UTC")
+        cur = frame[INDEX_FIELDS].reset_index(drop=True)
+        cur["Price"] = _number(cur["Price"], 2)
+        cur.insert(0, "Listing", listing_keys(frame))
+        # one row per listing key; a second price for the same key is a different unit we can't tell apart
+        cur = cur.drop_duplicates("Listing").sort_values("Listing", kind="stable").reset_index(drop=True)
+        keys = cur["Listing"].to_numpy()
+
+        prev = self.index(name)
+        if prev is None:
+            cur["First Seen"] = scraped
+            changes = pd.DataFrame(columns=CHANGE_FIELDS)
+        else:
+            prev_keys = prev["Listing"].to_numpy()
+            found, pos = _positions(keys, prev_keys)
+            old_price = np.full(len(cur), np.nan)
+            old_price[found] = prev["Price"].to_numpy()[pos[found]]
+            first_seen = pd.Series(scraped, index=cur.index)
+            first_seen[found] = prev["First Seen"].iloc[pos[found]].to_numpy()
+            cur["First Seen"] = first_seen
+            price = cur["Price"].to_numpy()
+            repriced = found & ~(np.isclose(old_price, price) | (np.isnan(old_price) & np.isnan(price)))
+            kept, _ = _positions(prev_keys, keys)
+            changes = pd.concat([
+                cur[~found].assign(Change="new"),
+                cur[repriced].assign(Change="price", **{"Old Price": old_price[repriced]}),
+                prev[~kept].assign(Change="removed", **{"Old Price": prev["Price"][~kept], "Price": np.nan}),
+            ], ignore_index=True).reindex(columns=CHANGE_FIELDS)
+        changes["Scraped"] = scraped
+        _write(cur, self._path(name, "index"))
+        _write(changes, self._path(name, "changes"))
+        for change in CHANGES:
+            instrument.inc("bayut_listing_changes_total", int((changes["Change"] == change).sum()), name=name, change=change)
+        return changes
+
+    def record(self, name: str, frame: pd.DataFrame, scraped: float = None):
+        """``update`` for refresh paths: a failure is logged, never raised."""
+        try:
+            return self.update(name, frame, scraped)
+        except Exception:
+            log.exception("could not update the %s listing index", name)
+            return None
+
+def change_counts(changes: pd.DataFrame) -> dict:
+    """{"new": n, "removed": n, "price": n} for a change feed (None: no feed)."""
+    if changes is None:
+        return {}
+    counts = changes["Change"].value_counts()
+    return {c: int(counts.get(c, 0)) for c in CHANGES}
@@ -0,0 +1,17 @@
+# gunicorn.conf.py
+"""
+Read by ``gunicorn dashapp:server`` (Procfile) from the working directory.
+
+The app is imported once, in the master, from the last stored snapshot, and
+its page is built once (dashapp.warm) to fill the figure cache. Workers are
+forked from that master, so each one comes up sharing the imported modules,
+the mapped snapshot and the warm cache instead of paying for them itself;
+``python startup.py dash`` measures both halves. Each worker starts its
+refresher on its first request (dashapp.start_refresher).
+"""
+preload_app = True
+
+def when_ready(server):
+    # the master, after preloading and before the first fork
+    import dashapp
+    dashapp.warm()
@@ -0,0 +1,222 @@
+# history.py
+"""
+Append-only scrape history with daily / weekly aggregates.
+
+    <root>/<name>/raw/<YYYY-MM-DD>/<scraped>.parquet     one file per scrape, never rewritten
+    <root>/<name>/state/<freq>/<period>.parquet          mergeable state of one period (see ``observe``)
+    <root>/<name>/daily.parquet                          aggregate rows, one period per day
+    <root>/<name>/weekly.parquet                         ... per week (keyed by its Monday)
+
+A period's state is a listing count and a price and a price/sqft
+``sketch.QuantileSketch`` per (Status, Bedrooms). Appending a scrape folds
+the sketches of that scrape alone into the state of its day and its week and
+swaps those periods' rows in the aggregate tables, so the cost of an append
+doesn't grow with the scrapes already stored. Trend queries read the small
+aggregate tables only, never raw rows. Rent prices are aggregated as yearly
+amounts (see ``observe``). ``rebuild`` recomputes every period's state from
+the raw partitions; history written before the state files existed needs one.
+"""
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pipeline import ALL, yearly_price
+from snapshot import _storable
+
+log = logging.getLogger(__name__)
+
+HISTORY_DIR = os.environ.get("BAYUT_HISTORY_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".history"))
+FREQS = ("daily", "weekly")
+# aggregate columns per (period, Status, Bedrooms)
+AGG_FIELDS = ["period", "Status", "Bedrooms", "listings", "median_price", "median_ppsf"]
+
+def _day(ts: pd.Timestamp) -> str:
+    return ts.strftime("%Y-%m-%d")
+
+def _week(ts: pd.Timestamp) -> str:
+    return _day(ts.normalize() - pd.Timedelta(days=ts.weekday()))
+
+def _week_days(week: str) -> list:
+    return [_day(pd.Timestamp(week) + pd.Timedelta(days=i)) for i in range(7)]
+
+def observe(raw: pd.DataFrame) -> dict:
+    """
+    {(Status, Bedrooms): [listings, price sketch, price/sqft sketch]} of every
+    observation in ``raw``, plus a Bedrooms = "All" entry per status. Rents
+    are yearly (pipeline.yearly_price), so the medians don't jump when the mix
+    of monthly and yearly listings changes.
+    """
+    from sketch import QuantileSketch  # sketch imports this module
+
+    if raw.empty:
+        return {}
+    price = yearly_price(raw).to_numpy(dtype="float64", na_value=np.nan)
+    area = raw["Area (sqft)"].to_numpy(dtype="float64", na_value=np.nan)
+    ppsf = price / np.where(area > 0, area, np.nan)
+    keys = pd.DataFrame({"Status": raw["Status"].astype(str).to_numpy(), "Bedrooms": raw["Bedrooms"].astype(str).to_numpy()})
+    groups = dict(keys.groupby(["Status", "Bedrooms"], sort=False).indices)
+    groups.update({(status, ALL): rows for status, rows in keys.groupby("Status", sort=False).indices.items()})
+    return {
+        key: [len(rows), QuantileSketch().add(price[rows]), QuantileSketch().add(ppsf[rows])]
+        for key, rows in groups.items()
+    }
+
+def fold(state: dict, other: dict) -> dict:
+    """Merge ``other`` into ``state`` (both as from ``observe``); ``other`` is left as it was."""
+    from sketch import QuantileSketch
+
+    for key, (listings, price, ppsf) in other.items():
+        mine = state.setdefault(key, [0, QuantileSketch(price.alpha), QuantileSketch(ppsf.alpha)])
+        mine[0] += listings
+        mine[1].merge(price)
+        mine[2].merge(ppsf)
+    return state
+
+def _state_frame(state: dict) -> pd.DataFrame:
+    rows = []
+    for (status, bedrooms), (listings, price, ppsf) in sorted(state.items()):
+        row = {"Status": status, "Bedrooms": bedrooms, "listings": listings, "alpha": price.alpha}
+        row.update({f"price_{k}": v for k, v in price.state().items()})
+        row.update({f"ppsf_{k}": v for k, v in ppsf.state().items()})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def _read_state(path: str) -> dict:
+    from sketch import QuantileSketch
+
+    if not os.path.exists(path):
+        return {}
+    return {
+        (row.Status, row.Bedrooms): [
+            int(row.listings),
+            QuantileSketch.from_state(row.price_offset, row.price_zero, row.price_bins, row.alpha),
+            QuantileSketch.from_state(row.ppsf_offset, row.ppsf_zero, row.ppsf_bins, row.alpha),
+        ]
+        for row in pd.read_parquet(path).itertuples(index=False)
+    }
+
+def summarize(state: dict, period: str) -> pd.DataFrame:
+    """The aggregate rows (AGG_FIELDS) of one period's state; medians are within the sketches' alpha."""
+    if not state:
+        return pd.DataFrame(columns=AGG_FIELDS)
+    out = pd.DataFrame(
+        [(period, s, b, n, price.quantile(0.5), ppsf.quantile(0.5)) for (s, b), (n, price, ppsf) in state.items()],
+        columns=AGG_FIELDS,
+    )
+    return out.sort_values(["Status", "Bedrooms"]).reset_index(drop=True)
+
+def aggregate(raw: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Median price and price/sqft per (Status, Bedrooms) over every observation in ``raw``."""
+    return summarize(observe(raw), period)
+
+def _write(frame: pd.DataFrame, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        frame.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+class HistoryStore:
+    """Per-``name`` scrape history (see module docstring for the layout)."""
+
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+
+    def _dir(self, name: str, *parts) -> str:
+        return os.path.join(self.root, name, *parts)
+
+    def _raw(self, name: str, days) -> pd.DataFrame:
+        paths = [
+            os.path.join(self._dir(name, "raw", day), f)
+            for day in days if os.path.isdir(self._dir(name, "raw", day))
+            for f in sorted(os.listdir(self._dir(name, "raw", day))) if f.endswith(".parquet")
+        ]
+        if not paths:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+
+    def append(self, name: str, frame: pd.DataFrame, scraped: float = None) -> pd.Timestamp:
+        """Store one scrape and fold it into the day / week it falls in."""
+        ts = pd.Timestamp(time.time() if scraped is None else scraped, unit="s", tz="UTC")
+        raw = _storable(frame)
+        raw["Scraped"] = ts
+        _write(raw, self._dir(name, "raw", _day(ts), f"{ts.value}.parquet"))
+
+        scrape = observe(raw)
+        for freq, period in (("daily", _day(ts)), ("weekly", _week(ts))):
+            path = self._dir(name, "state", freq, f"{period}.parquet")
+            state = fold(_read_state(path), scrape)
+            _write(_state_frame(state), path)
+            self._update(name, freq, summarize(state, period))
+        return ts
+
+    def _update(self, name: str, freq: str, rows: pd.DataFrame):
+        # replace one period's rows; everything else in the table is kept as is
+        table = self.aggregates(name, freq)
+        table = table[table["period"] != rows["period"].iat[0]] if not rows.empty else table
+        table = pd.concat([table, rows], ignore_index=True).sort_values(["period", "Status", "Bedrooms"])
+        _write(table.reset_index(drop=True), self._dir(name, f"{freq}.parquet"))
+
+    def rebuild(self, name: str):
+        """Recompute every period's state and both aggregate tables from the raw partitions."""
+        raw_dir = self._dir(name, "raw")
+        days = sorted(os.listdir(raw_dir)) if os.path.isdir(raw_dir) else []
+        periods = {
+            "daily": {day: [day] for day in days},
+            "weekly": {week: _week_days(week) for week in sorted({_week(pd.Timestamp(day)) for day in days})},
+        }
+        for freq, spans in periods.items():
+            rows = []
+            for period, span in spans.items():
+                state = observe(self._raw(name, span))
+                _write(_state_frame(state), self._dir(name, "state", freq, f"{period}.parquet"))
+                rows.append(summarize(state, period))
+            table = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=AGG_FIELDS)
+            _write(table.sort_values(["period", "Status", "Bedrooms"]).reset_index(drop=True),
+                   self._dir(name, f"{freq}.parquet"))
+
+    def record(self, name: str, frame: pd.DataFrame, scraped: float = None):
+        """``append`` for refresh paths: a history failure is logged, never raised."""
+        try:
+            return self.append(name, frame, scraped)
+        except Exception:
+            log.exception("could not append %s to scrape history", name)
+            return None
+
+    def aggregates(self, name: str, freq: str = "daily", since: str = None) -> pd.DataFrame:
+        """Aggregate rows of every ``freq`` period starting on or after ``since`` (YYYY-MM-DD)."""
+        if freq not in FREQS:
+            raise ValueError(f"freq must be one of {FREQS}, not {freq!r}")
+        path = self._dir(name, f"{freq}.parquet")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=AGG_FIELDS)
+        filters = [("period", ">=", since)] if since else None
+        return pd.read_parquet(path, filters=filters)
+
+    def trend(self, name: str, freq: str = "daily", bedrooms: str = ALL, since: str = None) -> pd.DataFrame:
+        """
+        One row per period for one bedroom count: median Buy price / yearly
+        Rent and their price/sqft, and the rent-yield index (median yearly
+        rent / median buy price).
+        """
+        agg = self.aggregates(name, freq, since)
+        agg = agg[agg["Bedrooms"] == str(bedrooms)]
+        cols = ["buy_price", "rent_price", "buy_ppsf", "rent_ppsf", "yield_index"]
+        if agg.empty:
+            return pd.DataFrame(columns=cols, index=pd.DatetimeIndex([], name="period"))
+        wide = agg.pivot_table(index="period", columns="Status", values=["median_price", "median_ppsf"], aggfunc="first")
+        out = pd.DataFrame(index=pd.DatetimeIndex(pd.to_datetime(wide.index), name="period"))
+        for status, prefix in (("Buy", "buy"), ("Rent", "rent")):
+            for value, suffix in (("median_price", "price"), ("median_ppsf", "ppsf")):
+                col = (value, status)
+                out[f"{prefix}_{suffix}"] = wide[col].to_numpy(dtype="float64") if col in wide.columns else np.nan
+        out["yield_index"] = out["rent_price"] / out["buy_price"].where(out["buy_price"] > 0)
+        return out[cols]
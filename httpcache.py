@@ -0,0 +1,179 @@
+# httpcache.py
+"""
+Record / replay of HTTP responses for offline runs, CI and load tests.
+
+A ``RecordReplayAdapter`` mounted on a requests session either passes
+requests through and records the responses (``record``), or answers them
+from disk without touching the network (``replay``):
+
+    <root>/requests/<kk>/<key>.json     status, headers, latency, body digest
+    <root>/objects/<dd>/<digest>.gz     gzipped body, stored once per distinct content
+
+``key`` hashes the method, URL and the request headers in VARY. The
+conditional headers the Fetcher adds are left out of it; on replay they are
+answered with a 304 when they match the recorded validators.
+
+BAYUT_HTTP_CACHE=record|replay (unset: live), BAYUT_HTTP_CACHE_DIR and
+BAYUT_REPLAY_LATENCY (seconds per response, or "recorded") configure the
+session every Fetcher builds (scraper.make_session).
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+log = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+MODE = os.environ.get("BAYUT_HTTP_CACHE", "").strip().lower() or None
+CACHE_DIR = os.environ.get("BAYUT_HTTP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".httpcache"))
+REPLAY_LATENCY = os.environ.get("BAYUT_REPLAY_LATENCY", "0")
+# request headers that select a different response
+VARY = ("Accept", "Accept-Language", "User-Agent")
+# response headers worth replaying
+KEEP_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Location", "Retry-After")
+# statuses that describe the page rather than the server's mood that moment
+RECORDABLE = frozenset({200, 301, 302, 404, 410})
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+class HttpCache:
+    """Content-addressed response store (see module docstring for the layout)."""
+
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = root
+
+    @staticmethod
+    def key(method: str, url: str, headers) -> str:
+        h = hashlib.sha256(f"{method.upper()} {url}".encode())
+        for name in VARY:
+            h.update(f"\n{name.lower()}: {headers.get(name, '')}".encode())
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, "requests", key[:2], f"{key}.json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.gz")
+
+    def put(self, key: str, url: str, status: int, reason: str, headers, body: bytes, latency: float):
+        digest = hashlib.sha256(body).hexdigest()
+        obj = self._object_path(digest)
+        if not os.path.exists(obj):
+            # mtime=0: the same body always compresses to the same bytes
+            _write(obj, gzip.compress(body, mtime=0))
+        entry = {
+            "url": url, "status": status, "reason": reason, "latency": latency, "body": digest,
+            "headers": {k: headers[k] for k in KEEP_HEADERS if k in headers},
+        }
+        _write(self._entry_path(key), json.dumps(entry, indent=1).encode())
+
+    def get(self, key: str):
+        """(entry dict, body bytes) or None when the request was never recorded."""
+        try:
+            with open(self._entry_path(key)) as f:
+                entry = json.load(f)
+            with gzip.open(self._object_path(entry["body"])) as f:
+                return entry, f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __len__(self) -> int:
+        base = os.path.join(self.root, "requests")
+        return sum(len(files) for _, _, files in os.walk(base)) if os.path.isdir(base) else 0
+
+def _latency(value):
+    if isinstance(value, str) and value.strip().lower() == "recorded":
+        return "recorded"
+    return float(value or 0)
+
+class RecordReplayAdapter(HTTPAdapter):
+    """
+    ``record``: send for real and store every RECORDABLE response (the body
+    is read in full first, so recording gives up streaming). ``replay``:
+    answer from the store after the simulated ``latency``; an unrecorded
+    request gets a 404 (header X-Replay: miss), which the Fetcher reads as
+    "past the last page".
+    """
+
+    def __init__(self, mode: str, cache: HttpCache = None, latency=REPLAY_LATENCY, **kwargs):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+        super().__init__(**kwargs)
+        self.mode = mode
+        self.cache = cache if cache is not None else HttpCache()
+        self.latency = _latency(latency)
+        self.hits = 0
+        self.misses = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = self.cache.key(request.method, request.url, request.headers)
+        if self.mode == "replay":
+            return self._replay(request, key)
+        t0 = time.perf_counter()
+        r = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        if r.status_code in RECORDABLE:
+            body = r.content
+            self.cache.put(key, request.url, r.status_code, r.reason, r.headers, body, time.perf_counter() - t0)
+        return r
+
+    def _replay(self, request, key: str) -> Response:
+        found = self.cache.get(key)
+        if found is None:
+            self.misses += 1
+            log.warning("replay miss: %s %s", request.method, request.url)
+            entry, body = {"status": 404, "reason": "Not Recorded", "headers": {"X-Replay": "miss"}, "latency": 0.0}, b""
+        else:
+            self.hits += 1
+            entry, body = found
+        delay = entry["latency"] if self.latency == "recorded" else self.latency
+        if delay:
+            time.sleep(delay)
+
+        headers = CaseInsensitiveDict(entry["headers"])
+        status, reason = entry["status"], entry["reason"]
+        etag, modified = headers.get("ETag"), headers.get("Last-Modified")
+        if status == 200 and ((etag and request.headers.get("If-None-Match") == etag)
+                              or (modified and request.headers.get("If-Modified-Since") == modified)):
+            status, reason, body = 304, "Not Modified", b""
+
+        r = Response()
+        r.status_code = status
+        r.reason = reason
+        r.headers = headers
+        r.headers["Content-Length"] = str(len(body))
+        r.encoding = get_encoding_from_headers(headers)
+        r.raw = io.BytesIO(body)
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        r.elapsed = timedelta(seconds=delay or 0)
+        return r
+
+def mount(session, mode: str = MODE, cache: HttpCache = None, latency=REPLAY_LATENCY, **adapter_kwargs):
+    """Mount a RecordReplayAdapter for http(s) on ``session``; ``mode`` None leaves it live."""
+    if not mode:
+        return session
+    adapter = RecordReplayAdapter(mode, cache, latency, **adapter_kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
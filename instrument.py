@@ -0,0 +1,190 @@
+# instrument.py
+"""
+In-process metrics for the scrape and dashboard hot paths: counters,
+fixed-bucket histograms and read-at-render gauges, exposed in the Prometheus
+text format (dashapp's ``/metrics``) or as rows (app.py's diagnostics panel).
+
+With BAYUT_METRICS=0 every recording call is a single flag check. Leading
+arguments are positional-only, so any keyword (even ``name``) is a label.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+ENABLED = os.environ.get("BAYUT_METRICS", "1") != "0"
+# histogram upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+# (name, labels) -> value
+_counters = {}
+# (name, labels) -> [count per bucket ..., count above the last bucket, sum]
+_histograms = {}
+# (name, labels) -> callable returning the current value
+_gauges = {}
+_help = {}
+
+def _key(name: str, labels: dict):
+    return name, tuple(sorted(labels.items()))
+
+def describe(name: str, text: str):
+    _help[name] = text
+
+def inc(name: str, value: float = 1, /, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, /, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        h[bisect.bisect_left(BUCKETS, value)] += 1
+        h[-1] += value
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+
+_NULL = nullcontext()
+
+def timer(name: str, /, **labels):
+    """``with timer(...)`` records the block's wall time into histogram ``name``."""
+    return _Timer(name, labels) if ENABLED else _NULL
+
+def timed(name: str, /, **labels):
+    """Decorator form of ``timer``; returns the function untouched when disabled."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+def gauge(name: str, fn, /, **labels):
+    """Register ``fn()`` as the value of gauge ``name``; it is called at render time."""
+    with _lock:
+        _gauges[_key(name, labels)] = fn
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+# -----------------------------
+# Export
+# -----------------------------
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+def _number(v) -> str:
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return "NaN"
+    if isinstance(v, float) and math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def _read_gauges():
+    with _lock:
+        gauges = list(_gauges.items())
+    out = []
+    for key, fn in gauges:
+        try:
+            out.append((key, float(fn())))
+        except Exception:
+            out.append((key, float("nan")))
+    return out
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+    gauges = sorted(_read_gauges())
+    lines, typed = [], set()
+
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        header(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    for (name, labels), value in gauges:
+        header(name, "gauge")
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    for (name, labels), h in histograms:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), h[:-1]):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(labels, [('le', _number(float(bound)))])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(h[-1])}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def summary() -> list:
+    """One dict per series: histograms as count / mean / total, others as value."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+    rows = []
+    for (name, labels), h in histograms:
+        n = sum(h[:-1])
+        rows.append({"metric": name, "labels": _labels(labels), "count": n,
+                     "mean": h[-1] / n if n else float("nan"), "value": h[-1]})
+    for (name, labels), value in counters:
+        rows.append({"metric": name, "labels": _labels(labels), "count": None, "mean": None, "value": value})
+    for (name, labels), value in sorted(_read_gauges()):
+        rows.append({"metric": name, "labels": _labels(labels), "count": None, "mean": None, "value": value})
+    return rows
+
+describe("bayut_http_request_seconds", "Wall time of one results-page request, by host and status code.")
+describe("bayut_http_retries_total", "Requests retried, by host and reason (status code or error).")
+describe("bayut_fetch_concurrency", "Adaptive limit on requests in flight, by host.")
+describe("bayut_http_response_bytes_total", "Response body bytes received, by host.")
+describe("bayut_pages_failed_total", "Results pages that could not be fetched and were skipped, by host and error.")
+describe("bayut_parse_page_seconds", "Time to find and parse the cards of one page, by backend.")
+describe("bayut_cards_total", "Cards found / parsed / failed, by backend and card-finding strategy.")
+describe("bayut_duplicate_cards_total", "Repeated cards dropped by fingerprint.")
+describe("bayut_listing_changes_total", "Listings new / removed / repriced between consecutive scrapes.")
+describe("bayut_frame_build_seconds", "Time to build a listings DataFrame from parsed rows.")
+describe("bayut_analytics_seconds", "Time to build the price/sqft and yield analytics of a snapshot.")
+describe("bayut_analytics_cells_total", "Analytics cells recomputed / reused from the previous snapshot.")
+describe("bayut_snapshot_age_seconds", "Age of the snapshot being served.")
+describe("bayut_snapshot_version", "Version of the snapshot being served.")
+describe("bayut_callback_seconds", "Dash callback latency, by callback.")
@@ -0,0 +1,100 @@
+# listings.py
+"""
+Compact, shared listing store for a server process.
+
+One frame per snapshot, held in Status order, so Buy / Rent / All are
+contiguous row ranges handed out as zero-copy slices instead of filtered
+copies and concats. The raw price/area text (pipeline.RAW_COLUMNS) lives in a
+separate column group that is only read when something asks for it.
+"""
+import threading
+from functools import cached_property
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from pipeline import ALL, RAW_COLUMNS, Cube
+from tablequery import PositionCache
+
+class ListingStore:
+    """
+    Rows are reordered by Status once, on construction (a no-op for frames
+    saved in that order). Raw columns present in ``frame`` are split off into
+    the raw group; otherwise ``raw_loader()`` is called on first use and must
+    return them in ``frame``'s original row order. ``key`` names the data
+    (e.g. a snapshot version) for caches layered on top.
+
+    Views share memory with the store: treat them as read-only.
+    """
+
+    def __init__(self, frame: pd.DataFrame, raw_loader: Callable = None, key=None):
+        self.key = key
+        status = frame["Status"].astype(str).to_numpy()
+        order = np.argsort(status, kind="stable")
+        self._order = None if (order == np.arange(len(order))).all() else order
+        if self._order is not None:
+            frame, status = frame.iloc[order], status[order]
+        frame = frame.reset_index(drop=True)
+
+        raw_cols = [c for c in RAW_COLUMNS if c in frame.columns]
+        self.core = frame.drop(columns=raw_cols) if raw_cols else frame
+        self._raw = frame[raw_cols] if raw_cols else None
+        self._raw_loader = raw_loader
+        self._lock = threading.Lock()
+
+        labels, starts = np.unique(status, return_index=True)
+        stops = list(starts[1:]) + [len(status)]
+        self._bounds = {str(l): (int(a), int(b)) for l, a, b in zip(labels, starts, stops)}
+        self._bounds[ALL] = (0, len(status))
+        self._positions = {s: PositionCache() for s in self._bounds}
+
+    @property
+    def statuses(self) -> list:
+        return [s for s in self._bounds if s != ALL]
+
+    def _slice(self, status: str) -> slice:
+        start, stop = self._bounds.get(status, (0, 0))
+        return slice(start, stop)
+
+    def view(self, status: str = ALL) -> pd.DataFrame:
+        """Working columns of one status ("All" for every row), without copying."""
+        return self.core.iloc[self._slice(status)]
+
+    def positions(self, status: str = ALL) -> PositionCache:
+        """Table row orders of ``view(status)`` (tablequery.query_page)."""
+        cache = self._positions.get(status)
+        return PositionCache() if cache is None else cache
+
+    @cached_property
+    def cube(self) -> Cube:
+        return Cube(self.core)
+
+    @property
+    def raw_frame(self) -> pd.DataFrame:
+        with self._lock:
+            if self._raw is None:
+                raw = self._raw_loader() if self._raw_loader else pd.DataFrame(index=self.core.index)
+                if self._order is not None and len(raw.columns):
+                    raw = raw.iloc[self._order]
+                self._raw = raw.set_axis(self.core.index)
+            return self._raw
+
+    def raw(self, status: str = ALL) -> pd.DataFrame:
+        return self.raw_frame.iloc[self._slice(status)]
+
+    def rows(self, index, columns) -> pd.DataFrame:
+        """Rows by store index label (e.g. one table page), raw columns included."""
+        core_cols = [c for c in columns if c in self.core.columns]
+        raw_cols = [c for c in columns if c in RAW_COLUMNS]
+        out = self.core.loc[index, core_cols]
+        if raw_cols:
+            out = out.join(self.raw_frame.loc[index, [c for c in raw_cols if c in self.raw_frame.columns]])
+        return out[[c for c in columns if c in out.columns]]
+
+    def memory_usage(self) -> int:
+        """Bytes held, counting the raw group only once it is loaded."""
+        n = int(self.core.memory_usage(deep=True).sum())
+        if self._raw is not None:
+            n += int(self._raw.memory_usage(deep=True).sum())
+        return n
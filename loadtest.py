@@ -0,0 +1,233 @@
+# loadtest.py
+"""
+Load generator for the two front-ends, fully offline.
+
+    python loadtest.py dash --users 1,10,50              # dropdown callbacks via Flask's test client
+    python loadtest.py streamlit --users 1,4             # app.py reruns via streamlit.testing AppTest
+    python loadtest.py dash --replay DIR                 # data from an httpcache recording
+    python loadtest.py dash --cards 5000 --json out.json # synthetic data; results also as JSON
+
+Every simulated user loads the page once, then keeps changing the status
+and bedroom dropdowns (``--think`` seconds apart) until ``--duration`` is
+up; a Dash user posts every callback the change fires, as a browser would.
+Each user count is one round; the report gives requests, errors,
+throughput, p50 / p95 / p99 latency, response KB per request (Dash), CPU
+per request (server and client share the process, so an upper bound) and
+the process RSS after the round.
+
+Data comes from a throwaway snapshot store: synthetic pages (bench.py's
+fixtures) by default, or a scrape replayed from ``--replay``. Nothing
+touches the network.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# repo modules read their settings from the environment on import, so they
+# are imported inside the drivers, after main() has set it up
+
+# -----------------------------
+# Offline data
+# -----------------------------
+def _environment(args):
+    os.environ["BAYUT_REFRESH"] = "0"
+    os.environ["BAYUT_STORE_DIR"] = tempfile.mkdtemp(prefix="loadtest-store-")
+    os.environ["BAYUT_HISTORY_DIR"] = tempfile.mkdtemp(prefix="loadtest-history-")
+    if args.replay:
+        os.environ["BAYUT_HTTP_CACHE"] = "replay"
+        os.environ["BAYUT_HTTP_CACHE_DIR"] = args.replay
+        os.environ["BAYUT_REPLAY_LATENCY"] = "0"
+
+def _synthetic_rows(cards: int) -> dict:
+    from bench import synthetic_pages
+    from scraper import parse_page
+    return {s: [r for p in synthetic_pages(s, cards) for r in parse_page(p, s)[0]] for s in ("Buy", "Rent")}
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def rss_mb() -> float:
+    """Resident set size now (Linux), else the peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_round(user, users: int, duration: float) -> dict:
+    """Run ``user(deadline, record)`` on ``users`` threads; summarize what they recorded."""
+    latencies, errors, sizes, lock = [], [0], [], threading.Lock()
+
+    def record(seconds: float, ok: bool, size: int = None):
+        with lock:
+            latencies.append(seconds)
+            errors[0] += not ok
+            if size is not None:
+                sizes.append(size)
+
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=user, args=(deadline, record, random.Random(i))) for i in range(users)]
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    lat = np.array(latencies) * 1e3
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if len(lat) else (np.nan,) * 3
+    return {
+        "users": users, "requests": len(lat), "errors": errors[0],
+        "per_sec": len(lat) / wall if wall > 0 else 0.0,
+        "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+        "kb_per_req": float(np.mean(sizes)) / 1024 if sizes else None,
+        "cpu_ms_per_req": cpu * 1e3 / len(lat) if len(lat) else None,
+        "rss_mb": rss_mb(),
+    }
+
+def _prop(ref: str) -> dict:
+    component, prop = ref.split(".")
+    return {"id": component, "property": prop}
+
+def _choices(rng, statuses, beds, status, bed):
+    # users mostly flip one dropdown at a time, like they would in a browser
+    if rng.random() < 0.5:
+        return rng.choice(statuses), bed
+    return status, rng.choice(beds)
+
+# -----------------------------
+# Dash
+# -----------------------------
+def dash_user_factory(args):
+    import dashapp
+    if args.replay:
+        dashapp.REFRESHER.refresh()
+    else:
+        rows = _synthetic_rows(args.cards)
+        where = ["Business Bay", "DAMAC Towers"]
+        gg = [[[r[f] for f in dashapp.FIELDS] + where for r in rows[s]] for s in ("Rent", "Buy")]
+        frame, metrics = dashapp.snapshot_data(gg)
+        dashapp.REFRESHER.snapshot = dashapp.REFRESHER.store.save("dashapp", frame, metrics).warm()
+    snap = dashapp.current()
+    statuses, beds = dashapp.get_status(snap), dashapp.get_bed(snap)
+    server = dashapp.server
+
+    def payload(outputs, inputs, changed):
+        many = len(outputs) > 1
+        return {
+            "output": f"..{'...'.join(outputs)}.." if many else outputs[0],
+            "outputs": [_prop(o) for o in outputs] if many else _prop(outputs[0]),
+            "inputs": [{**_prop(i), "value": v} for i, v in inputs],
+            "changedPropIds": [changed],
+            "state": [],
+        }
+
+    def callbacks(status, bed, changed):
+        # what a dropdown change sends to the server: graph3 only follows
+        # bedrooms; graph1 / graph2 are redrawn in the browser (assets/charts.js)
+        both = [("my-id1.value", status), ("my-bd1.value", bed)]
+        out = [payload(["graph4.figure"], both, changed)]
+        if changed == "my-bd1.value":
+            out.append(payload(["graph3.figure"], [("my-bd1.value", bed)], changed))
+        return out
+
+    def user(deadline, record, rng):
+        client = server.test_client()
+        t0 = time.perf_counter()
+        r = client.get("/")
+        record(time.perf_counter() - t0, r.status_code == 200, len(r.data))
+        status, bed = "Buy", "1"
+        while time.perf_counter() < deadline:
+            new_status, new_bed = _choices(rng, statuses, beds, status, bed)
+            changed = "my-id1.value" if new_status != status else "my-bd1.value"
+            status, bed = new_status, new_bed
+            for body in callbacks(status, bed, changed):
+                t0 = time.perf_counter()
+                r = client.post("/_dash-update-component", json=body)
+                record(time.perf_counter() - t0, r.status_code == 200, len(r.data))
+            if args.think:
+                time.sleep(args.think)
+    return user
+
+# -----------------------------
+# Streamlit
+# -----------------------------
+def streamlit_user_factory(args):
+    from streamlit.testing.v1 import AppTest
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    if not args.replay:
+        from crawler import DEFAULT_CATALOG, Target, combine, target_frame
+        from snapshot import SnapshotStore
+        rows = _synthetic_rows(args.cards)
+        entry = DEFAULT_CATALOG[0]
+        frame = combine(target_frame(Target(entry["area"], entry["building"], s, entry["path"]), rows[s]) for s in rows)
+        SnapshotStore().save("listings", frame.sort_values("Status", kind="stable"))
+    # first run scrapes (replay) or loads the snapshot, filling the shared caches
+    warm = AppTest.from_file(script, default_timeout=args.timeout)
+    warm.run()
+    if warm.exception:
+        raise RuntimeError(f"app.py failed: {warm.exception[0].value}")
+    statuses = list(warm.selectbox[0].options)
+    beds = list(warm.selectbox[1].options)
+
+    def user(deadline, record, rng):
+        at = AppTest.from_file(script, default_timeout=args.timeout)
+        t0 = time.perf_counter()
+        at.run()
+        record(time.perf_counter() - t0, not at.exception)
+        status, bed = at.selectbox[0].value, at.selectbox[1].value
+        while time.perf_counter() < deadline:
+            status, bed = _choices(rng, statuses, beds, status, bed)
+            at.selectbox[0].select(status)
+            at.selectbox[1].select(bed)
+            t0 = time.perf_counter()
+            at.run()
+            record(time.perf_counter() - t0, not at.exception)
+            if args.think:
+                time.sleep(args.think)
+    return user
+
+DRIVERS = {"dash": dash_user_factory, "streamlit": streamlit_user_factory}
+
+# -----------------------------
+# Report
+# -----------------------------
+def report(target: str, results: list):
+    print(f"{target}: {'users':>6}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'KB/req':>9}{'CPU ms':>9}{'RSS MB':>9}")
+    for r in results:
+        kb = "—" if r["kb_per_req"] is None else f"{r['kb_per_req']:.2f}"
+        cpu = "—" if r["cpu_ms_per_req"] is None else f"{r['cpu_ms_per_req']:.2f}"
+        print(f"{'':<{len(target) + 2}}{r['users']:>6}{r['requests']:>10,}{r['errors']:>8}{r['per_sec']:>10,.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{kb:>9}{cpu:>9}{r['rss_mb']:>9.0f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("target", choices=sorted(DRIVERS))
+    ap.add_argument("--users", default="1,10", help="comma-separated concurrent user counts, one round each")
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per round")
+    ap.add_argument("--think", type=float, default=0.0, help="seconds each user waits between changes")
+    ap.add_argument("--cards", type=int, default=2400, help="synthetic listings per status")
+    ap.add_argument("--replay", help="httpcache directory to scrape from instead of synthetic data")
+    ap.add_argument("--timeout", type=float, default=60.0, help="streamlit: seconds allowed per rerun")
+    ap.add_argument("--json", help="also write the results here")
+    args = ap.parse_args(argv)
+
+    _environment(args)
+    user = DRIVERS[args.target](args)
+    results = [run_round(user, int(n), args.duration) for n in args.users.split(",") if n.strip()]
+    report(args.target, results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"target": args.target, "rounds": results}, f, indent=2)
+    return 1 if any(r["errors"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
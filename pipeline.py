@@ -0,0 +1,234 @@
+# pipeline.py
+"""
+Rows -> DataFrame -> metrics stages shared by the front-ends, the CLI and bench.py.
+"""
+import re
+from itertools import product
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+SCHEMA = [
+    "Status", "Price", "Price (raw)", "Period", "Location", "Key Words",
+    "Bedrooms", "Bedrooms (num)", "Area (sqft)", "Area (raw)", "Agency"
+]
+# what scraper's parsers emit per card: text only; normalize derives the
+# numeric columns for a whole frame at once. Kept here so reading a stored
+# snapshot never loads the fetch layer (requests, lxml)
+RAW_FIELDS = [
+    "Status", "Price (raw)", "Location", "Key Words", "Bedrooms", "Area (raw)", "Agency"
+]
+# columns crawler adds to the SCHEMA frame: the catalog target a row was found under
+TARGET_FIELDS = ["Area", "Building"]
+# low-cardinality text columns stored as pandas categoricals
+CATEGORICAL = ["Status", "Agency", "Bedrooms", "Location", "Period"]
+# free text, held in Arrow string arrays (one buffer, no Python object per value)
+TEXT = ["Key Words", "Price (raw)", "Area (raw)"]
+# the unparsed text behind Price / Area (sqft): display-only, so listings.ListingStore
+# keeps it apart from the working columns and loads it on demand
+RAW_COLUMNS = ["Price (raw)", "Area (raw)"]
+
+_NON_NUMERIC = re.compile(r"[^\d.]")
+_FIRST_INT = re.compile(r"(\d+)")
+_PERIOD = re.compile(r"(year|annual|month|week|dai|day)", re.I)
+# what a rent price covers, as shown next to it; times per year in PER_YEAR
+PERIODS = {"year": "Yearly", "annual": "Yearly", "month": "Monthly", "week": "Weekly", "dai": "Daily", "day": "Daily"}
+# rent payments per year for each PERIODS value
+PER_YEAR = {"Yearly": 1, "Monthly": 12, "Weekly": 52, "Daily": 365}
+# an untagged rent this far below its bedroom count's median is taken as monthly
+MONTHLY_RATIO = 6
+
+def to_number(raw: pd.Series) -> pd.Series:
+    """
+    Messy text ("AED 1,200,000", "1,234 sqft") to float64 in one vectorized pass:
+    everything but digits and dots is dropped; blanks and junk become NaN.
+    """
+    digits = raw.astype("string").str.replace(_NON_NUMERIC, "", regex=True)
+    return pd.to_numeric(digits, errors="coerce").astype("float64")
+
+def first_int(raw: pd.Series) -> pd.Series:
+    """First run of digits as a nullable Int64 ("2 Beds" -> 2, "Studio" -> <NA>)."""
+    digits = raw.astype("string").str.extract(_FIRST_INT, expand=False)
+    return pd.to_numeric(digits, errors="coerce").astype("Int64")
+
+def rent_period(raw: pd.Series) -> pd.Series:
+    """"AED 95,000 Yearly" -> "Yearly"; <NA> where the price text names no period."""
+    found = raw.astype("string").str.extract(_PERIOD, expand=False).str.lower()
+    return found.map(PERIODS).astype("string")
+
+def categorize(df: pd.DataFrame, columns=CATEGORICAL) -> pd.DataFrame:
+    for col in columns:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+def compact_text(df: pd.DataFrame, columns=TEXT) -> pd.DataFrame:
+    for col in columns:
+        if col in df.columns:
+            df[col] = df[col].astype("string[pyarrow]")
+    return df
+
+def normalize(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    RAW_FIELDS frame -> SCHEMA frame: numeric Price / Area (sqft), the rent
+    Period named in the price text, nullable-int Bedrooms (num), categorical
+    CATEGORICAL columns and Arrow-backed TEXT.
+    """
+    df = pd.DataFrame(index=raw.index)
+    for col in SCHEMA:
+        if col in raw.columns:
+            df[col] = raw[col]
+        else:
+            df[col] = np.nan
+    df["Price"] = to_number(raw["Price (raw)"])
+    df["Period"] = rent_period(raw["Price (raw)"])
+    df["Area (sqft)"] = to_number(raw["Area (raw)"]).astype("float32")
+    beds = first_int(raw["Bedrooms"])
+    df["Bedrooms (num)"] = beds.where(beds.between(0, 127)).astype("Int8")
+    return compact_text(categorize(df))
+
+def rows_to_frame(rows) -> pd.DataFrame:
+    """
+    Parsed card dicts to a normalized SCHEMA frame (schema kept even with zero rows).
+    """
+    with instrument.timer("bayut_frame_build_seconds", stage="rows_to_frame"):
+        return normalize(pd.DataFrame(rows, columns=RAW_FIELDS))
+
+# -----------------------------
+# Yearly prices
+# -----------------------------
+def _categorical(s: pd.Series):
+    """(codes, categories) of a column, categorizing it first if needed (-1 = missing)."""
+    cat = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+    return cat.cat.codes.to_numpy().astype("int64"), cat.cat.categories
+
+def annual_factor(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Multiplier turning each row's price into a yearly amount: 1 for sales,
+    PER_YEAR of the row's Period for rents. A rent with no Period is yearly
+    (Bayut's default for Dubai) unless it is MONTHLY_RATIO times below the
+    median of the untagged rents with its bedroom count.
+    """
+    n = len(frame)
+    factor = np.ones(n)
+    rent = (frame["Status"] == "Rent").to_numpy()
+    if not rent.any():
+        return factor
+    per_year = np.full(n, np.nan)
+    if "Period" in frame.columns:
+        codes, categories = _categorical(frame["Period"])
+        # look up each category once, then index by code (code -1 reads the trailing NaN)
+        lut = np.append(np.array([PER_YEAR.get(c, np.nan) for c in categories], dtype="float64"), np.nan)
+        per_year = lut[codes]
+    tagged = ~np.isnan(per_year)
+    factor[rent & tagged] = per_year[rent & tagged]
+
+    untagged = rent & ~tagged
+    if untagged.any():
+        price = frame["Price"].to_numpy(dtype="float64", na_value=np.nan)[untagged]
+        beds, _ = _categorical(frame["Bedrooms"])
+        median = pd.Series(price).groupby(beds[untagged]).transform("median").to_numpy()
+        factor[np.flatnonzero(untagged)[price * MONTHLY_RATIO < median]] = 12
+    return factor
+
+def yearly_price(frame: pd.DataFrame) -> pd.Series:
+    """Price as a yearly amount for rents (annual_factor), unchanged for sales."""
+    return frame["Price"].astype("float64") * annual_factor(frame)
+
+def _roi(ABS1: float, ARS1: float) -> float:
+    return (ARS1 / ABS1) if (pd.notna(ABS1) and pd.notna(ARS1) and ABS1 > 0) else np.nan
+
+def price_metrics(df_buy: pd.DataFrame, df_rent: pd.DataFrame):
+    """
+    (ABS, ARS, ROI): average buy price, average yearly rent, yearly rent ÷ buy.
+    """
+    ABS1 = df_buy["Price"].dropna().mean() if not df_buy.empty else np.nan
+    ARS1 = yearly_price(df_rent).dropna().mean() if not df_rent.empty else np.nan
+    return ABS1, ARS1, _roi(ABS1, ARS1)
+
+# -----------------------------
+# Aggregate cube
+# -----------------------------
+ALL = "All"
+
+class Cell(NamedTuple):
+    count: int
+    mean_price: float
+    mean_area: float
+    price_per_sqft: float
+
+EMPTY_CELL = Cell(0, np.nan, np.nan, np.nan)
+
+class Cube:
+    """
+    Per-snapshot aggregates over (Status, Bedrooms, Agency), with every
+    roll-up precomputed: any dimension may be "All". Charts and metric cards
+    read cells with a dict lookup, so their cost doesn't grow with listings.
+
+    Prices are yearly for rents (annual_factor), so a Rent cell's mean price
+    is the average yearly rent. ``price_per_sqft`` is total price over total
+    area for listings that have both.
+    """
+    DIMS = ("Status", "Bedrooms", "Agency")
+
+    def __init__(self, frame: pd.DataFrame):
+        price = yearly_price(frame)
+        area = frame["Area (sqft)"].astype("float64")
+        both = price.notna() & (area > 0)
+        parts = pd.DataFrame({
+            d: frame[d].astype(object).where(frame[d].notna(), "") for d in self.DIMS
+        })
+        parts["n"] = 1
+        parts["price_n"] = price.notna().astype("int64")
+        parts["price_sum"] = price.fillna(0.0)
+        parts["area_n"] = area.notna().astype("int64")
+        parts["area_sum"] = area.fillna(0.0)
+        parts["ppsf_price"] = price.where(both, 0.0)
+        parts["ppsf_area"] = area.where(both, 0.0)
+        base = parts.groupby(list(self.DIMS), sort=False).sum()
+
+        self._cells = {}
+        for keep in product((True, False), repeat=len(self.DIMS)):
+            kept = [d for d, k in zip(self.DIMS, keep) if k]
+            if kept:
+                agg = base.groupby(level=kept, sort=False).sum()
+            else:
+                agg = base.sum().to_frame().T
+            for key, row in zip(agg.index, agg.itertuples(index=False)):
+                key = key if isinstance(key, tuple) else (key,)
+                it = iter(key)
+                full = tuple(next(it) if k else ALL for k in keep) if kept else (ALL,) * len(self.DIMS)
+                self._cells[full] = _cell(row)
+
+        self.statuses = sorted({k[0] for k in self._cells if k[0] != ALL})
+        self.bedrooms = sorted({k[1] for k in self._cells if k[1] != ALL})
+        self.agencies = sorted({k[2] for k in self._cells if k[2] != ALL})
+        self._by_bedrooms = {
+            status: [(bed, self._cells[(status, bed, ALL)].count)
+                     for bed in self.bedrooms if (status, bed, ALL) in self._cells]
+            for status in self.statuses + [ALL]
+        }
+
+    def get(self, status: str = ALL, bedrooms: str = ALL, agency: str = ALL) -> Cell:
+        return self._cells.get((status, bedrooms, agency), EMPTY_CELL)
+
+    def counts_by_bedrooms(self, status: str = ALL) -> list:
+        """[(bedrooms, count), ...] sorted by bedrooms label, zero counts omitted."""
+        return self._by_bedrooms.get(status, [])
+
+def _cell(row) -> Cell:
+    return Cell(
+        int(row.n),
+        row.price_sum / row.price_n if row.price_n else np.nan,
+        row.area_sum / row.area_n if row.area_n else np.nan,
+        row.ppsf_price / row.ppsf_area if row.ppsf_area else np.nan,
+    )
+
+def cube_metrics(cube: Cube):
+    """price_metrics from cube cells: (ABS, ARS, ROI)."""
+    ABS1 = cube.get("Buy").mean_price
+    ARS1 = cube.get("Rent").mean_price
+    return ABS1, ARS1, _roi(ABS1, ARS1)
@@ -0,0 +1,920 @@
+# scraper.py
+"""
+Shared fetch & parse layer used by both front-ends (app.py / dashapp.py).
+"""
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urlsplit
+
+import lxml.html
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import etree
+
+import httpcache
+import instrument
+
+log = logging.getLogger(__name__)
+
+# -----------------------------
+# Constants
+# -----------------------------
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:91.0) "
+        "Gecko/20100101 Firefox/91.0"
+    )
+}
+
+BASE = "https://www.bayut.com"
+BUILDING_PATH = "dubai/business-bay/damac-towers-by-paramount-hotels-and-resorts"
+STATUS_SLUGS = {"Buy": "for-sale", "Rent": "to-rent"}
+
+def status_url(status: str, path: str = BUILDING_PATH, base: str = BASE) -> str:
+    return f"{base}/{STATUS_SLUGS[status]}/property/{path}/"
+
+SALE_URL = status_url("Buy")
+RENT_URL = status_url("Rent")
+STATUS_URLS = {"Buy": SALE_URL, "Rent": RENT_URL}
+
+# parallel page fetches; also sizes the keep-alive connection pool. It is the
+# ceiling: requests actually in flight per host start at START_CONCURRENCY and
+# adapt (HostConcurrency) to how the host copes
+CONCURRENCY = int(os.environ.get("BAYUT_CONCURRENCY", "8"))
+START_CONCURRENCY = int(os.environ.get("BAYUT_START_CONCURRENCY", "2"))
+# attempts after the first for a throttled / failed request, and the base and
+# cap (seconds) of the jittered exponential backoff between them
+RETRIES = int(os.environ.get("BAYUT_RETRIES", "4"))
+BACKOFF = float(os.environ.get("BAYUT_BACKOFF", "0.5"))
+BACKOFF_MAX = 30.0
+# a Retry-After longer than this is not waited out: the request fails instead
+RETRY_AFTER_MAX = 120.0
+# server-side trouble worth retrying (and backing off from)
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+# hard cap on pages followed per status URL
+MAX_PAGES = int(os.environ.get("BAYUT_MAX_PAGES", "50"))
+# page parser backend: "lxml" (fast) or "soup" (BeautifulSoup + html.parser)
+PARSER = os.environ.get("BAYUT_PARSER", "lxml")
+PARSERS = ("lxml", "soup")
+# politeness: sustained requests per second to any one host (0 = unlimited)
+# and how many of them may go out back-to-back after an idle spell
+HOST_RATE = float(os.environ.get("BAYUT_HOST_RATE", "5"))
+HOST_BURST = int(os.environ.get("BAYUT_HOST_BURST", "1"))
+# bytes per read when streaming a response into the incremental parser
+CHUNK_SIZE = int(os.environ.get("BAYUT_CHUNK_SIZE", "16384"))
+# most elements the last-resort article/div fallback in find_cards will treat as cards
+FALLBACK_LIMIT = 200
+
+# -----------------------------
+# Parsing helpers
+# -----------------------------
+def _first_attr(el, attr, default=""):
+    try:
+        return el.get(attr, default)
+    except Exception:
+        return default
+
+def _text(el):
+    return el.get_text(" ", strip=True) if el else ""
+
+_PRICE_RE = re.compile(r"AED|د\.إ")
+_AREA_RE = re.compile(r"sqft|ft²", re.I)
+
+def parse_card(card, status_label: str) -> dict:
+    price_el = card.select_one("span[aria-label='Price']") or card.find("span", string=_PRICE_RE)
+    price_text = _text(price_el)
+    # rent cards put the period ("Yearly", "Monthly") next to the amount
+    freq_text = _text(card.select_one("span[aria-label='Frequency']"))
+    if freq_text and freq_text not in price_text:
+        price_text = f"{price_text} {freq_text}"
+
+    beds_el  = card.select_one("span[aria-label='Beds']")
+    beds_text = _text(beds_el)
+
+    area_el = card.select_one("span[aria-label='Area']") or card.find(string=_AREA_RE)
+    area_text = _text(area_el)
+
+    title_text = _text(card.select_one("h2[aria-label='Title']") or card.find("h2"))
+    loc_text   = _text(card.select_one("div[aria-label='Location']"))
+
+    agency_img = card.select_one("img[title]") or card.select_one("img[alt]")
+    agency = _first_attr(agency_img, "title", "") or _first_attr(agency_img, "alt", "")
+
+    return {
+        "Status": status_label,
+        "Price (raw)": price_text,
+        "Location": loc_text,
+        "Key Words": title_text,
+        "Bedrooms": beds_text or "N/A",
+        "Area (raw)": area_text,
+        "Agency": agency,
+    }
+
+
+def _soup(content):
+    # bs4 is only needed by the "soup" backend; importing it costs ~0.1 s of every cold start
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(content, "html.parser")
+
+def find_cards(soup):
+    """
+    Try multiple strategies to locate listing cards.
+    """
+    return _find_cards(soup)[1]
+
+def _find_cards(soup):
+    # (strategy, cards); the strategy name labels the card counters
+    cards = soup.select("div.d6e81fd0")
+    if cards:
+        return "class", cards
+    # fallback: parents of title nodes
+    h2s = soup.select('h2[aria-label="Title"]')
+    parents = []
+    for h in h2s:
+        p = h
+        for _ in range(3):
+            if p and p.parent:
+                p = p.parent
+        if p:
+            parents.append(p)
+    if parents:
+        return "title-parent", parents
+    # last resort; bounded, since on an unknown layout every div becomes a "card"
+    return "fallback", (soup.find_all("article", limit=FALLBACK_LIMIT) or soup.find_all("div", limit=FALLBACK_LIMIT))
+
+# -----------------------------
+# lxml backend
+# -----------------------------
+# Same strategies and row semantics as parse_card/find_cards, on an lxml tree
+# with precompiled XPath instead of BeautifulSoup CSS selects.
+_X_CARDS    = etree.XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' d6e81fd0 ')]")
+_X_TITLES   = etree.XPath("//h2[@aria-label='Title']")
+_X_PRICE    = etree.XPath(".//span[@aria-label='Price']")
+_X_SPANS    = etree.XPath(".//span")
+_X_FREQ     = etree.XPath(".//span[@aria-label='Frequency']")
+_X_BEDS     = etree.XPath(".//span[@aria-label='Beds']")
+_X_AREA     = etree.XPath(".//span[@aria-label='Area']")
+_X_TITLE    = etree.XPath(".//h2[@aria-label='Title']")
+_X_H2       = etree.XPath(".//h2")
+_X_LOCATION = etree.XPath(".//div[@aria-label='Location']")
+_X_IMG_TITLE = etree.XPath(".//img[@title]")
+_X_IMG_ALT  = etree.XPath(".//img[@alt]")
+_X_STRINGS  = etree.XPath(".//text()")
+# get_text() skips the contents of script/style/template
+_X_TEXT     = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+
+
+def _first(xpath, el):
+    found = xpath(el)
+    return found[0] if found else None
+
+def _lx_text(el) -> str:
+    if el is None:
+        return ""
+    return " ".join(t for t in (s.strip() for s in _X_TEXT(el)) if t)
+
+def _lx_string(el):
+    """BeautifulSoup's ``.string``: the sole child string, looking through single-child tags."""
+    while True:
+        children = list(el)
+        if not children:
+            return el.text
+        if len(children) == 1 and not el.text and not children[0].tail:
+            el = children[0]
+            continue
+        return None
+
+def parse_card_lxml(card, status_label: str) -> dict:
+    price_el = _first(_X_PRICE, card)
+    if price_el is None:
+        price_el = next((s for s in _X_SPANS(card) if _PRICE_RE.search(_lx_string(s) or "")), None)
+    price_text = _lx_text(price_el)
+    freq_text = _lx_text(_first(_X_FREQ, card))
+    if freq_text and freq_text not in price_text:
+        price_text = f"{price_text} {freq_text}"
+
+    beds_text = _lx_text(_first(_X_BEDS, card))
+
+    area_el = _first(_X_AREA, card)
+    if area_el is not None:
+        area_text = _lx_text(area_el)
+    else:
+        area_text = next((t.strip() for t in _X_STRINGS(card) if _AREA_RE.search(t)), "")
+
+    title_el = _first(_X_TITLE, card)
+    title_text = _lx_text(title_el if title_el is not None else _first(_X_H2, card))
+    loc_text   = _lx_text(_first(_X_LOCATION, card))
+
+    agency_img = _first(_X_IMG_TITLE, card)
+    if agency_img is None:
+        agency_img = _first(_X_IMG_ALT, card)
+    agency = ""
+    if agency_img is not None:
+        agency = agency_img.get("title", "") or agency_img.get("alt", "")
+
+    return {
+        "Status": status_label,
+        "Price (raw)": price_text,
+        "Location": loc_text,
+        "Key Words": title_text,
+        "Bedrooms": beds_text or "N/A",
+        "Area (raw)": area_text,
+        "Agency": agency,
+    }
+
+def find_cards_lxml(root):
+    return _find_cards_lxml(root)[1]
+
+def _find_cards_lxml(root, fallback: bool = True):
+    cards = _X_CARDS(root)
+    if cards:
+        return "class", cards
+    parents = []
+    for h in _X_TITLES(root):
+        p = h
+        for _ in range(3):
+            if p.getparent() is not None:
+                p = p.getparent()
+        parents.append(p)
+    if parents:
+        return "title-parent", parents
+    if not fallback:
+        return "fallback", []
+    return "fallback", (list(islice(root.iter("article"), FALLBACK_LIMIT)) or list(islice(root.iter("div"), FALLBACK_LIMIT)))
+
+def _lxml_root(content: bytes):
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError:
+        text = content.decode("cp1252", "replace")
+    return lxml.html.document_fromstring(text)
+
+class CardStream:
+    """
+    Incremental lxml parse of one results page. ``feed`` it bytes as they
+    arrive and get back the rows of every card whose closing tag they
+    contained; ``close`` returns the rest. Each card is cleared once parsed,
+    so the tree only ever holds the card in progress plus empty shells.
+
+    Rows match parse_page's lxml backend. A page on which no card matches the
+    class selector keeps its whole tree and gets the remaining find_cards
+    strategies on ``close``.
+    """
+
+    def __init__(self, status_label: str, cache: "ParseCache" = None, encoding: str = None, fallback: bool = True):
+        self.status_label = status_label
+        self.cache = cache
+        # False: a page the fallback strategy alone would find cards on has none
+        self.fallback = fallback
+        self.cards = 0
+        self.errors = 0
+        self.nbytes = 0
+        self.last_page = 1
+        # card-finding strategy, set by close (None: nothing was fed)
+        self.strategy = None
+        self._hash = hashlib.blake2b(digest_size=16)
+        self._tail = b""
+        self._seconds = 0.0
+        self._parser = etree.HTMLPullParser(events=("end",), tag="div", encoding=encoding or "utf-8")
+
+    def _parse(self, card, rows: list):
+        self.cards += 1
+        try:
+            if self.cache is not None:
+                rows.append(self.cache.card(card, self.status_label, parse_card_lxml))
+            else:
+                rows.append(parse_card_lxml(card, self.status_label))
+        except Exception:
+            self.errors += 1
+            return
+        self._hash.update(repr(rows[-1]).encode())
+
+    @property
+    def fingerprint(self) -> bytes:
+        """Digest of the rows parsed so far: equal pages give equal fingerprints."""
+        return self._hash.digest()
+
+    def _drain(self) -> list:
+        rows = []
+        for _, el in self._parser.read_events():
+            if "d6e81fd0" in (el.get("class") or "").split():
+                self._parse(el, rows)
+                el.clear(keep_tail=True)
+        return rows
+
+    def feed(self, chunk: bytes) -> list:
+        t0 = time.perf_counter()
+        self.nbytes += len(chunk)
+        # pager links may straddle two chunks
+        scan = self._tail + chunk
+        self.last_page = max(self.last_page, last_page(scan))
+        self._tail = scan[-32:]
+        self._parser.feed(chunk)
+        rows = self._drain()
+        self._seconds += time.perf_counter() - t0
+        return rows
+
+    def close(self) -> list:
+        t0 = time.perf_counter()
+        strategy = "class"
+        try:
+            root = self._parser.close()
+        except etree.XMLSyntaxError:
+            # nothing parseable was fed (e.g. an empty body)
+            root = None
+        rows = self._drain()
+        if not self.cards and root is not None:
+            strategy, cards = _find_cards_lxml(root, self.fallback)
+            for card in cards:
+                self._parse(card, rows)
+        self._seconds += time.perf_counter() - t0
+        if self.nbytes:
+            self.strategy = strategy
+            instrument.observe("bayut_parse_page_seconds", self._seconds, backend="lxml-stream")
+            parsed = self.cards - self.errors
+            instrument.inc("bayut_cards_total", self.cards, backend="lxml-stream", strategy=strategy, outcome="found")
+            instrument.inc("bayut_cards_total", parsed, backend="lxml-stream", strategy=strategy, outcome="parsed")
+            instrument.inc("bayut_cards_total", self.errors, backend="lxml-stream", strategy=strategy, outcome="failed")
+        return rows
+
+def _digest(data) -> bytes:
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+# per-request noise (inline scripts, CSP nonces) that the card parser never reads
+_VOLATILE = re.compile(rb"<script\b[^>]*>.*?</script>|\snonce=\"[^\"]*\"", re.S | re.I)
+
+def _page_digest(content: bytes) -> bytes:
+    return _digest(_VOLATILE.sub(b"", content))
+
+class ParseCache:
+    """
+    Parsed rows keyed by content hash, at two levels: whole page bodies and
+    individual card HTML fragments. An unchanged page skips parsing entirely;
+    a changed page only runs ``parse_card`` on cards not seen before.
+    Both levels are bounded LRUs.
+    """
+
+    def __init__(self, max_pages: int = 1024, max_cards: int = 50_000):
+        self.max_pages = max_pages
+        self.max_cards = max_cards
+        self._pages = OrderedDict()
+        self._cards = OrderedDict()
+        self.hits = {"page": 0, "card": 0}
+        self.misses = {"page": 0, "card": 0}
+
+    @staticmethod
+    def _get(lru, key):
+        value = lru.get(key)
+        if value is not None:
+            lru.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _put(lru, key, value, limit):
+        lru[key] = value
+        lru.move_to_end(key)
+        while len(lru) > limit:
+            lru.popitem(last=False)
+
+    def page(self, content: bytes, label: str, parse):
+        """Return ``parse(content)`` for this page body, reusing an earlier result."""
+        key = (label, _page_digest(content))
+        cached = self._get(self._pages, key)
+        if cached is not None:
+            self.hits["page"] += 1
+            return cached
+        self.misses["page"] += 1
+        result = parse(content)
+        self._put(self._pages, key, result, self.max_pages)
+        return result
+
+    def card(self, card, label: str, parse):
+        """Return ``parse(card, label)``, reusing the row of an identical fragment."""
+        fragment = etree.tostring(card, with_tail=False) if isinstance(card, etree._Element) else str(card)
+        key = (label, _digest(fragment))
+        cached = self._get(self._cards, key)
+        if cached is not None:
+            self.hits["card"] += 1
+            return cached
+        self.misses["card"] += 1
+        row = parse(card, label)
+        self._put(self._cards, key, row, self.max_cards)
+        return row
+
+def parse_page(content: bytes, status_label: str, cache: ParseCache = None, backend: str = None):
+    """
+    Parse one results page. Returns (rows, number of cards that failed).
+    With a ``cache``, unchanged pages and cards reuse their earlier rows.
+    ``backend`` is one of PARSERS (default: PARSER); both yield identical rows.
+    """
+    backend = backend or PARSER
+    if cache is not None:
+        return cache.page(content, status_label, lambda c: _parse_page(c, status_label, cache, backend))
+    return _parse_page(content, status_label, None, backend)
+
+def _parse_page(content: bytes, status_label: str, cache: ParseCache = None, backend: str = PARSER):
+    if not content or not content.strip():
+        return [], 0
+    with instrument.timer("bayut_parse_page_seconds", backend=backend):
+        if backend == "lxml":
+            (strategy, cards), parse = _find_cards_lxml(_lxml_root(content)), parse_card_lxml
+        elif backend == "soup":
+            (strategy, cards), parse = _find_cards(_soup(content)), parse_card
+        else:
+            raise ValueError(f"unknown parser backend {backend!r}; expected one of {PARSERS}")
+        rows, errs = [], 0
+        for card in cards:
+            try:
+                if cache is not None:
+                    rows.append(cache.card(card, status_label, parse))
+                else:
+                    rows.append(parse(card, status_label))
+            except Exception:
+                errs += 1
+                continue
+    instrument.inc("bayut_cards_total", len(cards), backend=backend, strategy=strategy, outcome="found")
+    instrument.inc("bayut_cards_total", len(rows), backend=backend, strategy=strategy, outcome="parsed")
+    instrument.inc("bayut_cards_total", errs, backend=backend, strategy=strategy, outcome="failed")
+    return rows, errs
+
+# -----------------------------
+# Pagination
+# -----------------------------
+_PAGE_LINK = re.compile(rb"/page-(\d+)/")
+
+def page_url(url: str, page: int) -> str:
+    """Bayut paginates as <url>/page-N/; page 1 is the bare URL."""
+    return url if page <= 1 else f"{url.rstrip('/')}/page-{page}/"
+
+def last_page(content: bytes) -> int:
+    """
+    Highest page number linked from a results page (1 if it has no pager).
+    Bayut only renders a window of page links, so later pages may reveal more.
+    """
+    return max((int(n) for n in _PAGE_LINK.findall(content or b"")), default=1)
+
+def past_end(page: int, strategy: str, cards: int, fingerprint: bytes, seen: dict, first: str) -> bool:
+    """
+    Whether a results page lies past the last one. Bayut answers those with
+    a 200 and no listings, or with page 1 again, rather than a 404. ``seen``
+    maps the fingerprints of the URL's pages so far to their page numbers
+    (updated here); ``first`` is the card-finding strategy page 1 needed.
+    """
+    repeat = seen.setdefault(fingerprint, page) != page
+    if page <= 1:
+        return False
+    if not cards or repeat:
+        return True
+    # the fallback picks up any <article>/<div>: a page only it finds cards on
+    # has no listings, unless page 1 needed it as well (changed markup)
+    return strategy == "fallback" and first != "fallback"
+
+def _redirected(r, target: str) -> bool:
+    # a page past the end that the server sends elsewhere (to page 1)
+    return bool(r.history) and r.url.rstrip("/") != target.rstrip("/")
+
+# -----------------------------
+# Fetch engine
+# -----------------------------
+def make_session(pool_size: int = CONCURRENCY, http_cache: str = httpcache.MODE) -> requests.Session:
+    """
+    Keep-alive session whose connection pool matches the fetch concurrency.
+    ``http_cache`` "record" / "replay" mounts httpcache's record/replay adapter.
+    """
+    s = requests.Session()
+    s.headers.update(HEADERS)
+    if http_cache:
+        return httpcache.mount(s, http_cache, pool_connections=pool_size, pool_maxsize=pool_size)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+class TokenBucket:
+    """
+    ``rate`` tokens per second, holding at most ``burst``. Each ``acquire``
+    reserves a token and sleeps until it exists, so concurrent callers are
+    spaced ``1 / rate`` apart in arrival order rather than bursting.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+class HostLimiter:
+    """One TokenBucket per host, shared by every Fetcher that is handed it."""
+
+    def __init__(self, rate: float = HOST_RATE, burst: int = HOST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str):
+        if self.rate <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
+
+# process-wide, so separate Fetchers still share each host's budget
+HOST_LIMITER = HostLimiter()
+
+class ConcurrencyWindow:
+    """
+    AIMD limit on requests in flight to one host. While the window is full
+    and responses come back fast (within ``slow`` x the baseline latency) it
+    grows by about one request per window's worth of responses; a throttled
+    or failed request halves it, at most once per round trip, down to 1. A
+    ``pause`` (the server's Retry-After) holds every new request back.
+    """
+
+    def __init__(self, ceiling: int, start: int = START_CONCURRENCY, decrease: float = 0.5, slow: float = 2.0):
+        self.ceiling = max(1, ceiling)
+        self.limit = float(min(max(1, start), self.ceiling))
+        self.decrease = decrease
+        self.slow = slow
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        # smoothed and baseline (slowly rising minimum) latency, in seconds
+        self._rtt = None
+        self._base = None
+        self._cut_at = 0.0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+
+    def release(self, latency: float = None, throttled: bool = False):
+        """Return a slot; ``latency`` of a healthy response, or ``throttled`` for trouble."""
+        with self._cond:
+            full = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._cut_at >= (self._rtt or 0.0):
+                    self.limit = max(1.0, self.limit * self.decrease)
+                    self._cut_at = now
+                    self.decreases += 1
+            elif latency is not None:
+                self._rtt = latency if self._rtt is None else 0.8 * self._rtt + 0.2 * latency
+                self._base = latency if self._base is None else min(latency, self._base + 0.01 * (latency - self._base))
+                if full and latency <= self.slow * self._base and self.limit < self.ceiling:
+                    self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+                    self.increases += 1
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class HostConcurrency:
+    """
+    One ConcurrencyWindow per host, shared like HOST_LIMITER. A window's
+    ceiling is the largest concurrency any Fetcher using it asked for.
+    ``start`` <= 0 opens windows at their ceiling (they still back off).
+    """
+
+    def __init__(self, start: int = START_CONCURRENCY):
+        self.start = start
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def window(self, url: str, ceiling: int) -> ConcurrencyWindow:
+        host = urlsplit(url).netloc
+        with self._lock:
+            w = self._windows.get(host)
+            if w is None:
+                w = self._windows[host] = ConcurrencyWindow(ceiling, self.start if self.start > 0 else ceiling)
+                instrument.gauge("bayut_fetch_concurrency", lambda: w.limit, host=host)
+            elif ceiling > w.ceiling:
+                w.ceiling = ceiling
+                if self.start <= 0:
+                    w.limit = float(ceiling)
+        return w
+
+HOST_CONCURRENCY = HostConcurrency()
+
+def backoff(attempt: int, base: float = BACKOFF, cap: float = BACKOFF_MAX) -> float:
+    """Exponential delay before retry ``attempt`` (0-based), half of it random jitter."""
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def retry_after(value) -> float:
+    """Seconds asked for by a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+_CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+
+def _charset(content_type: str):
+    # only an explicit charset; requests would otherwise assume ISO-8859-1 for text/html
+    m = _CHARSET.search(content_type or "")
+    return m.group(1) if m else None
+
+class Fetcher:
+    """
+    Fetches every results page of one or more status URLs over a pooled session.
+
+    Page 1 of each URL is fetched in one concurrent wave; the pages its pager
+    links to (plus a wave of look-ahead) are then fetched together, at most
+    ``concurrency`` in flight, so a refresh costs roughly one round trip per
+    wave instead of one per page. A URL ends at the first page past the
+    last: a 404, a redirect, a page without listings or a repeat of an
+    earlier page (``past_end``).
+
+    With ``conditional`` on, the ETag / Last-Modified of every page is kept
+    and sent back on the next fetch; a 304 returns the stored body.
+
+    Every request first takes a slot in its host's window from ``control``
+    (HOST_CONCURRENCY), then a token from ``limiter`` (HOST_LIMITER), which
+    caps the request rate per host whatever the concurrency. Throttling
+    (429 / 5xx) and connection errors or timeouts shrink the window and are
+    retried up to ``retries`` times after a jittered backoff, or after the
+    server's Retry-After. A body that breaks off mid-stream is not retried.
+    """
+
+    def __init__(self, session: requests.Session = None, concurrency: int = CONCURRENCY,
+                 max_pages: int = MAX_PAGES, timeout: float = 30, conditional: bool = True,
+                 limiter: HostLimiter = None, control: HostConcurrency = None, retries: int = RETRIES):
+        self.concurrency = max(1, concurrency)
+        if limiter is None and session is None and httpcache.MODE == "replay":
+            # nothing reaches the host, so there is no politeness budget to keep
+            limiter = HostLimiter(0)
+        self.limiter = limiter or HOST_LIMITER
+        self.control = control or HOST_CONCURRENCY
+        self.retries = max(0, retries)
+        self.session = session or make_session(self.concurrency)
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.conditional = conditional
+        # page url -> (etag, last-modified, body)
+        self._validators = {}
+        self.not_modified = 0
+
+    def _request(self, target: str, stream: bool = False):
+        """(response, cached (etag, modified, body) or None) for one page URL."""
+        cached = self._validators.get(target) if self.conditional else None
+        headers = {}
+        if cached:
+            etag, modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if modified:
+                headers["If-Modified-Since"] = modified
+        host = urlsplit(target).netloc
+        window = self.control.window(target, self.concurrency)
+        for attempt in range(self.retries + 1):
+            window.acquire()
+            self.limiter.acquire(target)
+            t0 = time.perf_counter()
+            try:
+                r = self.session.get(target, headers=headers, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                window.release(throttled=True)
+                if attempt == self.retries:
+                    raise
+                instrument.inc("bayut_http_retries_total", host=host, reason=type(e).__name__)
+                time.sleep(backoff(attempt))
+                continue
+            except BaseException:
+                window.release()
+                raise
+            # streamed: time to the response headers; otherwise to the full body
+            latency = time.perf_counter() - t0
+            instrument.observe("bayut_http_request_seconds", latency, host=host, code=r.status_code)
+            trouble = r.status_code in RETRY_STATUS
+            window.release(latency, throttled=trouble)
+            if not trouble or attempt == self.retries:
+                return r, cached
+            wait = retry_after(r.headers.get("Retry-After"))
+            if wait is not None:
+                if wait > RETRY_AFTER_MAX:
+                    return r, cached
+                window.pause(wait)
+            r.close()
+            instrument.inc("bayut_http_retries_total", host=host, reason=str(r.status_code))
+            time.sleep(backoff(attempt) if wait is None else wait)
+
+    def _remember(self, target: str, r, body: bytes):
+        instrument.inc("bayut_http_response_bytes_total", len(body), host=urlsplit(target).netloc)
+        if self.conditional:
+            etag, modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            if etag or modified:
+                self._validators[target] = (etag, modified, body)
+
+    def get(self, url: str, page: int = 1) -> bytes:
+        target = page_url(url, page)
+        r, cached = self._request(target)
+        if r.status_code == 304 and cached:
+            self.not_modified += 1
+            return cached[2]
+        if page > 1 and (r.status_code == 404 or _redirected(r, target)):
+            # ran past the last page
+            return b""
+        r.raise_for_status()
+        self._remember(target, r, r.content)
+        return r.content
+
+    def stream_page(self, url: str, page: int, status_label: str, emit, cache: ParseCache = None,
+                    fallback: bool = True) -> CardStream:
+        """
+        Stream one page through a CardStream, calling ``emit(row)`` per card as
+        it is parsed. The body is only kept (for If-None-Match) when the server
+        sent validators. Returns the finished CardStream (``nbytes`` 0: no page).
+        """
+        target = page_url(url, page)
+        r, cached = self._request(target, stream=True)
+        with r:
+            if r.status_code == 304 and cached:
+                self.not_modified += 1
+                chunks, keep = [cached[2]], None
+            elif page > 1 and (r.status_code == 404 or _redirected(r, target)):
+                return CardStream(status_label)
+            else:
+                r.raise_for_status()
+                chunks = r.iter_content(CHUNK_SIZE)
+                validated = self.conditional and (r.headers.get("ETag") or r.headers.get("Last-Modified"))
+                keep = [] if validated else None
+            stream = CardStream(status_label, cache, encoding=_charset(r.headers.get("Content-Type")), fallback=fallback)
+            for chunk in chunks:
+                if keep is not None:
+                    keep.append(chunk)
+                for row in stream.feed(chunk):
+                    emit(row)
+            for row in stream.close():
+                emit(row)
+            if keep is not None:
+                self._remember(target, r, b"".join(keep))
+            elif r.status_code != 304:
+                instrument.inc("bayut_http_response_bytes_total", stream.nbytes, host=urlsplit(target).netloc)
+        return stream
+
+    def fetch_many(self, urls) -> dict:
+        """
+        Return {url: [page1_bytes, page2_bytes, ...]} for every URL, up to
+        the first page past the end (404, redirected, no listings or a repeat
+        of an earlier page: see ``past_end``).
+        """
+        urls = list(dict.fromkeys(urls))
+        pages = {u: {} for u in urls}
+        known = {u: 1 for u in urls}
+        end = {u: self.max_pages + 1 for u in urls}
+        seen, first = {u: {} for u in urls}, {}
+        todo = [(u, 1) for u in urls]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while todo:
+                results = pool.map(lambda job: self.get(*job), todo)
+                linked = dict(known)
+                for (u, n), content in zip(todo, results):
+                    if n >= end[u]:
+                        continue
+                    if not content.strip():
+                        end[u] = n
+                        continue
+                    strategy, cards = _find_cards_lxml(_lxml_root(content))
+                    first.setdefault(u, strategy)
+                    if past_end(n, strategy, len(cards), _page_digest(content), seen[u], first[u]):
+                        end[u] = n
+                        continue
+                    pages[u][n] = content
+                    linked[u] = max(linked[u], last_page(content))
+                todo = []
+                growing = [u for u in urls if known[u] < end[u] and linked[u] > known[u]]
+                # the pager only shows a window of links, so probe ahead of it,
+                # one wave split between the URLs still growing; pages past the
+                # end are dropped (and still cost a token from the limiter)
+                ahead = max(1, self.concurrency // max(1, len(growing)))
+                for u in growing:
+                    upto = min(max(linked[u], known[u] + ahead), self.max_pages)
+                    todo.extend((u, k) for k in range(known[u] + 1, upto + 1))
+                    known[u] = upto
+        return {u: [pages[u][n] for n in sorted(pages[u]) if n < end[u]] for u in urls}
+
+    def stream_rows(self, urls: dict, cache: ParseCache = None):
+        """
+        Yield ``(url, row)`` for every card on every page of ``urls``
+        ({url: status label}) as soon as it is parsed, pages streaming in
+        parallel. Pages are discovered as in ``fetch_many``, except that each
+        finished page schedules its successors right away instead of waiting
+        for the rest of its wave. Pages finish in any order, so the rows of a
+        page found to repeat an earlier one have already been yielded; the
+        refresh paths drop them with the other duplicates (fingerprint.dedupe).
+
+        A page that fails is logged, counted (bayut_pages_failed_total) and
+        skipped; the first error is raised only when no page succeeded.
+        """
+        urls = dict(urls)
+        out = queue.Queue()
+        known = {u: 1 for u in urls}
+        linked = dict(known)
+        done = set()
+        seen, first = {u: {} for u in urls}, {}
+        succeeded, failure = 0, None
+
+        def job(u, n):
+            try:
+                # past page 1, only a page 1 that needed the fallback lets its
+                # generic cards through (see past_end): they are emitted as parsed
+                fallback = n == 1 or first.get(u) == "fallback"
+                stream = self.stream_page(u, n, urls[u], lambda row: out.put(("row", u, row)), cache, fallback)
+                out.put(("page", u, (n, stream)))
+            except BaseException as e:
+                out.put(("error", u, (n, e)))
+
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            pending = 0
+            for u in urls:
+                pool.submit(job, u, 1)
+                pending += 1
+            while pending:
+                kind, u, item = out.get()
+                if kind == "row":
+                    yield u, item
+                    continue
+                pending -= 1
+                n, item = item
+                if kind == "error":
+                    if not isinstance(item, Exception):
+                        raise item
+                    log.warning("skipping page %d of %s: %r", n, u, item)
+                    instrument.inc("bayut_pages_failed_total", host=urlsplit(u).netloc, reason=type(item).__name__)
+                    failure = failure or item
+                    continue
+                if not item.nbytes:
+                    done.add(u)
+                    continue
+                first.setdefault(u, item.strategy)
+                if past_end(n, item.strategy, item.cards, item.fingerprint, seen[u], first[u]):
+                    done.add(u)
+                    continue
+                succeeded += 1
+                linked[u] = max(linked[u], item.last_page)
+                growing = [v for v in urls if v not in done and linked[v] > known[v]]
+                if u not in growing:
+                    continue
+                ahead = max(1, self.concurrency // len(growing))
+                upto = min(max(linked[u], known[u] + ahead), self.max_pages)
+                for k in range(known[u] + 1, upto + 1):
+                    pool.submit(job, u, k)
+                    pending += 1
+                known[u] = upto
+            if failure is not None and not succeeded:
+                raise failure
+        finally:
+            # an abandoned or failed stream stops scheduling pages
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def fetch_pages(self, url: str) -> list:
+        return self.fetch_many([url])[url]
@@ -0,0 +1,343 @@
+# sketch.py
+"""
+Mergeable streaming sketches of listing prices, one set per (Status,
+Bedrooms, Building):
+
+    QuantileSketch   log-bucketed counts (DDSketch): any quantile within
+                     ``alpha`` relative error, e.g. a median of 1,000,000 is
+                     reported as 990,000-1,010,000 at alpha = 1%
+    HyperLogLog      2**p one-byte registers: distinct listings (by
+                     fingerprint.listing_keys) to within ~1.04 / sqrt(2**p)
+
+Both have a fixed size whatever they have seen, and merging two sketches
+gives exactly the sketch of both inputs. So sketches built by separate crawl
+shards, scrapes or days can be combined into medians, p90s and distinct
+counts over months of data without keeping any rows.
+
+Rent prices go in as yearly amounts (pipeline.yearly_price). A scrape
+builds its sketches while it streams: ``RowSketcher`` takes parsed card rows
+as they arrive (crawler.Scheduler keeps one per catalog target), and the
+merged set is stored with the snapshot it describes (``SNAPSHOT_TABLE``, see
+snapshot.SnapshotStore.save). ``SketchStore`` keeps one merged set per day
+beyond the few snapshots the snapshot store retains:
+
+    <root>/<name>/sketches/<YYYY-MM-DD>.parquet every scrape of that day, merged
+"""
+import logging
+import os
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from fingerprint import SeenCards, listing_keys
+from history import HISTORY_DIR, _day, _write
+from pipeline import ALL, yearly_price
+
+log = logging.getLogger(__name__)
+
+# relative accuracy of QuantileSketch quantiles
+ALPHA = 0.01
+# buckets kept per QuantileSketch; past this the lowest are folded together
+MAX_BINS = 2048
+# HyperLogLog registers: 2**12, ~1.6% standard error, 4 KiB per sketch
+HLL_P = 12
+QUANTILES = (0.5, 0.9)
+# span of the "listings seen" counts, in days
+SEEN_DAYS = 90
+DIMS = ["Status", "Bedrooms", "Building"]
+# parsed rows normalized together by RowSketcher: about ten results pages
+ROW_BATCH = 256
+# name of the sketch table stored with each snapshot
+SNAPSHOT_TABLE = "sketches"
+# set bits per byte value: a popcount that doesn't need numpy 2's bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype="uint8")
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    values = np.ascontiguousarray(values, dtype="uint64")
+    return _POPCOUNT[values.view("uint8")].reshape(values.shape + (8,)).sum(axis=-1, dtype="int64")
+
+class QuantileSketch:
+    """
+    Counts per logarithmic bucket ``ceil(log_gamma(x))``, gamma =
+    (1 + alpha) / (1 - alpha); values <= 0 are counted apart, NaN ignored.
+    """
+
+    def __init__(self, alpha: float = ALPHA, max_bins: int = MAX_BINS):
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self._log_gamma = np.log1p(2 * alpha / (1 - alpha))
+        self.offset = 0
+        self.bins = np.zeros(0, dtype="int64")
+        self.zero = 0
+
+    @property
+    def count(self) -> int:
+        return int(self.bins.sum()) + self.zero
+
+    def _index(self, values: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(values) / self._log_gamma).astype("int64")
+
+    def _add_bins(self, offset: int, bins: np.ndarray):
+        if not len(bins):
+            return
+        if not len(self.bins):
+            self.offset, self.bins = offset, bins.astype("int64", copy=True)
+        else:
+            lo = min(self.offset, offset)
+            hi = max(self.offset + len(self.bins), offset + len(bins))
+            merged = np.zeros(hi - lo, dtype="int64")
+            merged[self.offset - lo:self.offset - lo + len(self.bins)] += self.bins
+            merged[offset - lo:offset - lo + len(bins)] += bins
+            self.offset, self.bins = lo, merged
+        if len(self.bins) > self.max_bins:
+            # fold the lowest buckets into the first kept one: only low quantiles lose accuracy
+            cut = len(self.bins) - self.max_bins
+            self.bins[cut] += self.bins[:cut].sum()
+            self.offset, self.bins = self.offset + cut, self.bins[cut:].copy()
+
+    def add(self, values) -> "QuantileSketch":
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        positive = values[values > 0]
+        self.zero += len(values) - len(positive)
+        if len(positive):
+            idx = self._index(positive)
+            lo = int(idx.min())
+            self._add_bins(lo, np.bincount(idx - lo))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.alpha != self.alpha:
+            raise ValueError(f"cannot merge sketches with alpha {self.alpha} and {other.alpha}")
+        self.zero += other.zero
+        self._add_bins(other.offset, other.bins)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile ``q`` (NaN when empty)."""
+        total = self.count
+        if not total:
+            return float("nan")
+        rank = q * (total - 1)
+        if rank < self.zero:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.bins), rank - self.zero, side="right"))
+        # the bucket's midpoint in relative terms: within alpha of every value in it
+        gamma = np.exp(self._log_gamma)
+        return float(2 * gamma ** (self.offset + i) / (gamma + 1))
+
+    def state(self) -> dict:
+        """``offset``, ``zero`` and ``bins`` (little-endian int64 bytes): what ``from_state`` needs back."""
+        return {"offset": self.offset, "zero": self.zero, "bins": self.bins.astype("<i8").tobytes()}
+
+    @classmethod
+    def from_state(cls, offset: int, zero: int, bins: bytes, alpha: float = ALPHA) -> "QuantileSketch":
+        out = cls(alpha)
+        out._add_bins(int(offset), np.frombuffer(bins, dtype="<i8"))
+        out.zero = int(zero)
+        return out
+
+class HyperLogLog:
+    """Distinct count of 64-bit hashes in ``2**p`` registers (max rank per register)."""
+
+    def __init__(self, p: int = HLL_P):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype="uint8")
+
+    @staticmethod
+    def ranks(hashes: np.ndarray, p: int):
+        """(register, rank) of each hash: top ``p`` bits pick the register, rank = leading zeros + 1 of the rest."""
+        hashes = np.asarray(hashes, dtype="uint64")
+        register = (hashes >> np.uint64(64 - p)).astype("int64")
+        # a sentinel bit caps the rank at 64 - p + 1 when the remaining bits are all zero
+        rest = (hashes << np.uint64(p)) | np.uint64(1 << (p - 1))
+        # bit length = popcount after smearing the highest set bit down
+        for shift in (1, 2, 4, 8, 16, 32):
+            rest |= rest >> np.uint64(shift)
+        return register, (65 - _popcount(rest)).astype("uint8")
+
+    def add(self, hashes) -> "HyperLogLog":
+        register, rank = self.ranks(hashes, self.p)
+        np.maximum.at(self.registers, register, rank)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError(f"cannot merge HyperLogLogs with p {self.p} and {other.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype("int64")).sum()
+        empty = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and empty:
+            # few items: linear counting over the empty registers is more accurate
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+class SketchSet:
+    """
+    {(Status, Bedrooms, Building): (price QuantileSketch, listings HyperLogLog)}.
+    ``summary`` merges every sketch matching a selection ("All" matches any).
+    """
+
+    def __init__(self, alpha: float = ALPHA, p: int = HLL_P):
+        self.alpha = alpha
+        self.p = p
+        self.sketches = {}
+
+    def __len__(self) -> int:
+        return len(self.sketches)
+
+    def _get(self, key: tuple):
+        entry = self.sketches.get(key)
+        if entry is None:
+            entry = self.sketches[key] = (QuantileSketch(self.alpha), HyperLogLog(self.p))
+        return entry
+
+    def add(self, frame: pd.DataFrame) -> "SketchSet":
+        """Fold a batch of listing rows (SCHEMA columns; Building optional) into the set, rents yearly."""
+        if frame.empty:
+            return self
+        hashes = listing_keys(frame)
+        price = yearly_price(frame).to_numpy(dtype="float64", na_value=np.nan)
+        keys = pd.DataFrame({
+            "Status": frame["Status"].astype(str).to_numpy(),
+            "Bedrooms": frame["Bedrooms"].astype(str).to_numpy(),
+            "Building": frame["Building"].astype(str).to_numpy() if "Building" in frame.columns else "",
+        })
+        for key, rows in keys.groupby(DIMS, sort=False).indices.items():
+            prices, listings = self._get(key)
+            prices.add(price[rows])
+            listings.add(hashes[rows])
+        return self
+
+    def merge(self, other: "SketchSet") -> "SketchSet":
+        for key, (prices, listings) in other.sketches.items():
+            mine = self._get(key)
+            mine[0].merge(prices)
+            mine[1].merge(listings)
+        return self
+
+    def summary(self, status: str = ALL, bedrooms: str = ALL, building: str = ALL) -> dict:
+        """{"listings": distinct, "observed": prices seen, "p50": ..., "p90": ...} of the selection."""
+        prices, listings = QuantileSketch(self.alpha), HyperLogLog(self.p)
+        for (s, b, g), (q, h) in self.sketches.items():
+            if status in (ALL, s) and bedrooms in (ALL, b) and building in (ALL, g):
+                prices.merge(q)
+                listings.merge(h)
+        out = {"listings": listings.count(), "observed": prices.count}
+        out.update({f"p{round(q * 100)}": prices.quantile(q) for q in QUANTILES})
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per key; the sketch state as binary columns (see ``from_frame``)."""
+        rows = [
+            {"Status": s, "Bedrooms": b, "Building": g, "alpha": q.alpha, **q.state(), "p": h.p,
+             "registers": h.registers.tobytes()}
+            for (s, b, g), (q, h) in sorted(self.sketches.items())
+        ]
+        return pd.DataFrame(rows, columns=DIMS + ["alpha", "offset", "zero", "bins", "p", "registers"])
+
+    @classmethod
+    def from_frame(cls, table: pd.DataFrame, alpha: float = ALPHA, p: int = HLL_P) -> "SketchSet":
+        if len(table):
+            alpha, p = float(table["alpha"].iat[0]), int(table["p"].iat[0])
+        out = cls(alpha, p)
+        for row in table.itertuples(index=False):
+            prices, listings = out._get((row.Status, row.Bedrooms, row.Building))
+            prices.merge(QuantileSketch.from_state(row.offset, row.zero, row.bins, alpha))
+            listings.registers = np.frombuffer(row.registers, dtype="uint8").copy()
+        return out
+
+class RowSketcher:
+    """
+    A SketchSet fed one parsed card row at a time while a scrape streams.
+    Every ``batch`` rows are turned into a frame by ``to_frame`` (e.g.
+    crawler.target_frame for one target), cards already seen in this stream
+    are dropped (fingerprint.SeenCards) and the rest folded in. Untagged rents
+    are told monthly or yearly within their batch (pipeline.annual_factor).
+    """
+
+    def __init__(self, to_frame: Callable, batch: int = ROW_BATCH):
+        self.to_frame = to_frame
+        self.batch = batch
+        self.sketches = SketchSet()
+        self._rows = []
+        self._seen = SeenCards()
+
+    def add(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            rows, self._rows = self._rows, []
+            self.sketches.add(self._seen.fresh(self.to_frame(rows)))
+
+    def finish(self) -> SketchSet:
+        """Fold in the rows still buffered and return the set."""
+        self._flush()
+        return self.sketches
+
+class SketchStore:
+    """Per-``name`` latest and per-day sketch sets (see module docstring)."""
+
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+
+    def _path(self, name: str, part: str) -> str:
+        return os.path.join(self.root, name, "sketches", f"{part}.parquet")
+
+    def _read(self, path: str):
+        return SketchSet.from_frame(pd.read_parquet(path)) if os.path.exists(path) else None
+
+    def append(self, name: str, sketches: SketchSet, scraped: float = None) -> SketchSet:
+        """Merge one scrape's sketches into its day."""
+        ts = pd.Timestamp.now("UTC") if scraped is None else pd.Timestamp(scraped, unit="s", tz="UTC")
+        day_path = self._path(name, _day(ts))
+        day = self._read(day_path) or SketchSet()
+        _write(day.merge(sketches).to_frame(), day_path)
+        return sketches
+
+    def record(self, name: str, sketches: SketchSet, scraped: float = None):
+        """
+        ``append`` for refresh paths: a storage failure (unwritable or corrupt
+        sketch files) is logged, not raised. Anything else is a bug and raises.
+        """
+        try:
+            return self.append(name, sketches, scraped)
+        except (OSError, ValueError):
+            log.exception("could not update the %s price sketches", name)
+            return None
+
+    def days(self, name: str) -> list:
+        base = os.path.join(self.root, name, "sketches")
+        if not os.path.isdir(base):
+            return []
+        return sorted(f[:-8] for f in os.listdir(base) if f.endswith(".parquet") and f[0].isdigit())
+
+    def merged(self, name: str, since: str = None) -> SketchSet:
+        """Every day on or after ``since`` (YYYY-MM-DD) merged, one day file at a time."""
+        out = SketchSet()
+        for day in self.days(name):
+            if since is None or day >= since:
+                out.merge(self._read(self._path(name, day)))
+        return out
+
+    def recent(self, name: str, days: int = SEEN_DAYS) -> SketchSet:
+        """The last ``days`` days (today included) merged."""
+        return self.merged(name, _day(pd.Timestamp.now("UTC") - pd.Timedelta(days=days - 1)))
+
+def price_metrics(latest: SketchSet, recent: SketchSet = None) -> dict:
+    """Flat snapshot metrics: median / p90 price per status, plus distinct listings seen over ``recent``."""
+    out = {}
+    for status in ("Buy", "Rent"):
+        now = latest.summary(status)
+        out[f"{status}.p50"], out[f"{status}.p90"] = now["p50"], now["p90"]
+        if recent is not None:
+            out[f"{status}.listings_seen"] = recent.summary(status)["listings"]
+    return out
@@ -0,0 +1,377 @@
+# snapshot.py
+"""
+Immutable data snapshots and the background thread that refreshes them.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from types import MappingProxyType
+from typing import Callable, Mapping
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: every process scrapes for itself
+    fcntl = None
+
+from pipeline import Cube
+from tablequery import PositionCache
+
+log = logging.getLogger(__name__)
+
+# seconds between background re-scrapes
+REFRESH_INTERVAL = float(os.environ.get("BAYUT_REFRESH_SECONDS", 60 * 30))
+# on-disk snapshot store; anything younger than the TTL is served without scraping
+STORE_DIR = os.environ.get("BAYUT_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots"))
+STORE_TTL = float(os.environ.get("BAYUT_STORE_TTL", REFRESH_INTERVAL))
+# how often a process that isn't producing snapshots checks whether the producer is gone
+PRODUCER_POLL = float(os.environ.get("BAYUT_PRODUCER_POLL", 60))
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    One consistent view of the scraped listings plus everything derived from them.
+    Readers must treat ``frame`` as read-only; a refresh builds a new Snapshot.
+    """
+    frame: pd.DataFrame
+    metrics: Mapping = field(default_factory=dict)
+    version: int = 0
+    created: float = 0.0
+
+    def __post_init__(self):
+        object.__setattr__(self, "metrics", MappingProxyType(dict(self.metrics)))
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created if self.created else float("inf")
+
+    @cached_property
+    def cube(self) -> Cube:
+        """Status x Bedrooms x Agency aggregates, built once per snapshot."""
+        return Cube(self.frame)
+
+    @cached_property
+    def positions(self) -> PositionCache:
+        """Table row orders of ``frame`` (tablequery.query_page), per filter / sort."""
+        return PositionCache()
+
+    def warm(self) -> "Snapshot":
+        """Build the derived aggregates now, so no request pays for them."""
+        _ = self.cube
+        return self
+
+class SnapshotStore:
+    """
+    Versioned on-disk snapshots: ``<root>/<name>/v000042/{frame.parquet,meta.json}``
+    plus a ``LATEST`` pointer file. Side tables saved with a version (e.g. the
+    price sketches built while its rows streamed in) sit next to the frame as
+    ``<table>.parquet`` and are read on demand with ``load_table``.
+
+    Each version is written into a temp dir and renamed into place, then the
+    pointer is swapped with ``os.replace``, so readers in other processes only
+    ever see complete versions. Only columns are stored (the index is dropped),
+    and object columns holding mixed types are written as strings.
+
+    A ``mapped`` store also writes each frame as an uncompressed Arrow IPC
+    file (``frame.arrow``) and loads it through a read-only memory map, so
+    processes on one host share its pages instead of each holding a copy.
+    Null-free numbers are not copied. Strings stay in the mapping only when
+    pandas keeps them as Arrow strings (``string[pyarrow]``, the default
+    ``str`` dtype from pandas 3); otherwise they become Python objects.
+    Categorical codes and columns with nulls are copied. After the pointer it bumps ``GENERATION``,
+    an 8-byte counter every process maps, so checking for a newer version
+    costs one memory read.
+    """
+
+    def __init__(self, root: str = STORE_DIR, ttl: float = STORE_TTL, keep: int = 5, mapped: bool = False):
+        self.root = root
+        self.ttl = ttl
+        self.keep = keep
+        self.mapped = mapped
+        # name -> mapped GENERATION file
+        self._generations = {}
+        # name -> fd holding the producer lock
+        self._producing = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def latest_version(self, name: str):
+        try:
+            with open(os.path.join(self._dir(name), "LATEST")) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def created(self, name: str, version: int = None):
+        """Creation time of a stored snapshot (latest by default) without loading its frame."""
+        version = self.latest_version(name) if version is None else version
+        if version is None:
+            return None
+        try:
+            with open(os.path.join(self._dir(name), f"v{version:06d}", "meta.json")) as f:
+                return json.load(f)["created"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def frame_path(self, name: str, version: int) -> str:
+        return os.path.join(self._dir(name), f"v{version:06d}", "frame.parquet")
+
+    def load(self, name: str, version: int = None, exclude=()):
+        """
+        Return the stored Snapshot (latest by default), or None if there is none.
+        Columns named in ``exclude`` are not read (see ``frame_path`` to get them later).
+        """
+        version = self.latest_version(name) if version is None else version
+        if version is None:
+            return None
+        vdir = os.path.join(self._dir(name), f"v{version:06d}")
+        try:
+            with open(os.path.join(vdir, "meta.json")) as f:
+                meta = json.load(f)
+            arrow = os.path.join(vdir, "frame.arrow")
+            if self.mapped and os.path.exists(arrow):
+                frame = _read_mapped(arrow, exclude)
+            else:
+                path = os.path.join(vdir, "frame.parquet")
+                columns = [c for c in pq.read_schema(path).names if c not in exclude] if exclude else None
+                frame = pd.read_parquet(path, columns=columns)
+        except (OSError, ValueError, pa.ArrowException):
+            log.exception("could not read snapshot %s v%s", name, version)
+            return None
+        return Snapshot(frame, meta["metrics"], version=version, created=meta["created"])
+
+    def load_table(self, name: str, table: str, version: int = None):
+        """A side table saved with a snapshot (latest by default), or None if it has none."""
+        version = self.latest_version(name) if version is None else version
+        if version is None:
+            return None
+        path = os.path.join(self._dir(name), f"v{version:06d}", f"{table}.parquet")
+        try:
+            return pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, pa.ArrowException):
+            log.exception("could not read %s of snapshot %s v%s", table, name, version)
+            return None
+
+    def is_fresh(self, snap) -> bool:
+        return snap is not None and snap.age < self.ttl
+
+    def save(self, name: str, frame: pd.DataFrame, metrics: Mapping = None, created: float = None,
+             tables: Mapping = None) -> Snapshot:
+        """Store ``frame`` (and ``tables``, {name: DataFrame}) as the next version and make it the latest."""
+        ndir = self._dir(name)
+        os.makedirs(ndir, exist_ok=True)
+        created = time.time() if created is None else created
+        metrics = {k: _jsonable(v) for k, v in dict(metrics or {}).items()}
+
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=ndir)
+        try:
+            table = pa.Table.from_pandas(_storable(frame), preserve_index=False)
+            pq.write_table(table, os.path.join(tmp, "frame.parquet"))
+            if self.mapped:
+                with pa.OSFile(os.path.join(tmp, "frame.arrow"), "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            for table, data in dict(tables or {}).items():
+                data.to_parquet(os.path.join(tmp, f"{table}.parquet"), index=False)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"created": created, "metrics": metrics}, f)
+            version = (self.latest_version(name) or 0) + 1
+            while True:
+                try:
+                    os.rename(tmp, os.path.join(ndir, f"v{version:06d}"))
+                    break
+                except OSError:
+                    # another process took this number first
+                    version += 1
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        fd, ptr = tempfile.mkstemp(prefix=".tmp-", dir=ndir)
+        with os.fdopen(fd, "w") as f:
+            f.write(str(version))
+        os.replace(ptr, os.path.join(ndir, "LATEST"))
+        if self.mapped:
+            # serve the mapped copy too, so the producer shares the pages like everyone else
+            frame = _read_mapped(os.path.join(ndir, f"v{version:06d}", "frame.arrow"))
+            self._publish(name, version)
+        self._prune(name, version)
+        return Snapshot(frame, metrics, version=version, created=created)
+
+    def _generation_map(self, name: str) -> mmap.mmap:
+        with self._lock:
+            mm = self._generations.get(name)
+            if mm is None:
+                os.makedirs(self._dir(name), exist_ok=True)
+                fd = os.open(os.path.join(self._dir(name), "GENERATION"), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if os.fstat(fd).st_size < 8:
+                        os.ftruncate(fd, 8)
+                    mm = self._generations[name] = mmap.mmap(fd, 8)
+                finally:
+                    os.close(fd)
+            return mm
+
+    def generation(self, name: str) -> int:
+        """Latest published version of a mapped store, read without a syscall or lock."""
+        return struct.unpack_from("<Q", self._generation_map(name))[0]
+
+    def _publish(self, name: str, version: int):
+        mm = self._generation_map(name)
+        # versions only grow: never step back behind a process that saved after us
+        if version > struct.unpack_from("<Q", mm)[0]:
+            struct.pack_into("<Q", mm, 0, version)
+
+    def producer(self, name: str) -> bool:
+        """
+        Try to become the one process that scrapes ``name`` (an exclusive
+        ``flock``, held until the process exits). True if this process is it.
+        """
+        if fcntl is None:
+            return True
+        with self._lock:
+            if name in self._producing:
+                return True
+            os.makedirs(self._dir(name), exist_ok=True)
+            fd = os.open(os.path.join(self._dir(name), "PRODUCER"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            self._producing[name] = fd
+            return True
+
+    def _prune(self, name: str, latest: int):
+        ndir = self._dir(name)
+        for entry in os.listdir(ndir):
+            if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) <= latest - self.keep:
+                shutil.rmtree(os.path.join(ndir, entry), ignore_errors=True)
+
+def _read_mapped(path: str, exclude=()) -> pd.DataFrame:
+    # the table's buffers point into the mapping; to_pandas keeps null-free numbers
+    # and Arrow-backed strings there, and copies everything else
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if exclude:
+        table = table.select([c for c in table.column_names if c not in exclude])
+    return table.to_pandas(split_blocks=True)
+
+def _jsonable(v):
+    # numpy scalars -> plain Python so metrics round-trip through meta.json
+    return v.item() if hasattr(v, "item") else v
+
+def _storable(frame: pd.DataFrame) -> pd.DataFrame:
+    out = frame.reset_index(drop=True)
+    for col in out.columns:
+        if out[col].dtype == object and out[col].map(type).nunique() > 1:
+            out[col] = out[col].astype(str)
+    return out
+
+class Refresher:
+    """
+    Rebuilds a Snapshot every ``interval`` seconds on a daemon thread.
+
+    ``build`` returns ``(frame, metrics)``, or ``(frame, metrics, tables)``
+    with side tables for the store (SnapshotStore.save). The new snapshot replaces the old one
+    with a single reference assignment, so readers never see a half-built view
+    and never need a lock. A failed build keeps the last good snapshot.
+
+    With a ``store``, the last stored snapshot is served from the start and
+    each new one is persisted under ``name``; a stored snapshot that is still
+    fresh postpones the first scrape until it goes stale.
+
+    With ``shared`` (and a mapped store) the processes using the store elect
+    one producer: only the holder of ``store.producer(name)`` scrapes, and
+    every process picks up new versions in ``latest()`` by comparing the
+    store's generation counter with its own, without taking any lock.
+    """
+
+    def __init__(self, build: Callable, initial: Snapshot, interval: float = REFRESH_INTERVAL,
+                 store: SnapshotStore = None, name: str = None, shared: bool = False):
+        self._build = build
+        self.store = store
+        self.name = name
+        self.shared = shared and store is not None and store.mapped
+        self.snapshot = ((store and store.load(name)) or initial).warm()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._adopting = threading.Lock()
+
+    def latest(self) -> Snapshot:
+        """The current snapshot, first switching to a newer one another process published."""
+        snap = self.snapshot
+        if self.shared and self.store.generation(self.name) > snap.version:
+            # one request thread loads it; the others keep serving the old one meanwhile
+            if self._adopting.acquire(blocking=False):
+                try:
+                    self._adopt_stored(fresh_only=False)
+                finally:
+                    self._adopting.release()
+        return self.snapshot
+
+    def refresh(self) -> Snapshot:
+        frame, metrics, *tables = self._build()
+        if self.store is not None:
+            snap = self.store.save(self.name, frame, metrics, tables=tables[0] if tables else None)
+        else:
+            snap = Snapshot(frame, metrics, version=self.snapshot.version + 1, created=time.time())
+        # aggregate before publishing
+        self.snapshot = snap.warm()
+        return snap
+
+    def _adopt_stored(self, fresh_only: bool = True) -> bool:
+        """Pick up a (fresh) snapshot another process already stored, if any."""
+        if self.store is None or (self.store.latest_version(self.name) or 0) <= self.snapshot.version:
+            return False
+        snap = self.store.load(self.name)
+        if snap is None or (fresh_only and not self.store.is_fresh(snap)):
+            return False
+        self.snapshot = snap.warm()
+        return True
+
+    def _run(self):
+        ttl = self.store.ttl if self.store is not None else self.interval
+        wait = max(0.0, ttl - self.snapshot.age)
+        while not self._stop.wait(wait):
+            wait = self.interval
+            try:
+                if self._adopt_stored():
+                    continue
+                if self.shared:
+                    if not self.store.producer(self.name):
+                        # another process scrapes; take over only if it goes away
+                        wait = min(self.interval, PRODUCER_POLL)
+                        continue
+                    if self.snapshot.age < ttl:
+                        # just took over from a producer whose last snapshot is still good
+                        wait = ttl - self.snapshot.age
+                        continue
+                self.refresh()
+            except Exception:
+                log.exception("snapshot refresh failed; keeping version %s", self.snapshot.version)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
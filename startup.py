@@ -0,0 +1,265 @@
+# startup.py
+"""
+Cold-start profile of the two front-ends, fully offline.
+
+    python startup.py                          # both apps, 3 fresh processes each
+    python startup.py dash --runs 5            # one app
+    python startup.py --budget dash.import=1.2 # tighten / loosen a budget (seconds)
+    python startup.py --json out.json          # results also as JSON
+
+Each run starts a fresh interpreter (``python -X importtime``) against a
+throwaway store holding a cached snapshot, like a worker or session coming
+up after a deploy, and times:
+
+    dash.import              import dashapp (loads and maps the stored snapshot)
+    dash.warm                dashapp.warm(), which a preloading gunicorn master
+                             runs before forking (gunicorn.conf.py)
+    dash.worker_first_page   GET / in a process forked after the warm-up: a
+                             gunicorn worker's first page
+    dash.first_callback      the first dropdown callback, for a selection the
+                             warm-up did not draw
+    streamlit.import         import streamlit and run an empty script: the
+                             server's own start-up, paid once before any session
+    streamlit.first_run      the first run of app.py (its imports included)
+    streamlit.session        a new session once the app has run: what every
+                             later visitor waits for
+    streamlit.rerun          the next run, as a widget change would
+
+The report gives the median of every timing against its budget, the import
+time per top-level package (the self time of its modules, summed) and any
+module that should only be imported on demand (LAZY) but was loaded anyway.
+Exits 1 when a budget is exceeded or a lazy module was loaded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# seconds, on a single core. What a visitor waits for (a forked worker's first
+# page, a new session, a rerun) is held well under a second; the once-per-boot
+# costs (the master's import and warm-up, the server's first run) are budgeted
+# at what they measure plus headroom, so the check catches regressions
+BUDGETS = {
+    "dash.import": 1.8,
+    "dash.warm": 0.4,
+    "dash.worker_first_page": 0.15,
+    "dash.first_callback": 0.2,
+    "streamlit.import": 1.5,
+    "streamlit.first_run": 1.8,
+    "streamlit.session": 0.5,
+    "streamlit.rerun": 0.3,
+}
+# imported on demand only: parsing (bs4), notebook serving (jupyter_dash, and
+# the IPython stack dash loads for notebooks whenever it is installed), the
+# figure factories / renderers nothing at start-up needs and the fetch layer,
+# which only a scrape needs: serving the stored snapshot never touches it
+LAZY = {
+    "dash": ("bs4", "jupyter_dash", "plotly.express", "plotly.io._base_renderers",
+             "IPython", "prompt_toolkit", "jedi", "crawler", "scraper", "requests", "lxml"),
+    "streamlit": ("bs4", "dash", "jupyter_dash", "plotly.express", "IPython",
+                  "crawler", "scraper", "requests", "lxml"),
+}
+
+# -----------------------------
+# Offline data
+# -----------------------------
+def _synthetic_rows(cards: int) -> dict:
+    from bench import synthetic_pages
+    from scraper import parse_page
+    return {s: [r for p in synthetic_pages(s, cards) for r in parse_page(p, s)[0]] for s in ("Buy", "Rent")}
+
+def prepare(cards: int) -> dict:
+    """A throwaway store with both apps' snapshots saved; returns the environment to run in."""
+    env = dict(os.environ)
+    env.update({
+        "BAYUT_REFRESH": "0",
+        "BAYUT_STORE_DIR": tempfile.mkdtemp(prefix="startup-store-"),
+        "BAYUT_HISTORY_DIR": tempfile.mkdtemp(prefix="startup-history-"),
+    })
+    # the stores read their directories from the environment on import: save from a child
+    script = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "from startup import save_snapshots; save_snapshots(%d)\n" % (HERE, cards)
+    )
+    subprocess.run([sys.executable, "-c", script], env=env, cwd=HERE, check=True)
+    return env
+
+def save_snapshots(cards: int):
+    import dashapp
+    from crawler import DEFAULT_CATALOG, Target, combine, target_frame
+    from snapshot import SnapshotStore
+    rows = _synthetic_rows(cards)
+    where = ["Business Bay", "DAMAC Towers"]
+    gg = [[[r[f] for f in dashapp.FIELDS] + where for r in rows[s]] for s in ("Rent", "Buy")]
+    dashapp.REFRESHER.store.save("dashapp", *dashapp.snapshot_data(gg))
+    entry = DEFAULT_CATALOG[0]
+    frame = combine(target_frame(Target(entry["area"], entry["building"], s, entry["path"]), rows[s]) for s in rows)
+    SnapshotStore().save("listings", frame.sort_values("Status", kind="stable"))
+
+# -----------------------------
+# Probes (run in the fresh interpreter; print one JSON line)
+# -----------------------------
+DASH_PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+import dashapp
+out = {"dash.import": time.perf_counter() - t0}
+out["loaded"] = sorted(m for m in %(lazy)r if m in sys.modules)
+
+snap = dashapp.current()
+payload = {
+    "output": "graph4.figure",
+    "outputs": {"id": "graph4", "property": "figure"},
+    "inputs": [{"id": "my-id1", "property": "value", "value": dashapp.get_status(snap)[-1]},
+               {"id": "my-bd1", "property": "value", "value": dashapp.get_bed(snap)[-1]}],
+    "changedPropIds": ["my-id1.value"],
+    "state": [],
+}
+
+def timed(request):
+    t0 = time.perf_counter()
+    r = request()
+    if r.status_code != 200:
+        raise RuntimeError(f"status {r.status_code}")
+    return time.perf_counter() - t0
+
+# a preloaded worker: forked from a master that only warmed up (gunicorn.conf.py)
+t0 = time.perf_counter()
+dashapp.warm()
+out["dash.warm"] = time.perf_counter() - t0
+read, write = os.pipe()
+pid = os.fork()
+if not pid:
+    os.close(read)
+    seconds = timed(lambda: dashapp.server.test_client().get("/"))
+    os.write(write, json.dumps(seconds).encode())
+    os._exit(0)
+os.close(write)
+with os.fdopen(read) as f:
+    out["dash.worker_first_page"] = json.loads(f.read())
+os.waitpid(pid, 0)
+
+client = dashapp.server.test_client()
+out["dash.first_callback"] = timed(lambda: client.post("/_dash-update-component", json=payload))
+print(json.dumps(out))
+"""
+
+STREAMLIT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+AppTest.from_string("import streamlit").run()
+out = {"streamlit.import": time.perf_counter() - t0}
+
+def timed(at):
+    t0 = time.perf_counter()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return time.perf_counter() - t0
+
+at = AppTest.from_file(%(script)r, default_timeout=120)
+out["streamlit.first_run"] = timed(at)
+out["loaded"] = sorted(m for m in %(lazy)r if m in sys.modules)
+out["streamlit.rerun"] = timed(at)
+out["streamlit.session"] = timed(AppTest.from_file(%(script)r, default_timeout=120))
+print(json.dumps(out))
+"""
+
+PROBES = {"dash": DASH_PROBE, "streamlit": STREAMLIT_PROBE}
+
+def parse_importtime(stderr: str) -> dict:
+    """{top-level package: seconds} — the self time of every module, summed per package."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            # the header
+            continue
+        package = name.strip().split(".")[0]
+        out[package] = out.get(package, 0.0) + int(own) / 1e6
+    return out
+
+def probe(target: str, env: dict) -> dict:
+    code = PROBES[target] % {"lazy": LAZY[target], "script": os.path.join(HERE, "app.py")}
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, cwd=HERE,
+                       capture_output=True, text=True)
+    if r.returncode:
+        tail = "\n".join(l for l in r.stderr.splitlines() if not l.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"{target} probe failed:\n{tail}")
+    out = json.loads(r.stdout.strip().splitlines()[-1])
+    out["imports"] = parse_importtime(r.stderr)
+    return out
+
+def profile(target: str, env: dict, runs: int) -> dict:
+    results = [probe(target, env) for _ in range(runs)]
+    timings = {k: float(np.median([r[k] for r in results])) for k in BUDGETS if k.startswith(target + ".")}
+    packages = {p for r in results for p in r["imports"]}
+    imports = {p: float(np.median([r["imports"].get(p, 0.0) for r in results])) for p in packages}
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    return {"target": target, "runs": runs, "timings": timings, "imports": imports, "loaded": loaded}
+
+# -----------------------------
+# Report
+# -----------------------------
+def violations(result: dict, budgets: dict) -> list:
+    out = [f"{k} took {v:.3f}s, budget {budgets[k]:.3f}s" for k, v in result["timings"].items() if v > budgets[k]]
+    out += [f"{result['target']} imported {m} at start-up" for m in result["loaded"]]
+    return out
+
+def report(result: dict, budgets: dict, top: int):
+    print(f"{result['target']} (median of {result['runs']} runs)")
+    for k, v in result["timings"].items():
+        flag = "  OVER" if v > budgets[k] else ""
+        print(f"  {k:<26}{v * 1e3:>9.0f} ms   budget {budgets[k] * 1e3:>6.0f} ms{flag}")
+    print("  imports by package:")
+    for p, v in sorted(result["imports"].items(), key=lambda kv: -kv[1])[:top]:
+        print(f"    {p:<24}{v * 1e3:>9.0f} ms")
+    if result["loaded"]:
+        print(f"  loaded at start-up, expected on demand only: {', '.join(result['loaded'])}")
+
+def _budget(text: str):
+    key, _, seconds = text.partition("=")
+    if key not in BUDGETS:
+        raise argparse.ArgumentTypeError(f"unknown budget {key!r}; one of {', '.join(BUDGETS)}")
+    return key, float(seconds)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("targets", nargs="*", help=f"apps to profile: {', '.join(sorted(PROBES))} (default: both)")
+    ap.add_argument("--runs", type=int, default=3, help="fresh processes per app; timings are their median")
+    ap.add_argument("--cards", type=int, default=2400, help="synthetic listings per status in the cached snapshot")
+    ap.add_argument("--budget", type=_budget, action="append", default=[], metavar="KEY=SECONDS")
+    ap.add_argument("--top", type=int, default=10, help="packages listed in the import breakdown")
+    ap.add_argument("--json", help="also write the results here")
+    args = ap.parse_args(argv)
+
+    unknown = set(args.targets) - set(PROBES)
+    if unknown:
+        ap.error(f"unknown app {', '.join(sorted(unknown))}")
+    budgets = dict(BUDGETS, **dict(args.budget))
+    env = prepare(args.cards)
+    results, failed = [], []
+    for target in args.targets or sorted(PROBES):
+        result = profile(target, env, args.runs)
+        report(result, budgets, args.top)
+        results.append(result)
+        failed += violations(result, budgets)
+    for v in failed:
+        print(f"FAIL: {v}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"budgets": budgets, "results": results, "violations": failed}, f, indent=2)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
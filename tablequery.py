@@ -0,0 +1,149 @@
+# tablequery.py
+"""
+Server-side filter / sort / paging for the listings tables.
+
+Filters use Dash DataTable's ``filter_query`` syntax (``{Price} >= 500000 &&
+{Agency} contains Luxury``), so the same string drives the Dash table in
+custom mode and the Streamlit table's filter box. Each clause becomes one
+vectorized mask; only the requested page is ever turned into records.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+_CLAUSE = re.compile(
+    r"^\s*\{(?P<col>[^}]+)\}\s*(?P<case>[is])?"
+    r"(?:(?P<symbol>>=|<=|!=|<|>|=)\s*|(?P<word>ge|le|lt|gt|ne|eq|contains|datestartswith)\s+)(?P<value>.+?)\s*$"
+)
+_QUOTES = "'\"`"
+_SYMBOLS = {">=": "ge", "<=": "le", "<": "lt", ">": "gt", "!=": "ne", "=": "eq"}
+_COMPARE = {"ge": "__ge__", "le": "__le__", "lt": "__lt__", "gt": "__gt__", "eq": "__eq__", "ne": "__ne__"}
+
+def split_filter_part(part: str):
+    """``{col} op value`` -> (col, op, value text, case_insensitive) or None."""
+    m = _CLAUSE.match(part)
+    if not m:
+        return None
+    value = m.group("value")
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in _QUOTES:
+        value = value[1:-1].replace("\\" + value[0], value[0])
+    op = _SYMBOLS[m.group("symbol")] if m.group("symbol") else m.group("word")
+    return m.group("col"), op, value, m.group("case") == "i"
+
+def split_clauses(filter_query: str) -> list:
+    """``filter_query`` split on ``&&``, except inside a quoted value."""
+    query = filter_query or ""
+    parts, start, quote, i = [], 0, None, 0
+    while i < len(query):
+        c = query[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in _QUOTES and (i == 0 or query[i - 1].isspace() or query[i - 1] in "=<>"):
+            # a quote opens a value only where one starts, so "don't" stays plain text
+            quote = c
+        elif query.startswith("&&", i):
+            parts.append(query[start:i])
+            start = i + 2
+            i += 1
+        i += 1
+    parts.append(query[start:])
+    return parts
+
+def _float(text: str):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def filter_mask(df: pd.DataFrame, filter_query: str) -> np.ndarray:
+    """Boolean mask for a ``filter_query``; unknown columns or clauses are ignored."""
+    mask = np.ones(len(df), dtype=bool)
+    for part in split_clauses(filter_query):
+        parsed = split_filter_part(part)
+        if parsed is None or parsed[0] not in df.columns:
+            continue
+        col, op, text, insensitive = parsed
+        series = df[col]
+        number = _float(text)
+        if op in _COMPARE and number is not None and pd.api.types.is_numeric_dtype(series):
+            hit = getattr(series, _COMPARE[op])(number)
+        else:
+            s = series.astype("string")
+            if insensitive:
+                s, text = s.str.lower(), text.lower()
+            if op == "contains":
+                hit = s.str.contains(text, regex=False)
+            elif op == "datestartswith":
+                hit = s.str.startswith(text)
+            else:
+                hit = getattr(s, _COMPARE[op])(text)
+        mask &= hit.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+def _order(df: pd.DataFrame, sort_by) -> np.ndarray:
+    cols = [s["column_id"] for s in sort_by or [] if s.get("column_id") in df.columns]
+    if not cols:
+        return np.arange(len(df))
+    asc = [s.get("direction", "asc") == "asc" for s in sort_by if s.get("column_id") in df.columns]
+    ranked = df[cols].reset_index(drop=True).sort_values(cols, ascending=asc, na_position="last", kind="stable")
+    return ranked.index.to_numpy()
+
+class PositionCache:
+    """
+    Filtered / sorted row positions of one immutable frame, per (filter,
+    sort). Kept by whatever owns the frame (``Snapshot.positions``,
+    ``ListingStore.positions``), so a new frame always starts with an empty
+    cache and old entries go with the frame. Bounded; least recently used
+    entries are dropped first.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def positions(self, df: pd.DataFrame, sort_by, filter_query: str) -> np.ndarray:
+        key = (filter_query or "", tuple((s.get("column_id"), s.get("direction")) for s in sort_by or []))
+        with self._lock:
+            positions = self._entries.get(key)
+            if positions is not None:
+                self._entries.move_to_end(key)
+                return positions
+        positions = _positions(df, sort_by, filter_query)
+        with self._lock:
+            self._entries[key] = positions
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return positions
+
+def _positions(df, sort_by, filter_query) -> np.ndarray:
+    order = _order(df, sort_by)
+    mask = filter_mask(df, filter_query)
+    return order[mask[order]]
+
+def query_page(df: pd.DataFrame, page_current: int = 0, page_size: int = 20,
+               sort_by=None, filter_query: str = "", cache: PositionCache = None):
+    """
+    Filter, sort and slice ``df``; returns (page frame, matching row count).
+
+    ``cache`` must belong to ``df`` (see PositionCache); with it, the
+    filtered/sorted row order is computed once so paging is a plain slice.
+    """
+    if cache is None:
+        positions = _positions(df, sort_by, filter_query)
+    else:
+        positions = cache.positions(df, sort_by, filter_query)
+    start = max(0, page_current or 0) * page_size
+    return df.iloc[positions[start:start + page_size]], len(positions)
+
+def page_count(total: int, page_size: int) -> int:
+    return max(1, -(-total // page_size))
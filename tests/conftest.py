@@ -0,0 +1,104 @@
+# tests/conftest.py
+"""
+Shared fixtures: a local, threaded stand-in for the Bayut results pages.
+"""
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# module-level stores (dashapp's refresher, history) resolve their directories
+# on import: point them away from the checkout before anything is imported
+_TMP = tempfile.mkdtemp(prefix="bayut-tests-")
+for _var, _sub in (("BAYUT_STORE_DIR", "snapshots"), ("BAYUT_HISTORY_DIR", "history"), ("BAYUT_HTTP_CACHE_DIR", "httpcache")):
+    os.environ[_var] = os.path.join(_TMP, _sub)
+os.environ["BAYUT_REFRESH"] = "0"
+
+from bench import synthetic_page
+
+_PAGE = re.compile(r"/page-(\d+)/")
+
+class StubSite:
+    """
+    ``pages`` results pages of synthetic listings under any path ("for-sale"
+    in it -> Buy, otherwise Rent), each answered ``latency`` seconds after
+    it arrives; pages past the last are a 404. ``respond(handler, page)``
+    may answer a request itself by returning True. Every request is logged
+    in ``hits`` as (time.monotonic(), path).
+    """
+
+    def __init__(self, pages: int = 5, latency: float = 0.0):
+        self.pages = pages
+        self.latency = latency
+        self.respond = None
+        self.hits = []
+        self.base = None
+
+    def url(self, status: str = "Buy") -> str:
+        return f"{self.base}/{'for-sale' if status == 'Buy' else 'to-rent'}/property/stub/"
+
+    def page(self, path: str) -> int:
+        m = _PAGE.search(path)
+        return int(m.group(1)) if m else 1
+
+    def body(self, path: str) -> bytes:
+        return synthetic_page("Buy" if "for-sale" in path else "Rent", self.page(path))
+
+def _handler(site: StubSite):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status: int, body: bytes = b"", headers: dict = None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            site.hits.append((time.monotonic(), self.path))
+            if site.latency:
+                time.sleep(site.latency)
+            n = site.page(self.path)
+            if site.respond and site.respond(self, n):
+                return
+            if n > site.pages:
+                self.send(404)
+            else:
+                self.send(200, site.body(self.path), {"Content-Type": "text/html; charset=utf-8"})
+
+    return Handler
+
+class Clock:
+    """A time.monotonic() that only moves when a test sets ``now``."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr("scraper.time.monotonic", c)
+    return c
+
+@pytest.fixture
+def site():
+    stub = StubSite()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub.base = f"http://127.0.0.1:{server.server_address[1]}"
+    yield stub
+    server.shutdown()
+    server.server_close()
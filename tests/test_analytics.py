@@ -0,0 +1,67 @@
+# tests/test_analytics.py
+import numpy as np
+import pytest
+
+from analytics import AnalyticsEngine
+from pipeline import Cube, annual_factor, cube_metrics, price_metrics, rows_to_frame
+
+def listing(status: str, price: str, beds: str = "1", area: str = "1,000 sqft", title: str = "") -> dict:
+    return {"Status": status, "Price (raw)": price, "Location": "Business Bay", "Key Words": title or price,
+            "Bedrooms": beds, "Area (raw)": area, "Agency": "Agency 1"}
+
+def frame(*rows):
+    return rows_to_frame(list(rows))
+
+def test_annual_factor_follows_the_rent_period():
+    f = frame(
+        listing("Buy", "AED 1,000,000"),
+        listing("Rent", "AED 60,000 Yearly"),
+        listing("Rent", "AED 5,000 Monthly"),
+        listing("Rent", "AED 1,200 Weekly"),
+        listing("Rent", "AED 200 Daily"),
+    )
+    assert annual_factor(f).tolist() == [1, 1, 12, 52, 365]
+
+def test_annual_factor_reads_untagged_cheap_rents_as_monthly():
+    f = frame(*(listing("Rent", f"AED {p:,}", title=str(i)) for i, p in enumerate([60_000, 66_000, 70_000, 5_500])),
+              listing("Rent", "AED 6,000", beds="3"))
+    # below a sixth of its bedroom count's median; alone in its bedroom count it is taken as yearly
+    assert annual_factor(f).tolist() == [1, 1, 1, 12, 1]
+
+def test_metrics_average_yearly_rents():
+    f = frame(
+        listing("Buy", "AED 1,000,000", title="a"),
+        listing("Buy", "AED 1,000,000", title="b"),
+        listing("Rent", "AED 60,000 Yearly", title="c"),
+        listing("Rent", "AED 5,000 Monthly", title="d"),
+    )
+    expected = (1_000_000, 60_000, 0.06)
+    assert price_metrics(f[f["Status"] == "Buy"], f[f["Status"] == "Rent"]) == pytest.approx(expected)
+    assert cube_metrics(Cube(f)) == pytest.approx(expected)
+
+def test_headline_roi_agrees_with_the_yield_matrix():
+    f = frame(
+        listing("Buy", "AED 1,000,000", title="a"),
+        listing("Rent", "AED 5,000 Monthly", title="b"),
+    )
+    yields = AnalyticsEngine().update(f).yield_matrix()
+    assert yields.at["1", "1k-1.5k"] == pytest.approx(cube_metrics(Cube(f))[2], rel=0.01)
+
+def test_metrics_without_rents_or_sales():
+    f = frame(listing("Buy", "AED 1,000,000"))
+    abs_, ars, roi = price_metrics(f, f.iloc[:0])
+    assert abs_ == 1_000_000 and np.isnan(ars) and np.isnan(roi)
+    assert np.isnan(cube_metrics(Cube(f))[2])
+
+def test_engine_recomputes_only_changed_cells():
+    rows = [listing("Buy", f"AED {900_000 + i * 10_000:,}", beds=str(i % 3 + 1), title=str(i)) for i in range(30)]
+    rows += [listing("Rent", f"AED {50_000 + i * 1_000:,} Yearly", beds=str(i % 3 + 1), title=f"r{i}") for i in range(30)]
+    engine = AnalyticsEngine()
+    first = engine.update(frame(*rows), version=1)
+    assert first.recomputed == len(first.cells) == 6
+    assert engine.update(frame(*rows), version=1) is first
+
+    rows[-1] = listing("Rent", "AED 99,000 Yearly", beds="3", title="r29")
+    second = engine.update(frame(*rows), version=2)
+    assert second.recomputed == 1
+    assert second.cells.loc[("Rent", "3", "1k-1.5k"), "n"] == 10
@@ -0,0 +1,63 @@
+# tests/test_bench.py
+import json
+import time
+
+import pytest
+
+import bench
+from bench import CARDS_PER_PAGE, compare, measure, recorded_pages, synthetic_pages
+from scraper import parse_page
+
+def test_synthetic_pages_hold_the_asked_cards():
+    pages = synthetic_pages("Rent", 2 * CARDS_PER_PAGE + 5)
+    assert len(pages) == 3
+    rows = [r for p in pages for r in parse_page(p, "Rent")[0]]
+    assert len(rows) == 2 * CARDS_PER_PAGE + 5
+    assert len({r["Key Words"] for r in rows}) == len(rows)
+
+def test_recorded_pages_take_the_status_from_the_name(tmp_path):
+    for name in ("sale-1.html", "Rent-1.html", "notes.txt"):
+        (tmp_path / name).write_bytes(name.encode())
+    assert recorded_pages(str(tmp_path)) == {"Buy": [b"sale-1.html"], "Rent": [b"Rent-1.html"]}
+
+def test_measure_reports_the_best_run():
+    calls = []
+    r = measure(lambda: calls.append(bytearray(1 << 20)), items=10, repeat=3)
+    assert len(calls) == 4  # the runs plus one under tracemalloc
+    assert r["items"] == 10 and r["per_sec"] == pytest.approx(10 / r["seconds"])
+    assert r["peak_kb"] >= 1024
+
+def result(seconds: float, peak_kb: float = 100) -> dict:
+    return {"seconds": seconds, "items": 1, "per_sec": 1 / seconds, "peak_kb": peak_kb}
+
+def test_compare_flags_slower_or_hungrier_cases():
+    baseline = {"a": result(0.1), "b": result(0.1), "c": result(0.001), "d": result(0.1, 1000)}
+    results = {"a": result(0.2), "b": result(0.11), "c": result(0.002), "d": result(0.1, 2000), "new": result(9)}
+    regressions = compare(results, baseline, tolerance=1.25)
+    # "c" doubled but stays under the noise floor; "new" has no baseline
+    assert [line.split(":")[0] for line in regressions] == ["a", "d"]
+    assert "seconds" in regressions[0] and "peak_kb" in regressions[1]
+
+def test_main_writes_a_baseline_then_catches_a_regression(tmp_path, monkeypatch, capsys):
+    base = tmp_path / "baseline.json"
+    slow = [0.0]
+    monkeypatch.setattr(bench, "cases", lambda pages, label: [(f"sleep/{label}", lambda: time.sleep(slow[0]), 1)])
+    args = ["--cards", "24", "--repeat", "1", "--baseline", str(base)]
+    assert bench.main(args) == 0
+    assert set(json.loads(base.read_text())) == {"sleep/24"}
+    assert bench.main(args) == 0
+    slow[0] = 0.05
+    assert bench.main(args) == 1
+    assert "REGRESSION sleep/24: seconds" in capsys.readouterr().out
+    # --save accepts the new numbers
+    assert bench.main(args + ["--save"]) == 0
+    assert bench.main(args) == 0
+
+def test_every_case_runs():
+    pages = {s: synthetic_pages(s, CARDS_PER_PAGE) for s in ("Buy", "Rent")}
+    names = []
+    for name, fn, items in bench.cases(pages, "t"):
+        fn()
+        names.append(name)
+        assert items > 0
+    assert {"parse[lxml]/t", "frame/t", "cube/t", "sketch/t", "dash.fig_bed/t"} <= set(names)
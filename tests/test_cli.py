@@ -0,0 +1,85 @@
+# tests/test_cli.py
+import json
+
+import pandas as pd
+import pytest
+
+import cli
+from bench import CARDS_PER_PAGE, synthetic_page
+from pipeline import price_metrics, rows_to_frame
+from scraper import parse_page
+from sketch import SNAPSHOT_TABLE, SketchSet
+from snapshot import SnapshotStore
+
+@pytest.fixture
+def pages(tmp_path):
+    root = tmp_path / "pages"
+    (root / "rent").mkdir(parents=True)
+    for n in (1, 2):
+        (root / f"sale-{n}.html").write_bytes(synthetic_page("Buy", n))
+        (root / "rent" / f"rent-{n}.html").write_bytes(synthetic_page("Rent", n))
+    # page 1 saved twice: its cards are repeats
+    (root / "sale-1-again.html").write_bytes(synthetic_page("Buy", 1))
+    (root / "notes.txt").write_text("not a page")
+    return root
+
+def run(*argv) -> int:
+    return cli.main(["scrape", "--progress", "0", *map(str, argv)])
+
+def test_scrape_recorded_pages(pages, tmp_path):
+    out, metrics = tmp_path / "l.parquet", tmp_path / "m.json"
+    assert run("--html", pages, "--workers", 2, "--out", out, "--metrics", metrics) == 0
+    m = json.loads(metrics.read_text())
+    frame = pd.read_parquet(out)
+    assert (m["listings"], m["buy"], m["rent"]) == (len(frame), 2 * CARDS_PER_PAGE, 2 * CARDS_PER_PAGE)
+    assert m["duplicates"] == CARDS_PER_PAGE and m["pages"] == 5 and m["cards"] == 5 * CARDS_PER_PAGE
+    assert set(frame["Building"]) == {cli.DEFAULT_CATALOG[0]["building"]}
+
+    rows = {s: [r for n in (1, 2) for r in parse_page(synthetic_page(s, n), s)[0]] for s in ("Buy", "Rent")}
+    want = price_metrics(rows_to_frame(rows["Buy"]), rows_to_frame(rows["Rent"]))
+    assert (m["ABS"], m["ARS"], m["ROI"]) == pytest.approx(want)
+
+def test_scrape_writes_json_lines(pages, tmp_path, capsys):
+    out = tmp_path / "l.jsonl"
+    assert run("--html", pages / "rent", "--workers", 1, "--out", out) == 0
+    lines = out.read_text().splitlines()
+    assert len(lines) == 2 * CARDS_PER_PAGE and json.loads(lines[0])["Status"] == "Rent"
+    # metrics go to stdout as strict JSON: no Buy listings, so no ROI
+    m = json.loads(capsys.readouterr().out)
+    assert m["buy"] == 0 and m["ROI"] is None
+
+def test_scrape_urls(site, tmp_path):
+    site.pages = 2
+    metrics = tmp_path / "m.json"
+    assert run("--url", site.url("Buy"), "--url", site.url("Rent"), "--metrics", metrics) == 0
+    m = json.loads(metrics.read_text())
+    assert (m["buy"], m["rent"]) == (2 * CARDS_PER_PAGE, 2 * CARDS_PER_PAGE)
+    assert m["pages"] >= 4 and m["bytes"] > 0
+
+def test_scrape_can_record_a_snapshot(pages, tmp_path):
+    metrics = tmp_path / "m.json"
+    assert run("--html", pages, "--workers", 1, "--record", "cli-test", "--metrics", metrics) == 0
+    recorded = json.loads(metrics.read_text())["recorded"]
+    store = SnapshotStore()
+    snap = store.load("cli-test")
+    assert snap.version == recorded["version"] and len(snap.frame) == 4 * CARDS_PER_PAGE
+    sketches = SketchSet.from_frame(store.load_table("cli-test", SNAPSHOT_TABLE))
+    assert sketches.summary("Buy")["observed"] == 2 * CARDS_PER_PAGE
+
+def test_scrape_errors(pages, tmp_path, capsys):
+    assert run("--html", tmp_path / "missing") == 2
+    (tmp_path / "empty").mkdir()
+    assert run("--html", tmp_path / "empty") == 1
+    blank = tmp_path / "blank"
+    blank.mkdir()
+    (blank / "sale.html").write_bytes(b"<html><body></body></html>")
+    assert run("--html", blank, "--workers", 1) == 1
+    assert "not found" in capsys.readouterr().err
+
+def test_split(pages, tmp_path):
+    out = tmp_path / "cards"
+    assert cli.main(["split", str(pages / "sale-1.html"), str(pages / "rent"), "--out", str(out)]) == 0
+    cards = sorted(p.name for p in out.iterdir())
+    assert len(cards) == 3 * CARDS_PER_PAGE and cards[0] == "rent-1-001.html"
+    row = parse_page((out / "sale-1-001.html").read_bytes(), "Buy")[0]
+    assert row == parse_page(synthetic_page("Buy", 1), "Buy")[0][:1]
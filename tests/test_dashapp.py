@@ -0,0 +1,128 @@
+# tests/test_dashapp.py
+import copy
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from dash import Patch
+
+import dashapp
+from bench import synthetic_pages
+from figcache import FigureCache
+from scraper import parse_page
+from snapshot import Snapshot
+
+CHARTS_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "charts.js")
+
+@pytest.fixture(scope="module")
+def snapshot():
+    rows = {s: [r for p in synthetic_pages(s, 90) for r in parse_page(p, s)[0]] for s in ("Buy", "Rent")}
+    where = ["Business Bay", "DAMAC Towers"]
+    gg = [[[r[f] for f in dashapp.FIELDS] + where for r in rows[s]] for s in ("Rent", "Buy")]
+    return Snapshot(*dashapp.snapshot_data(gg), version=1).warm()
+
+@pytest.fixture
+def snap(snapshot, monkeypatch):
+    monkeypatch.setattr(dashapp.REFRESHER, "snapshot", snapshot)
+    monkeypatch.setattr(dashapp, "FIGURES", FigureCache())
+    return snapshot
+
+def selections(snap):
+    return [(st, bdd) for st in dashapp.get_status(snap) for bdd in dashapp.get_bed(snap)]
+
+def apply_patch(fig, patch):
+    fig = copy.deepcopy(fig)
+    for op in patch.to_plotly_json()["operations"]:
+        assert op["operation"] == "Assign"
+        *path, last = op["location"]
+        node = fig
+        for key in path:
+            node = node[key]
+        node[last] = op["params"]["value"]
+    return fig
+
+def test_patches_turn_the_first_figure_into_every_other(snap):
+    trend, ppsf = dashapp.cached_fig_trend("All", snap), dashapp.cached_fig_ppsf("Rent", "All", snap)
+    for st, bdd in selections(snap):
+        patch = dashapp.update_ppsf(st, bdd)
+        assert isinstance(patch, Patch)
+        assert apply_patch(ppsf, patch) == dashapp.cached_fig_ppsf(st, bdd, snap)
+        assert apply_patch(trend, dashapp.update_trend(bdd)) == dashapp.cached_fig_trend(bdd, snap)
+
+def test_patch_sets_only_the_changed_keys(snap):
+    ops = dashapp.update_ppsf("Buy", "1").to_plotly_json()["operations"]
+    # data.<i>.<key> for each trace, and the title
+    paths = {tuple(op["location"][2:] if op["location"][0] == "data" else op["location"]) for op in ops}
+    assert paths == {("x",), ("y",), ("visible",), ("layout", "title", "text")}
+    full = len(json.dumps(dashapp.cached_fig_ppsf("Buy", "1", snap)))
+    assert len(json.dumps(ops)) < full
+
+def run_charts_js(calls):
+    script = "global.window = {dash_clientside: {no_update: null}};\n" + open(CHARTS_JS).read() + (
+        "\nconst c = window.dash_clientside.charts;\n"
+        "const out = JSON.parse(require('fs').readFileSync(0, 'utf8')).map(([f, args]) => c[f](...args));\n"
+        "process.stdout.write(JSON.stringify(out));\n"
+    )
+    done = subprocess.run(["node", "-e", script], input=json.dumps(calls), capture_output=True, text=True, check=True)
+    return json.loads(done.stdout)
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node to run assets/charts.js")
+def test_clientside_charts_draw_what_the_server_would(snap):
+    charts = json.loads(json.dumps(dashapp.chart_changes(snap)))
+    graph1, graph2 = dashapp.cached_fig_abs_ars("Rent", snap), dashapp.cached_fig_bed("Rent", "All", snap)
+    calls, want = [], []
+    for st, bdd in selections(snap):
+        calls += [("graph1", [st, charts, graph1]), ("graph2", [st, bdd, charts, graph2])]
+        want += [dashapp.cached_fig_abs_ars(st, snap), dashapp.cached_fig_bed(st, bdd, snap)]
+    calls += [("graph1", [None, charts, graph1]), ("graph2", ["Buy", "1", None, graph2])]
+    got = run_charts_js(calls)
+    assert got[:-2] == json.loads(json.dumps(want))
+    # a cleared dropdown or a missing store leaves the figure alone
+    assert got[-2:] == [None, None]
+
+def components(node):
+    if isinstance(node, dict):
+        if "props" in node:
+            yield node
+        for value in node.values():
+            yield from components(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from components(value)
+
+def test_page_ships_the_charts_store(snap):
+    layout = dashapp.server.test_client().get("/_dash-layout").get_json()
+    store, = [c for c in components(layout) if c["props"].get("id") == "charts"]
+    assert store["props"]["data"] == json.loads(json.dumps(dashapp.chart_changes(snap)))
+    assert sorted(store["props"]["data"]["graph2"]) == sorted(f"{st}|{bdd}" for st, bdd in selections(snap))
+
+def test_callback_over_http(snap):
+    client = dashapp.server.test_client()
+    body = {
+        "output": "graph4.figure",
+        "outputs": {"id": "graph4", "property": "figure"},
+        "inputs": [{"id": "my-id1", "property": "value", "value": "Buy"},
+                   {"id": "my-bd1", "property": "value", "value": "2"}],
+        "changedPropIds": ["my-id1.value"],
+        "state": [],
+    }
+    r = client.post("/_dash-update-component", json=body)
+    assert r.status_code == 200
+    sent = r.get_json()["response"]["graph4"]["figure"]
+    assert "__dash_patch_update" in sent
+    assert len(r.data) < len(json.dumps(dashapp.cached_fig_ppsf("Buy", "2", snap)))
+
+def test_dropdown_lists():
+    assert dashapp.create_dropdown_list2(["2", "1"]) == [{"label": "1", "value": "1"}, {"label": "2", "value": "2"}]
+    assert dashapp.create_dropdown_list2([]) == []
+
+def test_figures_are_built_once_per_snapshot(snap):
+    fig = dashapp.cached_fig_bed("Buy", "All", snap)
+    assert dashapp.cached_fig_bed("Buy", "All", snap) is fig
+    assert fig == json.loads(json.dumps(dashapp.figure_json(dashapp.fig_bed("Buy", "All", snap))))
+    assert dashapp.FIGURES.stats()["hits"] == 1
+    newer = Snapshot(snap.frame, snap.metrics, version=snap.version + 1)
+    assert dashapp.cached_fig_bed("Buy", "All", newer) is not fig
+    assert dashapp.FIGURES.stats()["version"] == newer.version
@@ -0,0 +1,130 @@
+# tests/test_fetch.py
+import time
+
+import pytest
+import requests
+
+from bench import CARDS_PER_PAGE, synthetic_page
+from scraper import Fetcher, HostConcurrency, HostLimiter, ParseCache, make_session, parse_page
+
+def fetcher(concurrency: int = 8, **kw) -> Fetcher:
+    # no politeness budget and a window open at its ceiling: only the waves pace the fetch
+    kw.setdefault("retries", 0)
+    return Fetcher(make_session(concurrency, http_cache=None), concurrency=concurrency,
+                   limiter=HostLimiter(0), control=HostConcurrency(start=0), **kw)
+
+def page_numbers(pages: list) -> list:
+    return [int(p.split(b'"page":')[1].split(b"}")[0]) for p in pages]
+
+def collect(rows) -> dict:
+    out = {}
+    for u, row in rows:
+        out.setdefault(u, []).append(row)
+    return out
+
+def test_fetch_many_costs_a_round_trip_per_wave(site):
+    site.pages, site.latency = 12, 0.25
+    t0 = time.perf_counter()
+    pages = fetcher().fetch_many([site.url("Buy"), site.url("Rent")])
+    elapsed = time.perf_counter() - t0
+    assert {u: page_numbers(p) for u, p in pages.items()} == {
+        site.url("Buy"): list(range(1, 13)), site.url("Rent"): list(range(1, 13))}
+    # page 1, pages 2-5, then the rest plus the probe past the end: 3 waves,
+    # where one request after another would take 24 round trips. The bound
+    # leaves room for parsing on a slow, single-core runner
+    assert elapsed < 10 * site.latency
+
+def test_fetch_many_stops_at_the_404_past_the_end(site):
+    site.pages = 7
+    assert page_numbers(fetcher().fetch_pages(site.url())) == list(range(1, 8))
+
+@pytest.mark.parametrize("past", ["empty", "no listings", "page one", "redirect"])
+def test_fetch_many_detects_pages_past_the_end(site, past):
+    def respond(handler, n):
+        if n <= site.pages:
+            return False
+        if past == "empty":
+            handler.send(200)
+        elif past == "no listings":
+            handler.send(200, b"<html><body><div><p>No results</p></div></body></html>")
+        elif past == "page one":
+            handler.send(200, site.body(site.url()))
+        else:
+            handler.send(302, headers={"Location": site.url()})
+        return True
+
+    site.pages, site.respond = 4, respond
+    assert page_numbers(fetcher().fetch_pages(site.url())) == [1, 2, 3, 4]
+    # streamed, the cards of a repeated page in flight may come through before
+    # the repeat shows; the refresh paths dedupe them
+    rows = collect(fetcher().stream_rows({site.url(): "Buy"}))[site.url()]
+    assert len({r["Key Words"] for r in rows}) == 4 * CARDS_PER_PAGE
+    if past != "page one":
+        assert len(rows) == 4 * CARDS_PER_PAGE
+
+def test_stream_rows_yields_every_card(site):
+    site.pages = 6
+    rows = collect(fetcher().stream_rows({site.url("Buy"): "Buy", site.url("Rent"): "Rent"}))
+    assert len(rows[site.url("Buy")]) == len(rows[site.url("Rent")]) == 6 * CARDS_PER_PAGE
+    assert {r["Status"] for r in rows[site.url("Rent")]} == {"Rent"}
+
+def test_stream_rows_skips_a_failed_page(site):
+    site.pages = 5
+    site.respond = lambda handler, n: n == 3 and (handler.send(500) or True)
+    rows = collect(fetcher().stream_rows({site.url(): "Buy"}))
+    assert len(rows[site.url()]) == 4 * CARDS_PER_PAGE
+
+def test_stream_rows_raises_when_no_page_succeeds(site):
+    site.respond = lambda handler, n: handler.send(500) or True
+    with pytest.raises(requests.HTTPError):
+        collect(fetcher().stream_rows({site.url(): "Buy"}))
+
+def etagged(site, sent: list):
+    """Answer with an ETag per page and a 304 when the client sends it back."""
+    def respond(handler, n):
+        if n > site.pages:
+            return False
+        etag = f'"p{n}"'
+        sent.append(handler.headers.get("If-None-Match"))
+        if handler.headers.get("If-None-Match") == etag:
+            handler.send(304, headers={"ETag": etag})
+        else:
+            handler.send(200, site.body(handler.path), {"ETag": etag, "Content-Type": "text/html; charset=utf-8"})
+        return True
+    return respond
+
+def test_conditional_refetch_reuses_the_stored_bodies(site):
+    sent = []
+    site.pages, site.respond = 3, etagged(site, sent)
+    f = fetcher()
+    first = f.fetch_pages(site.url())
+    assert sent == [None] * 3 and f.not_modified == 0
+    sent.clear()
+    assert f.fetch_pages(site.url()) == first
+    # pages 2 and 3 go out together, in either order
+    assert sorted(sent) == ['"p1"', '"p2"', '"p3"'] and f.not_modified == 3
+    # streamed pages are revalidated the same way
+    rows = collect(f.stream_rows({site.url(): "Buy"}))[site.url()]
+    assert len(rows) == 3 * CARDS_PER_PAGE and f.not_modified == 6
+    # off, nothing is stored or sent back
+    sent.clear()
+    plain = fetcher(conditional=False)
+    plain.fetch_pages(site.url())
+    plain.fetch_pages(site.url())
+    assert sent == [None] * 6 and plain.not_modified == 0
+
+def test_parse_cache_skips_unchanged_pages_and_cards():
+    cache = ParseCache()
+    page = synthetic_page("Buy", 1)
+    rows, _ = parse_page(page, "Buy", cache)
+    # per-request noise doesn't make a page new
+    noisy = page.replace(b"</body>", b'<script nonce="abc">var t = 1;</script></body>')
+    assert parse_page(noisy, "Buy", cache)[0] == rows
+    assert cache.hits == {"page": 1, "card": 0} and cache.misses == {"page": 1, "card": CARDS_PER_PAGE}
+    # a changed page parses only its changed card
+    edited = page.replace(b"unit #0 |", b"unit #0 (reduced) |")
+    assert parse_page(edited, "Buy", cache)[0] == parse_page(edited, "Buy")[0]
+    assert cache.misses == {"page": 2, "card": CARDS_PER_PAGE + 1}
+    # the status label is part of the key
+    assert parse_page(page, "Rent", cache)[0][0]["Status"] == "Rent"
+    assert cache.misses["page"] == 3
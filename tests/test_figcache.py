@@ -0,0 +1,62 @@
+# tests/test_figcache.py
+import threading
+
+import plotly.graph_objects as go
+
+from figcache import FigureCache, figure_json
+
+class Builds:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, key):
+        def build():
+            self.calls.append(key)
+            return {"key": key}
+        return build
+
+def test_hits_and_misses():
+    cache, build = FigureCache(), Builds()
+    assert cache.get(1, "a", build("a")) == {"key": "a"}
+    assert cache.get(1, "a", build("a")) is cache.get(1, "a", build("a"))
+    assert build.calls == ["a"]
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 1, "version": 1}
+
+def test_a_new_version_drops_every_entry():
+    cache, build = FigureCache(), Builds()
+    for key in "ab":
+        cache.get(1, key, build(key))
+    cache.get(2, "a", build("a"))
+    assert build.calls == ["a", "b", "a"] and cache.stats()["size"] == 1
+
+def test_least_recently_used_goes_first():
+    cache, build = FigureCache(maxsize=2), Builds()
+    cache.get(1, "a", build("a"))
+    cache.get(1, "b", build("b"))
+    cache.get(1, "a", build("a"))
+    cache.get(1, "c", build("c"))
+    cache.get(1, "a", build("a"))
+    cache.get(1, "b", build("b"))
+    assert build.calls == ["a", "b", "c", "b"]
+
+def test_a_build_started_before_a_refresh_is_not_kept():
+    cache, started, release = FigureCache(), threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return {"old": True}
+
+    t = threading.Thread(target=cache.get, args=(1, "a", slow))
+    t.start()
+    started.wait(5)
+    cache.get(2, "b", lambda: {"new": True})
+    release.set()
+    t.join(5)
+    assert cache.get(2, "a", lambda: {"new": True}) == {"new": True}
+
+def test_figure_json_is_plain_json():
+    fig = go.Figure(go.Bar(x=["1", "2"], y=[3, 4]), layout={"title": {"text": "t"}})
+    out = figure_json(fig)
+    assert out["data"][0]["type"] == "bar" and out["data"][0]["y"] == [3, 4]
+    assert out["layout"]["title"]["text"] == "t"
@@ -0,0 +1,78 @@
+# tests/test_fingerprint.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from crawler import Target, combine, target_frame
+from fingerprint import ListingIndex, RunningPrices, change_counts, dedupe, fingerprints, listing_keys
+from pipeline import rows_to_frame
+
+def card(title: str, price: str = "AED 1,000,000", status: str = "Buy", **fields) -> dict:
+    row = {"Status": status, "Price (raw)": price, "Location": "Business Bay, Dubai", "Key Words": title,
+           "Bedrooms": "1", "Area (raw)": "1,000 sqft", "Agency": "Agency 1"}
+    row.update(fields)
+    return row
+
+def test_repeated_cards_share_a_fingerprint():
+    f = rows_to_frame([card("Canal view"), card("  CANAL   view "), card("Canal view", "AED 990,000"),
+                       card("Canal view", Location="Marina, Dubai")])
+    prints = fingerprints(f)
+    assert prints[0] == prints[1]
+    assert len(set(prints)) == 3
+    # a new price is the same listing
+    assert listing_keys(f)[0] == listing_keys(f)[2]
+    assert dedupe(f)["Key Words"].tolist() == ["Canal view", "Canal view", "Canal view"]
+
+def test_status_is_part_of_the_listing_key():
+    f = rows_to_frame([card("Canal view"), card("Canal view", status="Rent")])
+    assert fingerprints(f)[0] == fingerprints(f)[1]
+    assert listing_keys(f)[0] != listing_keys(f)[1]
+
+def test_combine_keeps_identical_cards_of_two_buildings():
+    a = Target("Business Bay", "Tower A", "Buy", "/a")
+    b = Target("Business Bay", "Tower B", "Buy", "/b")
+    rows = [card("Canal view"), card("Canal view")]
+    out = combine([target_frame(a, rows), target_frame(b, rows)])
+    assert len(out) == 2
+    assert sorted(out["Building"].astype(str)) == ["Tower A", "Tower B"]
+
+def test_running_prices_count_repeated_cards_once():
+    featured = card("Featured", "AED 5,000,000")
+    pages = [[featured, card("a"), card("b", "AED 2,000,000")],
+             [featured, card("c", "AED 3,000,000"), card("r", "AED 100,000", "Rent")],
+             [featured, card("a"), card("d", price="Price on request")]]
+    running = RunningPrices()
+    for page in pages:
+        running.add(rows_to_frame(page))
+    whole = dedupe(rows_to_frame([r for page in pages for r in page]))
+    buy = whole["Price"][whole["Status"] == "Buy"].dropna()
+    assert running.average("Buy") == (len(buy), pytest.approx(buy.mean()))
+    assert running.average("Buy") == (4, pytest.approx(2_750_000))
+    assert running.average("Rent") == (1, 100_000)
+    assert running.average("Nope") == (0, None)
+    assert len(running.seen) == len(whole) == 6
+
+@pytest.fixture
+def index(tmp_path):
+    return ListingIndex(str(tmp_path))
+
+def test_first_scrape_only_builds_the_index(index):
+    changes = index.update("x", rows_to_frame([card("a"), card("b")]), scraped=1000)
+    assert changes.empty
+    assert len(index.index("x")) == 2
+    assert change_counts(index.changes("x")) == {"new": 0, "removed": 0, "price": 0}
+
+def test_change_feed(index):
+    index.update("x", rows_to_frame([card("a"), card("b"), card("c")]), scraped=1000)
+    changes = index.update("x", rows_to_frame([card("a"), card("b", "AED 900,000"), card("d")]), scraped=2000)
+    assert change_counts(changes) == {"new": 1, "removed": 1, "price": 1}
+    by = changes.set_index("Change")
+    assert by.at["new", "Key Words"] == "d"
+    assert by.at["removed", "Key Words"] == "c" and np.isnan(by.at["removed", "Price"])
+    assert (by.at["price", "Old Price"], by.at["price", "Price"]) == (1_000_000, 900_000)
+    # a listing keeps the time it was first seen
+    seen = index.index("x").set_index("Key Words")["First Seen"]
+    assert seen["a"] == pd.Timestamp(1000, unit="s", tz="UTC")
+    assert seen["d"] == pd.Timestamp(2000, unit="s", tz="UTC")
+    assert change_counts(index.changes("x"))["new"] == 1
+    assert change_counts(None) == {}
@@ -0,0 +1,69 @@
+# tests/test_history.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from history import HistoryStore, aggregate
+from pipeline import rows_to_frame
+
+DAY = pd.Timestamp("2024-03-06 12:00", tz="UTC").timestamp()  # a Wednesday
+
+def scrape(seed: int, n: int = 60) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = [
+        {"Status": status, "Price (raw)": f"AED {int(rng.integers(lo, hi)):,}{period}", "Location": "Business Bay",
+         "Key Words": f"{seed}-{status}-{i}", "Bedrooms": str(i % 3 + 1), "Area (raw)": f"{int(rng.integers(600, 2000)):,} sqft",
+         "Agency": "Agency 1"}
+        for status, lo, hi, period in (("Buy", 800_000, 3_000_000, ""), ("Rent", 4_000, 12_000, " Monthly"))
+        for i in range(n)
+    ]
+    return rows_to_frame(rows)
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path))
+
+def test_append_folds_without_rereading_raw(store, monkeypatch):
+    def reread(*args):
+        raise AssertionError("append re-read the raw partitions")
+
+    monkeypatch.setattr(HistoryStore, "_raw", reread)
+    for i in range(3):
+        store.append("x", scrape(i), DAY + i * 86400)
+    daily = store.aggregates("x", "daily")
+    assert sorted(daily["period"].unique()) == ["2024-03-06", "2024-03-07", "2024-03-08"]
+    weekly = store.aggregates("x", "weekly")
+    assert weekly["period"].unique().tolist() == ["2024-03-04"]
+    assert weekly.set_index(["Status", "Bedrooms"]).at[("Buy", "All"), "listings"] == 180
+
+def test_appended_medians_match_a_rebuild(store):
+    for i in range(4):
+        store.append("x", scrape(i), DAY + i * 3600)
+    folded = store.aggregates("x", "daily")
+    store.rebuild("x")
+    rebuilt = store.aggregates("x", "daily")
+    pd.testing.assert_frame_equal(folded, rebuilt)
+
+    # and both are within the sketches' 1% of the exact medians (rents yearly)
+    raw = pd.concat([scrape(i) for i in range(4)], ignore_index=True)
+    rent = raw[raw["Status"] == "Rent"]
+    exact = (rent["Price"].astype("float64") * 12).quantile(0.5, interpolation="lower")
+    got = rebuilt.set_index(["Status", "Bedrooms"]).loc[("Rent", "All")]
+    assert got["median_price"] == pytest.approx(exact, rel=0.01)
+    assert got["listings"] == len(rent)
+
+def test_aggregate_rows():
+    agg = aggregate(scrape(0, n=3), "2024-03-06").set_index(["Status", "Bedrooms"])
+    assert agg.index.tolist() == [("Buy", "1"), ("Buy", "2"), ("Buy", "3"), ("Buy", "All"),
+                                  ("Rent", "1"), ("Rent", "2"), ("Rent", "3"), ("Rent", "All")]
+    assert agg["listings"].tolist() == [1, 1, 1, 3] * 2
+    assert aggregate(scrape(0).iloc[:0], "2024-03-06").empty
+
+def test_trend_yield_index(store):
+    store.append("x", scrape(0), DAY)
+    trend = store.trend("x", "daily")
+    assert len(trend) == 1
+    row = trend.iloc[0]
+    assert row["yield_index"] == pytest.approx(row["rent_price"] / row["buy_price"])
+    assert 0.01 < row["yield_index"] < 0.2
+    assert store.trend("x", "weekly", bedrooms="7").empty
@@ -0,0 +1,93 @@
+# tests/test_httpcache.py
+import time
+
+import pytest
+import requests
+
+import httpcache
+from httpcache import HttpCache, RecordReplayAdapter, mount
+from scraper import Fetcher, HostConcurrency, HostLimiter, make_session
+
+def session(mode: str, cache: HttpCache, latency=0) -> requests.Session:
+    return mount(requests.Session(), mode, cache, latency=latency)
+
+def fetcher(s: requests.Session) -> Fetcher:
+    return Fetcher(s, concurrency=4, limiter=HostLimiter(0), control=HostConcurrency(start=0), retries=0)
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path))
+
+def test_record_then_replay_without_the_network(site, cache):
+    site.pages = 3
+    live = fetcher(make_session(http_cache=None)).fetch_pages(site.url())
+    before = len(site.hits)
+    recorded = fetcher(session("record", cache)).fetch_pages(site.url())
+    assert recorded == live
+    # pages 1-3 and the 404s past the end
+    hits = len(site.hits)
+    assert len(cache) == hits - before > 3
+
+    replay = session("replay", cache)
+    assert fetcher(replay).fetch_pages(site.url()) == live
+    assert len(site.hits) == hits
+    adapter = replay.get_adapter(site.url())
+    assert adapter.hits == len(cache) and adapter.misses == 0
+
+def test_bodies_are_stored_once(site, cache, tmp_path):
+    s = session("record", cache)
+    for agent in ("a", "b"):
+        s.get(site.url(), headers={"User-Agent": agent})
+    assert len(cache) == 2
+    assert len(list((tmp_path / "objects").rglob("*.gz"))) == 1
+    # the headers in VARY pick the entry; conditional headers don't
+    assert HttpCache.key("GET", site.url(), {"User-Agent": "a"}) != HttpCache.key("GET", site.url(), {"User-Agent": "b"})
+    assert HttpCache.key("GET", "u", {"If-None-Match": '"x"'}) == HttpCache.key("GET", "u", {})
+
+def test_only_stable_statuses_are_recorded(site, cache):
+    site.respond = lambda handler, n: n == 2 and (handler.send(503) or True)
+    s = session("record", cache)
+    assert s.get(site.url()).status_code == 200
+    assert s.get(site.url() + "page-2/").status_code == 503
+    assert len(cache) == 1
+
+def test_replay_miss_is_a_404(cache):
+    r = session("replay", cache).get("http://example.invalid/for-sale/property/x/")
+    assert r.status_code == 404 and r.headers["X-Replay"] == "miss" and r.content == b""
+
+def test_replay_answers_validators_and_redirects(site, cache):
+    def respond(handler, n):
+        if n == 2:
+            handler.send(302, headers={"Location": site.url()})
+        else:
+            handler.send(200, site.body(handler.path), {"ETag": '"v1"', "Content-Type": "text/html; charset=utf-8"})
+        return True
+
+    site.respond = respond
+    rec = session("record", cache)
+    rec.get(site.url())
+    rec.get(site.url() + "page-2/", allow_redirects=False)
+
+    replay = session("replay", cache)
+    assert replay.get(site.url(), headers={"If-None-Match": '"v1"'}).status_code == 304
+    r = replay.get(site.url(), headers={"If-None-Match": '"v0"'})
+    assert r.status_code == 200 and r.headers["ETag"] == '"v1"' and r.encoding == "utf-8"
+    moved = replay.get(site.url() + "page-2/", allow_redirects=False)
+    assert moved.status_code == 302 and moved.headers["Location"] == site.url()
+
+def test_replay_latency(site, cache):
+    session("record", cache).get(site.url())
+    t0 = time.perf_counter()
+    r = session("replay", cache, latency=0.05).get(site.url())
+    assert r.ok and time.perf_counter() - t0 >= 0.05
+    recorded = cache.get(HttpCache.key("GET", site.url(), requests.Session().headers))[0]["latency"]
+    t0 = time.perf_counter()
+    session("replay", cache, latency="recorded").get(site.url())
+    assert time.perf_counter() - t0 >= recorded > 0
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        RecordReplayAdapter("live")
+    s = requests.Session()
+    assert mount(s, None) is s and not isinstance(s.get_adapter("http://x/"), RecordReplayAdapter)
+    assert httpcache.MODE is None
@@ -0,0 +1,83 @@
+# tests/test_instrument.py
+import math
+
+import pytest
+
+import instrument
+from bench import CARDS_PER_PAGE, synthetic_page
+from scraper import parse_page
+
+@pytest.fixture(autouse=True)
+def clean():
+    instrument.reset()
+    yield
+    instrument.reset()
+
+def lines(prefix: str) -> list:
+    return [line for line in instrument.render().splitlines() if line.startswith(prefix)]
+
+def test_counters_and_labels():
+    instrument.describe("t_total", "A test counter.")
+    instrument.inc("t_total", host="a")
+    instrument.inc("t_total", 2, host="a")
+    instrument.inc("t_total", name='say "hi"\n')
+    text = instrument.render()
+    assert "# HELP t_total A test counter.\n# TYPE t_total counter\n" in text
+    assert 't_total{host="a"} 3' in text
+    assert 't_total{name="say \\"hi\\"\\n"} 1' in text
+
+def test_histogram_buckets_are_cumulative():
+    for v in (0.0003, 0.003, 0.003, 100):
+        instrument.observe("t_seconds", v, stage="x")
+    buckets = lines('t_seconds_bucket{stage="x",le=')
+    assert len(buckets) == len(instrument.BUCKETS) + 1
+    assert buckets[0].endswith(" 1") and buckets[3] == 't_seconds_bucket{stage="x",le="0.005"} 3'
+    assert buckets[-2].endswith(" 3") and buckets[-1] == 't_seconds_bucket{stage="x",le="+Inf"} 4'
+    assert lines("t_seconds_count") == ['t_seconds_count{stage="x"} 4']
+    assert float(lines("t_seconds_sum")[0].split()[-1]) == pytest.approx(100.0063)
+
+def test_timers_and_gauges():
+    with instrument.timer("t_block_seconds"):
+        pass
+
+    @instrument.timed("t_fn_seconds", fn="f")
+    def f(x):
+        return x * 2
+
+    assert f(2) == 4 and f.__name__ == "f"
+    instrument.gauge("t_gauge", lambda: 7, name="ok")
+    instrument.gauge("t_gauge", lambda: 1 / 0, name="broken")
+    rows = {(r["metric"], r["labels"]): r for r in instrument.summary()}
+    assert rows[("t_block_seconds", "")]["count"] == 1
+    assert rows[("t_fn_seconds", '{fn="f"}')]["count"] == 1
+    assert rows[("t_gauge", '{name="ok"}')]["value"] == 7
+    assert math.isnan(rows[("t_gauge", '{name="broken"}')]["value"])
+    assert 't_gauge{name="broken"} NaN' in instrument.render()
+
+def test_disabled_records_nothing(monkeypatch):
+    monkeypatch.setattr(instrument, "ENABLED", False)
+    instrument.inc("t_off_total")
+    instrument.observe("t_off_seconds", 1.0)
+    with instrument.timer("t_off_seconds"):
+        pass
+
+    def g():
+        return 1
+
+    assert instrument.timed("t_off_seconds")(g) is g
+    assert not [r for r in instrument.summary() if r["metric"].startswith("t_off")]
+
+def test_parsing_counts_cards_per_strategy():
+    parse_page(synthetic_page("Buy", 1), "Buy", backend="lxml")
+    parsed = [r for r in instrument.summary() if r["metric"] == "bayut_cards_total" and 'outcome="parsed"' in r["labels"]]
+    assert [r["value"] for r in parsed] == [CARDS_PER_PAGE]
+    assert 'backend="lxml"' in parsed[0]["labels"] and "strategy=" in parsed[0]["labels"]
+    assert lines('bayut_parse_page_seconds_count{backend="lxml"}') == ['bayut_parse_page_seconds_count{backend="lxml"} 1']
+
+def test_dashapp_serves_the_metrics():
+    import dashapp
+    r = dashapp.server.test_client().get("/metrics")
+    assert r.status_code == 200 and r.mimetype == "text/plain"
+    text = r.get_data(as_text=True)
+    assert "# TYPE bayut_snapshot_version gauge" in text
+    assert 'bayut_snapshot_age_seconds{name="dashapp"}' in text
@@ -0,0 +1,70 @@
+# tests/test_listings.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from listings import ListingStore
+from pipeline import RAW_COLUMNS, rows_to_frame, yearly_price
+
+def card(i: int, status: str) -> dict:
+    return {"Status": status, "Price (raw)": f"AED {(i + 1) * 1000:,}", "Location": "Business Bay",
+            "Key Words": f"card {i}", "Bedrooms": str(i % 3), "Area (raw)": f"{500 + i} sqft",
+            "Agency": f"Agency {i % 2}"}
+
+@pytest.fixture
+def frame():
+    # interleaved, as a scrape of both statuses comes back
+    return rows_to_frame([card(i, "Rent" if i % 3 else "Buy") for i in range(30)])
+
+def test_views_are_contiguous_zero_copy_slices(frame):
+    store = ListingStore(frame)
+    assert store.statuses == ["Buy", "Rent"]
+    for status in ("Buy", "Rent"):
+        view = store.view(status)
+        assert (view["Status"] == status).all()
+        assert len(view) == (frame["Status"] == status).sum()
+        assert np.shares_memory(view["Price"].to_numpy(), store.core["Price"].to_numpy())
+    assert len(store.view()) == len(frame)
+    assert store.view("Nope").empty
+    # reordered by status, each status keeping its scrape order
+    rent = frame[frame["Status"] == "Rent"]["Key Words"].tolist()
+    assert store.view("Rent")["Key Words"].tolist() == rent
+    assert not set(RAW_COLUMNS) & set(store.core.columns)
+
+def test_raw_columns_follow_the_reordered_rows(frame):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return frame[RAW_COLUMNS]
+
+    store = ListingStore(frame.drop(columns=RAW_COLUMNS), raw_loader=load, key=("listings", 3))
+    before = store.memory_usage()
+    assert calls == [] and store.key == ("listings", 3)
+    raw = store.raw("Buy")
+    assert raw["Price (raw)"].tolist() == frame[frame["Status"] == "Buy"]["Price (raw)"].tolist()
+    store.raw("Rent")
+    assert calls == [1]
+    assert store.memory_usage() > before
+
+def test_rows_join_core_and_raw_columns(frame):
+    store = ListingStore(frame)
+    index = store.view("Rent").index[:3]
+    rows = store.rows(index, ["Key Words", "Price (raw)", "Price", "Missing"])
+    assert rows.columns.tolist() == ["Key Words", "Price (raw)", "Price"]
+    want = frame[frame["Status"] == "Rent"].head(3)
+    assert rows["Price (raw)"].tolist() == want["Price (raw)"].tolist()
+    assert rows["Price"].tolist() == want["Price"].tolist()
+
+def test_a_store_without_raw_text_or_rows():
+    store = ListingStore(rows_to_frame([card(0, "Buy")]).drop(columns=RAW_COLUMNS))
+    assert store.rows(store.view().index, ["Price", "Price (raw)"]).columns.tolist() == ["Price"]
+    empty = ListingStore(rows_to_frame([card(0, "Buy")]).iloc[:0])
+    assert empty.statuses == [] and empty.view().empty and empty.cube.get("All").count == 0
+
+def test_cube_is_built_once_from_the_store(frame):
+    store = ListingStore(frame)
+    assert store.cube is store.cube
+    assert store.cube.get("Buy").count == (frame["Status"] == "Buy").sum()
+    rent = frame[frame["Status"] == "Rent"]
+    assert store.cube.get("Rent").mean_price == pytest.approx(yearly_price(rent).mean())
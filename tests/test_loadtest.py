@@ -0,0 +1,54 @@
+# tests/test_loadtest.py
+import json
+import os
+import random
+import time
+
+import pytest
+
+import loadtest
+
+def test_run_round_summarizes_every_user():
+    def user(deadline, record, rng):
+        for i in range(10):
+            record(0.001 * (i + 1), ok=i != 9, size=2048)
+
+    r = loadtest.run_round(user, users=3, duration=0)
+    assert (r["users"], r["requests"], r["errors"]) == (3, 30, 3)
+    assert r["p50_ms"] == pytest.approx(5.5) and r["p99_ms"] == pytest.approx(10, rel=0.01)
+    assert r["kb_per_req"] == 2 and r["per_sec"] > 0 and r["rss_mb"] > 0
+
+def test_an_idle_round():
+    r = loadtest.run_round(lambda deadline, record, rng: None, users=2, duration=0)
+    assert r["requests"] == 0 and r["kb_per_req"] is None and r["cpu_ms_per_req"] is None
+
+def test_users_change_one_dropdown_at_a_time():
+    rng = random.Random(0)
+    for _ in range(100):
+        status, bed = loadtest._choices(rng, ["Buy", "Rent"], ["1", "2", "3"], "Buy", "1")
+        assert status == "Buy" or bed == "1"
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    # main() points the stores at fresh temp dirs; keep that out of the other tests
+    for var in ("BAYUT_REFRESH", "BAYUT_STORE_DIR", "BAYUT_HISTORY_DIR"):
+        monkeypatch.setenv(var, os.environ[var])
+    import dashapp
+    monkeypatch.setattr(dashapp.REFRESHER, "snapshot", dashapp.REFRESHER.snapshot)
+    return tmp_path
+
+def test_dash_round(offline, capsys):
+    out = offline / "dash.json"
+    assert loadtest.main(["dash", "--users", "1,2", "--duration", "1", "--cards", "48", "--json", str(out)]) == 0
+    rounds = json.loads(out.read_text())["rounds"]
+    assert [r["users"] for r in rounds] == [1, 2]
+    assert all(r["requests"] > 1 and r["errors"] == 0 and r["kb_per_req"] > 0 for r in rounds)
+    assert "p99 ms" in capsys.readouterr().out
+
+def test_streamlit_round(offline):
+    out = offline / "streamlit.json"
+    t0 = time.perf_counter()
+    assert loadtest.main(["streamlit", "--users", "1", "--duration", "0.2", "--cards", "48", "--json", str(out)]) == 0
+    r, = json.loads(out.read_text())["rounds"]
+    assert r["requests"] >= 1 and r["errors"] == 0
+    assert time.perf_counter() - t0 < 60
@@ -0,0 +1,70 @@
+# tests/test_parse.py
+import pytest
+
+from bench import synthetic_page, synthetic_pages
+from scraper import PARSERS, parse_page
+
+def page(cards: str) -> bytes:
+    return f"<html><body><ul>{cards}</ul></body></html>".encode()
+
+def card(body: str) -> str:
+    return f'<li><article><div class="d6e81fd0">{body}</div></article></li>'
+
+TITLE = '<h2 aria-label="Title">Fully furnished | Canal view</h2>'
+LOCATION = '<div aria-label="Location">Business Bay, Dubai</div>'
+AREA = '<span aria-label="Area"><span>1,250 sqft</span></span>'
+
+EDGE_CASES = {
+    "no price": page(card(TITLE + LOCATION + AREA)),
+    "no frequency": page(card('<span aria-label="Price"><span>AED</span> <span>95,000</span></span>' + TITLE)),
+    "frequency in the price": page(card('<span aria-label="Price">AED 95,000 Yearly</span>'
+                                        '<span aria-label="Frequency">Yearly</span>' + TITLE)),
+    "unlabelled price and area": page(card("<span>AED 1,200,000</span><p>980 sqft</p><h2>Sea view</h2>")),
+    "studio": page(card('<span aria-label="Beds">Studio</span>' + TITLE + AREA)),
+    "no beds": page(card(TITLE + AREA)),
+    "agency by alt": page(card(TITLE + '<img alt="Agency 3" src="a.png">')),
+    "nested text": page(card('<h2 aria-label="Title"> Fully <b>furnished</b>\n <i>unit</i> </h2>'
+                             "<script>var x = 1;</script>" + LOCATION)),
+    "title-parent cards": page("".join(f"<li><section><div><div>{TITLE}{AREA}</div></div></section></li>"
+                                       for _ in range(3))),
+    "fallback cards": page("<article><span>AED 50,000</span><h2>One</h2></article>"
+                           "<article><span>AED 60,000</span><h2>Two</h2></article>"),
+    "fallback divs": page("<div><span>AED 70,000</span><p>600 sqft</p></div>"),
+    "no cards": b"<html><body></body></html>",
+}
+
+@pytest.mark.parametrize("status", ["Buy", "Rent"])
+def test_backends_agree_on_the_bench_fixtures(status):
+    for content in synthetic_pages(status, 120) + [synthetic_page(status, 9, 3)]:
+        rows = {backend: parse_page(content, status, backend=backend) for backend in PARSERS}
+        assert rows["lxml"] == rows["soup"]
+        assert len(rows["lxml"][0]) == content.count(b'class="d6e81fd0"')
+
+@pytest.mark.parametrize("case", sorted(EDGE_CASES))
+def test_backends_agree_on_edge_cases(case):
+    rows = {backend: parse_page(EDGE_CASES[case], "Rent", backend=backend) for backend in PARSERS}
+    assert rows["lxml"] == rows["soup"]
+
+def test_edge_case_rows():
+    def row(case):
+        return parse_page(EDGE_CASES[case], "Rent", backend="lxml")[0][0]
+
+    assert row("no price")["Price (raw)"] == ""
+    assert row("no frequency")["Price (raw)"] == "AED 95,000"
+    assert row("frequency in the price")["Price (raw)"] == "AED 95,000 Yearly"
+    assert row("studio")["Bedrooms"] == "Studio"
+    assert row("no beds")["Bedrooms"] == "N/A"
+    assert row("agency by alt")["Agency"] == "Agency 3"
+    assert row("nested text")["Key Words"] == "Fully furnished unit"
+    assert row("unlabelled price and area")["Area (raw)"] == "980 sqft"
+    assert len(parse_page(EDGE_CASES["fallback cards"], "Buy", backend="lxml")[0]) == 2
+    assert parse_page(EDGE_CASES["no cards"], "Buy", backend="lxml") == ([], 0)
+
+def test_rent_fixtures_carry_their_period():
+    rows, _ = parse_page(synthetic_page("Rent", 1), "Rent")
+    assert {r["Price (raw)"].rsplit(" ", 1)[1] for r in rows} == {"Monthly", "Yearly"}
+    assert "Studio" in {r["Bedrooms"] for r in rows}
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        parse_page(synthetic_page("Buy", 1), "Buy", backend="regex")
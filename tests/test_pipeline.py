@@ -0,0 +1,95 @@
+# tests/test_pipeline.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import (
+    ALL, EMPTY_CELL, RAW_FIELDS, SCHEMA, Cube, cube_metrics, first_int, rent_period, rows_to_frame, to_number,
+    yearly_price,
+)
+
+def test_to_number():
+    raw = pd.Series(["AED 1,200,000", "1,234 sqft", "", None, "Ask", "95,000.50"])
+    got = to_number(raw)
+    assert got.dtype == "float64"
+    assert got.iloc[[0, 1, 5]].tolist() == [1_200_000, 1_234, 95_000.5]
+    assert got.iloc[[2, 3, 4]].isna().all()
+
+def test_first_int_and_rent_period():
+    assert first_int(pd.Series(["2 Beds", "Studio", None, "10+"])).tolist() == [2, pd.NA, pd.NA, 10]
+    periods = rent_period(pd.Series(["AED 95,000 Yearly", "AED 5,000 monthly", "AED 1,000 per week",
+                                     "AED 200 Daily", "AED 80,000", None]))
+    assert periods.iloc[:4].tolist() == ["Yearly", "Monthly", "Weekly", "Daily"]
+    assert periods.iloc[4:].isna().all()
+
+def test_rows_to_frame_builds_the_schema():
+    rows = [
+        {"Status": "Rent", "Price (raw)": "AED 5,000 Monthly", "Location": "Business Bay", "Key Words": "a",
+         "Bedrooms": "2", "Area (raw)": "1,100 sqft", "Agency": "Agency 1"},
+        {"Status": "Buy", "Price (raw)": "Price on request", "Location": "Business Bay", "Key Words": "b",
+         "Bedrooms": "Studio", "Area (raw)": None, "Agency": None},
+    ]
+    f = rows_to_frame(rows)
+    assert f.columns.tolist() == SCHEMA
+    assert f["Price"].tolist()[0] == 5_000 and np.isnan(f["Price"].iloc[1])
+    assert f["Period"].tolist()[0] == "Monthly" and pd.isna(f["Period"].iloc[1])
+    assert f["Area (sqft)"].dtype == "float32" and f["Area (sqft)"].iloc[0] == 1_100
+    assert f["Bedrooms (num)"].dtype == "Int8" and f["Bedrooms (num)"].tolist() == [2, pd.NA]
+    for col in ("Status", "Agency", "Bedrooms", "Location", "Period"):
+        assert isinstance(f[col].dtype, pd.CategoricalDtype), col
+    assert f["Key Words"].dtype == "string[pyarrow]"
+    # raw text is kept next to the parsed numbers
+    assert f["Price (raw)"].tolist() == ["AED 5,000 Monthly", "Price on request"]
+
+def test_rows_to_frame_keeps_the_schema_without_rows():
+    f = rows_to_frame([])
+    assert f.empty and f.columns.tolist() == SCHEMA
+    assert f["Price"].dtype == "float64"
+
+def test_bedroom_counts_out_of_range_are_missing():
+    rows = [dict(zip(RAW_FIELDS, ["Buy", "AED 1", "x", str(i), beds, "1 sqft", "a"])) for i, beds in enumerate(["3", "500"])]
+    assert rows_to_frame(rows)["Bedrooms (num)"].tolist() == [3, pd.NA]
+
+def card(status: str, price: str, beds: str, agency: str, area: str = "1,000 sqft", i: int = 0) -> dict:
+    return {"Status": status, "Price (raw)": price, "Location": "Business Bay", "Key Words": str(i),
+            "Bedrooms": beds, "Area (raw)": area, "Agency": agency}
+
+@pytest.fixture
+def listings():
+    rows = [card(s, f"AED {p:,}{' Yearly' if s == 'Rent' else ''}", b, a, f"{ar:,} sqft" if ar else None, i)
+            for i, (s, p, b, a, ar) in enumerate([
+                ("Buy", 1_000_000, "1", "Agency 1", 1_000), ("Buy", 2_000_000, "2", "Agency 1", 2_000),
+                ("Buy", 3_000_000, "2", "Agency 2", None), ("Rent", 80_000, "1", "Agency 2", 800),
+                ("Rent", 120_000, "2", "Agency 1", 1_200)])]
+    return rows_to_frame(rows)
+
+def test_cube_cells_match_a_groupby(listings):
+    cube = Cube(listings)
+    assert cube.statuses == ["Buy", "Rent"] and cube.bedrooms == ["1", "2"]
+    assert cube.agencies == ["Agency 1", "Agency 2"]
+    price = yearly_price(listings)
+    for (status, beds, agency), part in listings.groupby(["Status", "Bedrooms", "Agency"], observed=True):
+        cell = cube.get(status, beds, agency)
+        assert cell.count == len(part)
+        assert cell.mean_price == pytest.approx(price[part.index].mean())
+
+def test_cube_rolls_up_every_dimension(listings):
+    cube = Cube(listings)
+    assert cube.get().count == 5
+    assert cube.get("Buy") == cube.get("Buy", ALL, ALL)
+    assert cube.get("Buy").mean_price == pytest.approx(2_000_000)
+    # mean area over listings with an area; price per sqft over listings with both
+    assert cube.get("Buy").mean_area == pytest.approx(1_500)
+    assert cube.get("Buy").price_per_sqft == pytest.approx(3_000_000 / 3_000)
+    assert cube.get(ALL, "2").count == 3 and cube.get(agency="Agency 2").count == 2
+    assert cube.get("Rent", ALL, "Agency 1").mean_price == pytest.approx(120_000)
+    assert cube.counts_by_bedrooms("Buy") == [("1", 1), ("2", 2)]
+    assert cube.counts_by_bedrooms() == [("1", 2), ("2", 3)]
+    assert cube_metrics(cube) == pytest.approx((2_000_000, 100_000, 0.05))
+
+def test_cube_misses_are_empty_cells(listings):
+    cube = Cube(listings)
+    assert cube.get("Rent", "5") is EMPTY_CELL and cube.counts_by_bedrooms("Nope") == []
+    empty = Cube(listings.iloc[:0])
+    assert empty.get().count == 0 and empty.statuses == []
+    assert np.isnan(cube_metrics(empty)).all()
@@ -0,0 +1,83 @@
+# tests/test_ratelimit.py
+import threading
+import time
+
+import pytest
+
+from scraper import Fetcher, HostConcurrency, HostLimiter, TokenBucket, make_session
+
+# stamps are taken once a thread runs again after its wait; on a busy or
+# single-core runner that can be this much later than the limiter let it go
+JITTER = 0.025
+
+def gaps(stamps) -> list:
+    stamps = sorted(stamps)
+    return [b - a for a, b in zip(stamps, stamps[1:])]
+
+def test_bucket_spaces_callers_by_the_rate(clock):
+    bucket = TokenBucket(rate=4)
+    assert [bucket.reserve() for _ in range(4)] == pytest.approx([0.0, 0.25, 0.5, 0.75])
+
+def test_bucket_refills_no_more_than_its_burst(clock):
+    bucket = TokenBucket(rate=4)
+    bucket.reserve()
+    clock.now += 60
+    assert [bucket.reserve() for _ in range(3)] == pytest.approx([0.0, 0.25, 0.5])
+
+    bucket = TokenBucket(rate=4, burst=3)
+    clock.now += 60
+    assert [bucket.reserve() for _ in range(5)] == pytest.approx([0.0, 0.0, 0.0, 0.25, 0.5])
+
+def test_bucket_holds_its_rate_while_busy(clock):
+    bucket = TokenBucket(rate=10)
+    waits = []
+    for _ in range(20):
+        waits.append(bucket.reserve())
+        clock.now += 0.05
+    # callers arriving twice as fast as the rate queue up behind it
+    starts = [1000.0 + 0.05 * i + w for i, w in enumerate(waits)]
+    assert gaps(starts) == pytest.approx([0.1] * 19)
+
+def test_host_limiter_holds_the_rate_across_threads():
+    limiter, stamps = HostLimiter(rate=20), []
+
+    def worker():
+        for _ in range(3):
+            limiter.acquire("http://a.example/page-1/")
+            stamps.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(stamps) == 18
+    assert min(gaps(stamps)) > 1 / 20 - JITTER
+    assert stamps[-1] - stamps[0] == pytest.approx(17 / 20, abs=0.1)
+    assert max(stamps) - min(stamps) > 17 / 20 - JITTER
+
+def test_host_limiter_keeps_a_bucket_per_host(clock):
+    limiter = HostLimiter(rate=1)
+    limiter.acquire("http://a.example/x")
+    t0 = time.perf_counter()
+    limiter.acquire("http://b.example/x")
+    limiter.acquire("http://c.example/x")
+    assert time.perf_counter() - t0 < 0.1
+
+def test_host_limiter_rate_zero_is_unlimited():
+    limiter = HostLimiter(rate=0)
+    t0 = time.perf_counter()
+    for _ in range(100):
+        limiter.acquire("http://a.example/x")
+    assert time.perf_counter() - t0 < 0.1
+
+def test_fetcher_requests_keep_to_the_host_rate(site):
+    site.pages = 8
+    fetcher = Fetcher(make_session(8, http_cache=None), concurrency=8, limiter=HostLimiter(rate=10),
+                      control=HostConcurrency(start=0), retries=0)
+    fetcher.fetch_pages(site.url())
+    # eight requests in flight at once still go out a tenth of a second apart
+    stamps = [t for t, _ in site.hits]
+    assert len(stamps) > 8
+    assert min(gaps(stamps)) > 1 / 10 - JITTER
+    assert max(stamps) - min(stamps) > (len(stamps) - 1) / 10 - JITTER
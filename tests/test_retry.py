@@ -0,0 +1,141 @@
+# tests/test_retry.py
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+import scraper
+from scraper import (
+    BACKOFF, RETRY_AFTER_MAX, ConcurrencyWindow, Fetcher, HostConcurrency, HostLimiter,
+    backoff, make_session, retry_after,
+)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # the backoff the Fetcher asks for, without waiting it out
+    waits = []
+    monkeypatch.setattr(scraper.time, "sleep", waits.append)
+    return waits
+
+def fetcher(retries: int = 4, control: HostConcurrency = None) -> Fetcher:
+    return Fetcher(make_session(4, http_cache=None), concurrency=4, limiter=HostLimiter(0),
+                   control=control or HostConcurrency(start=0), retries=retries)
+
+def fail_first(site, count: int, status: int, headers: dict = None):
+    def respond(handler, n):
+        if len(site.hits) > count:
+            return False
+        handler.send(status, headers=headers)
+        return True
+    site.respond = respond
+
+def test_backoff_doubles_with_half_of_it_jitter():
+    for attempt in range(8):
+        delay = min(scraper.BACKOFF_MAX, BACKOFF * 2 ** attempt)
+        assert all(delay / 2 <= backoff(attempt) <= delay for _ in range(50))
+
+def test_retry_after_reads_seconds_and_dates():
+    assert retry_after("7") == 7.0
+    assert retry_after(" 120 ") == 120.0
+    assert retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=1.5)
+    assert retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+    assert retry_after("soon") is None
+    assert retry_after(None) is None
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttled_requests_back_off_exponentially(site, sleeps, status):
+    fail_first(site, 3, status)
+    assert fetcher().get(site.url()) == site.body(site.url())
+    assert len(site.hits) == 4
+    assert len(sleeps) == 3
+    for attempt, wait in enumerate(sleeps):
+        delay = BACKOFF * 2 ** attempt
+        assert delay / 2 <= wait <= delay
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttled_requests_wait_out_retry_after(site, sleeps, status):
+    fail_first(site, 2, status, {"Retry-After": "0"})
+    assert fetcher().get(site.url()) == site.body(site.url())
+    assert sleeps == [0.0, 0.0]
+
+def test_retry_after_pauses_the_whole_window(site, sleeps):
+    fail_first(site, 1, 503, {"Retry-After": "1"})
+    fetcher().get(site.url())
+    assert sleeps == [1.0]
+    # the retry is held back by the window's pause, not only by the sleep
+    assert site.hits[1][0] - site.hits[0][0] >= 0.9
+
+@pytest.mark.parametrize("headers", [{"Retry-After": str(int(RETRY_AFTER_MAX) + 1)}, None])
+def test_gives_up(site, sleeps, headers):
+    fail_first(site, 10, 503, headers)
+    with pytest.raises(requests.HTTPError):
+        fetcher(retries=2).get(site.url())
+    # too long a Retry-After fails at once; otherwise after every retry
+    assert len(site.hits) == (1 if headers else 3)
+
+def test_client_errors_are_not_retried(site, sleeps):
+    fail_first(site, 1, 403)
+    with pytest.raises(requests.HTTPError):
+        fetcher().get(site.url())
+    assert len(site.hits) == 1 and not sleeps
+
+def test_throttling_halves_the_host_window(site, sleeps):
+    control = HostConcurrency(start=0)
+    fail_first(site, 1, 429, {"Retry-After": "0"})
+    fetcher(control=control).get(site.url())
+    window = control.window(site.url(), 4)
+    assert window.limit == 2.0 and window.decreases == 1
+
+def respond_all(window: ConcurrencyWindow, latency: float, responses: int):
+    # a busy client: every slot is refilled as soon as its response is in
+    while window.in_flight < int(window.limit):
+        window.acquire()
+    for _ in range(responses):
+        window.release(latency)
+        while window.in_flight < int(window.limit):
+            window.acquire()
+
+def test_window_grows_about_one_per_window_of_fast_responses(clock):
+    window = ConcurrencyWindow(ceiling=8, start=2)
+    respond_all(window, 0.1, 2)
+    assert window.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    respond_all(window, 0.1, 3)
+    assert 3.5 < window.limit < 4.5
+    respond_all(window, 0.1, 100)
+    assert window.limit == 8
+
+def test_window_does_not_grow_on_slow_responses(clock):
+    window = ConcurrencyWindow(ceiling=8, start=2)
+    respond_all(window, 0.1, 1)
+    limit = window.limit
+    respond_all(window, 0.5, 20)
+    assert window.limit == limit
+
+def test_window_does_not_grow_when_not_full(clock):
+    window = ConcurrencyWindow(ceiling=8, start=4)
+    for _ in range(20):
+        window.acquire()
+        window.release(0.1)
+    assert window.limit == 4
+
+def test_window_halves_once_per_round_trip(clock):
+    window = ConcurrencyWindow(ceiling=16, start=16)
+    respond_all(window, 0.2, 1)
+    for _ in range(5):
+        window.release(throttled=True)
+    assert window.limit == 8 and window.decreases == 1
+    clock.now += 0.25
+    window.release(throttled=True)
+    assert window.limit == 4
+    for _ in range(5):
+        clock.now += 1
+        window.release(throttled=True)
+    assert window.limit == 1
+
+def test_window_pause_holds_new_requests():
+    window = ConcurrencyWindow(ceiling=4, start=4)
+    window.pause(0.3)
+    t0 = time.monotonic()
+    window.acquire()
+    assert time.monotonic() - t0 >= 0.25
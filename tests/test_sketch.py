@@ -0,0 +1,138 @@
+# tests/test_sketch.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import synthetic_page
+from crawler import Scheduler, Target, combine
+from fingerprint import dedupe, listing_keys
+from pipeline import rows_to_frame, yearly_price
+from scraper import parse_page
+from sketch import ALPHA, SNAPSHOT_TABLE, HyperLogLog, QuantileSketch, RowSketcher, SketchSet, SketchStore
+from snapshot import SnapshotStore
+
+def test_quantiles_are_within_alpha():
+    values = np.random.default_rng(0).lognormal(13.5, 0.6, 50_000)
+    sketch = QuantileSketch().add(values)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q, method="lower"), rel=ALPHA)
+    assert sketch.count == len(values)
+
+def test_quantile_edge_cases():
+    assert np.isnan(QuantileSketch().quantile(0.5))
+    sketch = QuantileSketch().add([0, -5, np.nan, 100])
+    assert sketch.count == 3 and sketch.zero == 2
+    assert sketch.quantile(0.0) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(100, rel=ALPHA)
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+def test_merged_quantile_sketches_equal_one_over_both():
+    a, b = np.random.default_rng(1).lognormal(11, 1.0, (2, 10_000))
+    merged = QuantileSketch().add(a).merge(QuantileSketch().add(b))
+    whole = QuantileSketch().add(np.concatenate([a, b]))
+    assert (merged.offset, merged.zero) == (whole.offset, whole.zero)
+    assert merged.bins.tolist() == whole.bins.tolist()
+
+def test_quantile_sketch_folds_its_lowest_buckets():
+    values = np.geomspace(1, 1e12, 5_000)
+    sketch = QuantileSketch(max_bins=256).add(values)
+    assert len(sketch.bins) == 256
+    # the high quantiles keep their accuracy
+    assert sketch.quantile(0.99) == pytest.approx(np.quantile(values, 0.99, method="lower"), rel=ALPHA)
+    restored = QuantileSketch.from_state(**sketch.state())
+    assert restored.quantile(0.5) == sketch.quantile(0.5)
+
+def hashes(lo: int, hi: int) -> np.ndarray:
+    return pd.util.hash_array(np.arange(lo, hi, dtype="int64"))
+
+@pytest.mark.parametrize("n", [10, 1_000, 200_000])
+def test_hyperloglog_counts_within_its_error(n):
+    hll = HyperLogLog().add(hashes(0, n))
+    # ~1.6% standard error at p = 12; allow three of them
+    assert hll.count() == pytest.approx(n, rel=0.05, abs=1)
+
+def test_merged_hyperloglogs_count_the_union():
+    a, b = HyperLogLog().add(hashes(0, 60_000)), HyperLogLog().add(hashes(40_000, 100_000))
+    union = HyperLogLog().add(hashes(0, 100_000))
+    assert a.merge(b).registers.tolist() == union.registers.tolist()
+    assert a.count() == pytest.approx(100_000, rel=0.05)
+    # repeats don't count twice
+    assert HyperLogLog().add(np.concatenate([hashes(0, 500)] * 3)).count() == pytest.approx(500, rel=0.05)
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+def rows(status: str, pages=(1,)) -> list:
+    return [r for p in pages for r in parse_page(synthetic_page(status, p), status)[0]]
+
+def test_sketch_set_selects_merges_and_round_trips():
+    frame = rows_to_frame(rows("Buy") + rows("Rent"))
+    frame["Building"] = "Tower A"
+    sketches = SketchSet().add(frame)
+    buy = sketches.summary("Buy")
+    assert buy["observed"] == int(frame["Price"][frame["Status"] == "Buy"].notna().sum())
+    assert buy["listings"] == pytest.approx(len(set(listing_keys(frame[frame["Status"] == "Buy"]))), abs=1)
+    assert sketches.summary(building="Tower B")["observed"] == 0
+
+    restored = SketchSet.from_frame(sketches.to_frame())
+    assert restored.summary("Rent", "1") == sketches.summary("Rent", "1")
+    assert SketchSet().merge(sketches).merge(sketches).summary()["listings"] == sketches.summary()["listings"]
+
+def test_rents_go_in_yearly():
+    frame = rows_to_frame([{"Status": "Rent", "Price (raw)": f"AED {p:,} Monthly", "Location": "Business Bay",
+                            "Key Words": str(p), "Bedrooms": "1", "Area (raw)": "900 sqft", "Agency": "Agency 1"}
+                           for p in (5_000, 6_000, 7_000)])
+    assert SketchSet().add(frame).summary("Rent")["p50"] == pytest.approx(72_000, rel=ALPHA)
+
+def test_row_sketcher_drops_repeated_cards_across_batches():
+    target = Target("Business Bay", "Tower A", "Rent", "a")
+    streamed = rows("Rent", (1, 2, 1))  # page 1 served twice
+    sketcher = RowSketcher(lambda batch: rows_to_frame(batch).assign(Building=target.building), batch=7)
+    for row in streamed:
+        sketcher.add(row)
+    got = sketcher.finish().summary("Rent")
+    want = dedupe(rows_to_frame(streamed))
+    assert got["observed"] == int(want["Price"].notna().sum())
+    assert got["p50"] == pytest.approx(yearly_price(want).quantile(0.5, interpolation="lower"), rel=ALPHA)
+
+class Pages:
+    """A Fetcher stand-in streaming the bench pages of each URL's status."""
+
+    def __init__(self, pages=(1, 2)):
+        self.pages = pages
+
+    def stream_rows(self, urls: dict, cache=None):
+        for url, status in urls.items():
+            for row in rows(status, self.pages):
+                yield url, row
+
+def test_scheduler_sketches_what_it_streams(tmp_path):
+    targets = [Target("Business Bay", b, s, b.lower().replace(" ", "-")) for b in ("Tower A", "Tower B")
+               for s in ("Buy", "Rent")]
+    scheduler = Scheduler(targets, fetcher=Pages())
+    assert sum(1 for _ in scheduler.stream()) == 4 * len(rows("Buy", (1, 2)))
+    sketches = scheduler.sketches()
+    frame = scheduler.frame()
+    assert set(scheduler.target_sketches) == set(targets)
+    assert sketches.summary("Rent")["observed"] == int(frame["Price"][frame["Status"] == "Rent"].notna().sum())
+    assert sketches.summary(building="Tower B")["observed"] == sketches.summary(building="Tower A")["observed"] > 0
+
+    # stored with the snapshot, read back on its own
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    snap = store.save("x", frame, tables={SNAPSHOT_TABLE: sketches.to_frame()})
+    loaded = SketchSet.from_frame(store.load_table("x", SNAPSHOT_TABLE, snap.version))
+    assert loaded.summary("Buy") == sketches.summary("Buy")
+    assert store.load_table("x", "missing") is None
+    assert store.load_table("y", SNAPSHOT_TABLE) is None
+
+def test_sketch_store_merges_days(tmp_path):
+    store = SketchStore(str(tmp_path))
+    day = pd.Timestamp("2024-03-06 12:00", tz="UTC").timestamp()
+    a = SketchSet().add(combine([rows_to_frame(rows("Buy"))]))
+    b = SketchSet().add(combine([rows_to_frame(rows("Buy", (2,)))]))
+    store.append("x", a, day)
+    store.append("x", b, day + 3600)
+    store.append("x", b, day + 86400)
+    assert store.days("x") == ["2024-03-06", "2024-03-07"]
+    assert store.merged("x").summary("Buy")["observed"] == a.summary("Buy")["observed"] + 2 * b.summary("Buy")["observed"]
+    assert store.merged("x", since="2024-03-07").summary("Buy")["observed"] == b.summary("Buy")["observed"]
@@ -0,0 +1,177 @@
+# tests/test_snapshot.py
+import multiprocessing
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from snapshot import Refresher, Snapshot, SnapshotStore, fcntl
+
+def frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Status": ["Buy", "Rent"] * n,
+        "Price": [1_000_000.0, 100_000.0] * n,
+        "Bedrooms": ["1"] * (2 * n),
+        "Agency": ["Agency 1"] * (2 * n),
+        "Area (sqft)": [1_000.0] * (2 * n),
+    })
+
+class Builds:
+    """A build function returning frame(1), frame(2), ... and failing while ``fail`` is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.done = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.done.set()
+        if self.fail:
+            raise RuntimeError("scrape failed")
+        return frame(self.calls), {"n": self.calls}
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path), ttl=60)
+
+def test_refresh_swaps_in_a_new_snapshot():
+    build = Builds()
+    refresher = Refresher(build, Snapshot(frame(0)), interval=60)
+    old = refresher.latest()
+    new = refresher.refresh()
+    assert refresher.latest() is new and new.version == old.version + 1
+    assert new.metrics["n"] == 1 and new.created > 0
+    # a reader holding the old snapshot still sees all of it
+    assert len(old.frame) == 0 and old.cube.get("Buy").count == 0
+    assert new.cube.get("Buy").count == 1
+
+def test_a_failed_build_keeps_the_last_snapshot():
+    build = Builds()
+    refresher = Refresher(build, Snapshot(frame(0)), interval=0.01)
+    good = refresher.refresh()
+    build.fail, build.done = True, threading.Event()
+    refresher.start()
+    try:
+        assert build.done.wait(5)
+        time.sleep(0.05)
+    finally:
+        refresher.stop()
+    assert build.calls > 2
+    assert refresher.latest() is good
+    with pytest.raises(RuntimeError):
+        refresher.refresh()
+    assert refresher.latest() is good
+
+def test_refresher_serves_the_stored_snapshot_first(store):
+    store.save("x", frame(3), {"n": 3})
+    build = Builds()
+    refresher = Refresher(build, Snapshot(frame(0)), store=store, name="x")
+    assert refresher.latest().metrics["n"] == 3 and build.calls == 0
+    snap = refresher.refresh()
+    assert store.latest_version("x") == snap.version == 2
+    assert store.load("x").metrics["n"] == 1
+
+def test_refresher_adopts_a_fresh_snapshot_another_process_stored(store):
+    refresher = Refresher(Builds(), Snapshot(frame(0)), store=store, name="x")
+    assert not refresher._adopt_stored()
+    store.save("x", frame(2), {"n": 2})
+    assert refresher._adopt_stored()
+    assert refresher.latest().metrics["n"] == 2
+    # a stale one is left for the refresher to replace
+    store.save("x", frame(4), {"n": 4}, created=time.time() - 120)
+    assert not refresher._adopt_stored()
+    assert refresher._adopt_stored(fresh_only=False) and refresher.latest().metrics["n"] == 4
+
+def test_store_round_trip(store):
+    assert store.load("x") is None and store.latest_version("x") is None and store.created("x") is None
+    data = frame(2).assign(Mixed=[1, "a", None, 2.5])
+    saved = store.save("x", data, {"n": data["Price"].sum()}, created=1234.0)
+    loaded = store.load("x")
+    assert (saved.version, loaded.version, store.latest_version("x")) == (1, 1, 1)
+    assert loaded.metrics == {"n": 2_200_000.0} and loaded.created == store.created("x") == 1234.0
+    pd.testing.assert_frame_equal(loaded.frame.drop(columns="Mixed"), data.drop(columns="Mixed"))
+    # mixed object columns are stored as text
+    mixed = loaded.frame["Mixed"]
+    assert mixed.iloc[[0, 1, 3]].tolist() == ["1", "a", "2.5"] and pd.isna(mixed.iloc[2])
+    assert store.load("x", exclude=["Price"]).frame.columns.tolist() == [c for c in data.columns if c != "Price"]
+    assert not store.is_fresh(loaded) and store.is_fresh(store.save("x", data))
+
+def test_versions_and_pruning(tmp_path):
+    store = SnapshotStore(str(tmp_path), keep=2)
+    for n in range(1, 5):
+        store.save("x", frame(n), {"n": n})
+    assert store.latest_version("x") == 4 and store.load("x").metrics["n"] == 4
+    assert store.load("x", version=3).metrics["n"] == 3
+    assert store.load("x", version=2) is None
+    assert sorted(p.name for p in (tmp_path / "x").iterdir() if p.name.startswith("v")) == ["v000003", "v000004"]
+    # no temp dirs left behind
+    assert not [p for p in (tmp_path / "x").iterdir() if p.name.startswith(".tmp-")]
+
+def test_an_unreadable_version_loads_as_none(store):
+    store.save("x", frame(1))
+    with open(store.frame_path("x", 1), "wb") as f:
+        f.write(b"not parquet")
+    assert store.load("x") is None
+    assert store.latest_version("x") == 1
+
+def test_side_tables_belong_to_their_version(store):
+    store.save("x", frame(1), tables={"extra": pd.DataFrame({"a": [1, 2]})})
+    store.save("x", frame(2))
+    assert store.load_table("x", "extra") is None
+    assert store.load_table("x", "extra", version=1)["a"].tolist() == [1, 2]
+
+@pytest.fixture
+def mapped(tmp_path):
+    return SnapshotStore(str(tmp_path), ttl=60, mapped=True)
+
+def test_mapped_snapshots_are_read_from_the_mapping(mapped, tmp_path):
+    data = frame(50).assign(Text=pd.array(["a", "b"] * 50, dtype="str"))
+    saved = mapped.save("x", data)
+    assert (tmp_path / "x" / "v000001" / "frame.arrow").exists()
+    for snap in (saved, mapped.load("x")):
+        pd.testing.assert_frame_equal(snap.frame, data, check_dtype=False)
+        price = snap.frame["Price"].to_numpy()
+        # null-free numbers point into the read-only mapping instead of a private copy
+        assert not price.flags.owndata and not price.flags.writeable
+    assert mapped.load("x", exclude=["Text"]).frame.columns.tolist() == frame(1).columns.tolist()
+
+def test_generation_is_shared_and_only_grows(mapped, tmp_path):
+    other = SnapshotStore(str(tmp_path), mapped=True)
+    assert other.generation("x") == 0
+    mapped.save("x", frame(1))
+    mapped.save("x", frame(2))
+    assert other.generation("x") == mapped.generation("x") == 2
+    other._publish("x", 1)
+    assert mapped.generation("x") == 2
+
+@pytest.mark.skipif(fcntl is None, reason="needs flock")
+def test_one_producer_per_name(mapped, tmp_path):
+    other = SnapshotStore(str(tmp_path), mapped=True)
+    assert mapped.producer("x") and mapped.producer("x")
+    assert not other.producer("x")
+    assert other.producer("y")
+
+def test_shared_refreshers_pick_up_each_others_snapshots(mapped, tmp_path):
+    producer = Refresher(Builds(), Snapshot(frame(0)), store=mapped, name="x", shared=True)
+    reader = Refresher(Builds(), Snapshot(frame(0)),
+                       store=SnapshotStore(str(tmp_path), mapped=True), name="x", shared=True)
+    snap = producer.refresh()
+    assert reader.latest().version == snap.version and reader.latest().metrics["n"] == 1
+    assert reader.latest() is reader.latest()
+    # a plain (unshared) refresher only looks at its own snapshot
+    lone = Refresher(Builds(), Snapshot(frame(0)), store=SnapshotStore(str(tmp_path)), name="x")
+    producer.refresh()
+    assert lone.latest().version == snap.version
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_a_forked_producer_publishes_to_the_parent(mapped, tmp_path):
+    reader = Refresher(Builds(), Snapshot(frame(0)), store=mapped, name="x", shared=True)
+    child = multiprocessing.get_context("fork").Process(
+        target=lambda: SnapshotStore(str(tmp_path), mapped=True).save("x", frame(3), {"n": 3}))
+    child.start()
+    child.join(30)
+    assert child.exitcode == 0
+    assert reader.latest().metrics["n"] == 3 and len(reader.latest().frame) == 6
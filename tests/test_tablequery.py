@@ -0,0 +1,98 @@
+# tests/test_tablequery.py
+import pandas as pd
+import pytest
+
+from listings import ListingStore
+from pipeline import rows_to_frame
+from snapshot import Snapshot
+from tablequery import PositionCache, filter_mask, page_count, query_page, split_filter_part
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "Price": [500_000.0, 1_200_000.0, None, 2_000_000.0],
+        "Agency": ["Luxury Homes", "luxury estates", "Bay Realty", None],
+        "Key Words": ["Canal view", 'He said "hi"', "Studio", "Sea && sky"],
+    })
+
+@pytest.mark.parametrize("part, parsed", [
+    ("{Price} >= 500000", ("Price", "ge", "500000", False)),
+    ("{Price}<1e6", ("Price", "lt", "1e6", False)),
+    ("{Price} >=5", ("Price", "ge", "5", False)),
+    ("{Price} ne 3", ("Price", "ne", "3", False)),
+    ("{Agency} contains Luxury", ("Agency", "contains", "Luxury", False)),
+    ("{Agency} icontains luxury", ("Agency", "contains", "luxury", True)),
+    ("{Agency} s> B", ("Agency", "gt", "B", False)),
+    ("{Agency} i< c", ("Agency", "lt", "c", True)),
+    ("{Key Words} = 'Canal view'", ("Key Words", "eq", "Canal view", False)),
+    ('{Key Words} = "He said \\"hi\\""', ("Key Words", "eq", 'He said "hi"', False)),
+    ("{Key Words} datestartswith `Can`", ("Key Words", "datestartswith", "Can", False)),
+])
+def test_split_filter_part(part, parsed):
+    assert split_filter_part(part) == parsed
+
+@pytest.mark.parametrize("part", ["", "Price > 5", "{Price}", "{Price} >", "{Price} ~ 5", "{} = 1", "{Price} gt5"])
+def test_split_filter_part_rejects_bad_clauses(part):
+    assert split_filter_part(part) is None
+
+def mask(df, query) -> list:
+    return filter_mask(df, query).tolist()
+
+def test_numeric_and_text_comparisons(df):
+    assert mask(df, "{Price} >= 1000000") == [False, True, False, True]
+    assert mask(df, "{Price} > 600000 && {Price} < 1500000") == [False, True, False, False]
+    assert mask(df, "{Agency} contains Luxury") == [True, False, False, False]
+    assert mask(df, "{Agency} icontains LUXURY") == [True, True, False, False]
+    assert mask(df, "{Agency} i< c") == [False, False, True, False]
+    assert mask(df, "{Key Words} = 'Canal view'") == [True, False, False, False]
+    # a non-number against a numeric column compares as text
+    assert mask(df, "{Price} contains 500") == [True, False, False, False]
+
+def test_bad_input_is_ignored(df):
+    everything = [True] * 4
+    assert mask(df, "") == mask(df, None) == everything
+    assert mask(df, "{Nope} = 1") == everything
+    assert mask(df, "garbage && {Price} >= 1000000") == [False, True, False, True]
+    # && inside a quoted value doesn't end the clause
+    assert mask(df, "{Key Words} contains Sea&&{Price} > 0") == [False, False, False, True]
+    assert mask(df, "{Key Words} = 'Sea && sky'") == [False, False, False, True]
+    assert mask(df, "{Agency} contains don't && {Price} > 0") == [False] * 4
+
+def test_query_page_sorts_filters_and_pages(df):
+    sort_by = [{"column_id": "Price", "direction": "desc"}]
+    page, total = query_page(df, 0, 2, sort_by, "{Price} >= 0")
+    assert total == 3 and page["Price"].tolist() == [2_000_000, 1_200_000]
+    page, _ = query_page(df, 1, 2, sort_by, "{Price} >= 0")
+    assert page["Price"].tolist() == [500_000]
+    # missing values sort last either way
+    page, _ = query_page(df, 0, 4, [{"column_id": "Price", "direction": "asc"}])
+    assert page.index.tolist() == [0, 1, 3, 2]
+    assert page_count(0, 20) == 1 and page_count(41, 20) == 3
+
+def test_position_cache_belongs_to_its_frame(df):
+    cache = PositionCache(maxsize=2)
+    first, _ = query_page(df, 0, 4, None, "{Price} >= 1000000", cache=cache)
+    again, _ = query_page(df, 0, 4, None, "{Price} >= 1000000", cache=cache)
+    assert first.index.tolist() == again.index.tolist() == [1, 3] and len(cache) == 1
+    for query in ("{Price} < 1", "{Price} > 1"):
+        query_page(df, 0, 4, None, query, cache=cache)
+    assert len(cache) == 2
+
+    # a new snapshot of different rows never sees the old one's positions
+    old, new = Snapshot(df, version=1), Snapshot(df.iloc[::-1].reset_index(drop=True), version=1)
+    assert old.positions is old.positions and old.positions is not new.positions
+    query_page(old.frame, 0, 4, None, "{Price} >= 1000000", cache=old.positions)
+    page, total = query_page(new.frame, 0, 4, None, "{Price} >= 1000000", cache=new.positions)
+    assert page["Price"].tolist() == [2_000_000, 1_200_000] and total == 2
+
+def test_listing_store_keeps_a_cache_per_status():
+    frame = rows_to_frame([
+        {"Status": s, "Price (raw)": f"AED {p:,}", "Location": "Business Bay", "Key Words": f"{s}{p}",
+         "Bedrooms": "1", "Area (raw)": "1,000 sqft", "Agency": "Agency 1"}
+        for s, p in (("Rent", 90_000), ("Buy", 900_000), ("Rent", 80_000))
+    ])
+    store = ListingStore(frame)
+    assert store.positions("Rent") is store.positions("Rent")
+    assert store.positions("Rent") is not store.positions("Buy")
+    page, total = query_page(store.view("Rent"), 0, 20, [{"column_id": "Price"}], cache=store.positions("Rent"))
+    assert page["Price"].tolist() == [80_000, 90_000] and total == 2